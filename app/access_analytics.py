@@ -0,0 +1,319 @@
+"""Fleet-wide analytics of which users can access which devices, for the privilege sprawl that the checks of single
+devices do not see: users with access to far more devices than their peers, roles granted to users that none of their
+devices admits, and groups of users with exactly the same access that could share a role.
+
+Access is held in a sparse user by device matrix in compressed sparse row (CSR) form, as NumPy arrays: the column
+indices of each user's devices, sorted, between the offsets of the user's row, with a bitmask of the sources of each
+access as the data. The analytics are whole-array operations on it, so 100,000 users with access to 1,000,000 devices
+take seconds. NumPy is an optional dependency, see requirements/requirements-analytics.txt.
+"""
+
+import argparse
+import json
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from app.domain_models import Device, User
+
+# the sources of an access, which are the bits of the entries of the access matrix
+GRANTED = 1
+ACL_ALLOWED = 2
+ASSIGNED = 4
+ACCESS_SOURCES = {GRANTED: "user devices", ACL_ALLOWED: "ACL", ASSIGNED: "assigned user"}
+# the robust z-score of a user's number of devices above which the user is a fan-out outlier
+DEFAULT_FAN_OUT_THRESHOLD = 3.5
+# the ratios of the standard deviation of a normal distribution to its median and to its mean absolute deviation
+_MAD_SCALE = 1.4826
+_MEAN_AD_SCALE = 1.2533
+# the seed of the random weights that the device sets of users are hashed with
+_HASH_SEED = 0x5A7A
+
+
+class FanOutOutlier(NamedTuple):
+    """A user with access to far more devices than the other users."""
+
+    username: str
+    devices: int
+    score: float
+
+
+class UnusedRoleGrant(NamedTuple):
+    """A role of a user that none of the devices the user can access admits."""
+
+    username: str
+    role: str
+
+
+class AccessCluster(NamedTuple):
+    """Users with access to exactly the same devices."""
+
+    usernames: list[str]
+    devices: int
+
+
+def _csr(rows: np.ndarray, cols: np.ndarray, data: np.ndarray, row_count: int) -> tuple[np.ndarray, ...]:
+    """Compress the coordinates of the entries of a sparse matrix into rows, combining duplicate entries' data.
+
+    :param rows: the row of each entry
+    :param cols: the column of each entry
+    :param data: the bitmask of each entry
+    :param row_count: the number of rows
+    :return: the row offsets, the column indices sorted within each row, and the data
+    """
+    order = np.lexsort((cols, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+    if len(rows):
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        starts = np.flatnonzero(first)
+        data = np.bitwise_or.reduceat(data, starts)
+        rows, cols = rows[starts], cols[starts]
+    indptr = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=row_count), out=indptr[1:])
+    return indptr, cols, data
+
+
+def _gather_rows(indptr: np.ndarray, indices: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Get the column indices of the given rows of a CSR matrix, without a Python loop over the rows.
+
+    :param indptr: the row offsets
+    :param indices: the column indices
+    :param rows: the rows, which may repeat
+    :return: the position in rows that each gathered entry comes from, and its column index
+    """
+    counts = indptr[rows + 1] - indptr[rows]
+    origin = np.repeat(np.arange(len(rows)), counts)
+    # the offset of each gathered entry within its row, added to the row's start
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return origin, indices[indptr[rows][origin] + offsets]
+
+
+class AccessMatrix:
+    """The access of every user to every device, and the roles of the users and the roles that the devices admit."""
+
+    def __init__(self, devices: list[Device], users: list[User]):
+        """Build the access matrix from the devices of the users, the ACL allow-lists and the assigned users of hosts.
+        References to users or devices that do not exist are left out, the per-device checks report them.
+
+        :param devices: the devices
+        :param users: the users
+        """
+        self.usernames = [user.username for user in users]
+        self.hostnames = [device.hostname for device in devices]
+        user_index = {username: row for row, username in enumerate(self.usernames)}
+        device_index = {hostname: col for col, hostname in enumerate(self.hostnames)}
+
+        rows, cols, data = [], [], []
+        for row, user in enumerate(users):
+            for hostname in user.devices:
+                if hostname in device_index:
+                    rows.append(row)
+                    cols.append(device_index[hostname])
+                    data.append(GRANTED)
+        for col, device in enumerate(devices):
+            auth = device.configuration.get("auth") or {}
+            acl = auth.get("acl") or {}
+            for username in [*acl.get("allow", []), *acl.get("Allow", [])]:
+                if username in user_index:
+                    rows.append(user_index[username])
+                    cols.append(col)
+                    data.append(ACL_ALLOWED)
+            if auth.get("assigned_user") in user_index:
+                rows.append(user_index[auth["assigned_user"]])
+                cols.append(col)
+                data.append(ASSIGNED)
+        self.indptr, self.indices, self.sources = _csr(
+            np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(data, dtype=np.uint8), len(users)
+        )
+
+        self.roles = sorted({role for user in users for role in user.roles})
+        role_index = {role: col for col, role in enumerate(self.roles)}
+        self._user_roles = self._role_matrix([user.roles for user in users], role_index)
+        self._device_roles = self._role_matrix(
+            [device.configuration.get("roles") or [] for device in devices], role_index
+        )
+
+    @staticmethod
+    def _role_matrix(role_lists: list[list[str]], role_index: dict[str, int]) -> tuple[np.ndarray, np.ndarray]:
+        """Build the CSR matrix of the roles of users or devices, leaving out roles that no user has.
+
+        :param role_lists: the roles of each user or device
+        :param role_index: the column of each role
+        :return: the row offsets and the column indices
+        """
+        rows = [row for row, roles in enumerate(role_lists) for role in roles if role in role_index]
+        cols = [role_index[role] for roles in role_lists for role in roles if role in role_index]
+        rows, cols = np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+        indptr, indices, _ = _csr(rows, cols, np.ones(len(rows), dtype=np.uint8), len(role_lists))
+        return indptr, indices
+
+    @property
+    def fan_out(self) -> np.ndarray:
+        """Return the number of devices that each user can access."""
+        return np.diff(self.indptr)
+
+    def fan_out_outliers(self, threshold: float = DEFAULT_FAN_OUT_THRESHOLD) -> list[FanOutOutlier]:
+        """Find the users with access to far more devices than the others, by the robust z-score of their number of
+        devices, which the outliers themselves do not skew the way they skew the mean and standard deviation.
+
+        :param threshold: the robust z-score above which a user is an outlier
+        :return: the outliers, those with the most devices first
+        """
+        fan_out = self.fan_out.astype(np.float64)
+        if not len(fan_out):
+            return []
+        median = np.median(fan_out)
+        deviations = np.abs(fan_out - median)
+        scale = _MAD_SCALE * np.median(deviations)
+        if scale == 0:
+            # more than half of the users have the median number of devices
+            scale = _MEAN_AD_SCALE * deviations.mean()
+        if scale == 0:
+            return []
+        scores = (fan_out - median) / scale
+        outliers = np.flatnonzero(scores > threshold)
+        outliers = outliers[np.argsort(-fan_out[outliers], kind="stable")]
+        return [FanOutOutlier(self.usernames[row], int(fan_out[row]), round(float(scores[row]), 1)) for row in outliers]
+
+    def unused_role_grants(self) -> list[UnusedRoleGrant]:
+        """Find the roles of users that none of the devices they can access admits.
+
+        :return: the unused role grants, by user and role
+        """
+        role_count = len(self.roles)
+        if not role_count:
+            return []
+        entry_users = np.repeat(np.arange(len(self.usernames)), self.fan_out)
+        origin, device_roles = _gather_rows(*self._device_roles, self.indices)
+        used = np.unique(entry_users[origin] * role_count + device_roles)
+
+        user_indptr, user_role_indices = self._user_roles
+        granted = np.repeat(np.arange(len(self.usernames)), np.diff(user_indptr)) * role_count + user_role_indices
+        unused = np.setdiff1d(granted, used)
+        return [UnusedRoleGrant(self.usernames[key // role_count], self.roles[key % role_count]) for key in unused]
+
+    def identical_access_clusters(self, min_size: int = 2) -> list[AccessCluster]:
+        """Find the groups of users with access to exactly the same devices.
+
+        Each user's set of devices is hashed to the wrapping sum of random 64-bit weights of the devices, and users are
+        grouped by hash and number of devices. Two different sets get the same hash with a probability of 2^-64.
+
+        :param min_size: the min number of users of a cluster
+        :return: the clusters, the largest first
+        """
+        fan_out = self.fan_out
+        with_access = np.flatnonzero(fan_out)
+        if not len(with_access):
+            return []
+        weights = np.random.default_rng(_HASH_SEED).integers(0, 2**64, size=len(self.hostnames), dtype=np.uint64)
+        # the entries of users without access are empty ranges, so the starts of the others delimit their entries
+        hashes = np.add.reduceat(weights[self.indices], self.indptr[with_access])
+
+        order = np.lexsort((fan_out[with_access], hashes))
+        hashes, counts, users = hashes[order], fan_out[with_access][order], with_access[order]
+        boundaries = np.flatnonzero((hashes[1:] != hashes[:-1]) | (counts[1:] != counts[:-1])) + 1
+        starts = np.concatenate(([0], boundaries))
+        sizes = np.diff(np.concatenate((starts, [len(users)])))
+        clusters = [
+            AccessCluster(sorted(self.usernames[row] for row in users[start : start + size]), int(counts[start]))
+            for start, size in zip(starts, sizes)
+            if size >= min_size
+        ]
+        return sorted(clusters, key=lambda cluster: (-len(cluster.usernames), -cluster.devices, cluster.usernames))
+
+    def access_sources(self, username: str) -> dict[str, list[str]]:
+        """Get the devices a user can access and how.
+
+        :param username: the username
+        :return: the sources of the access to each device by hostname
+        """
+        row = self.usernames.index(username)
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return {
+            self.hostnames[col]: [name for bit, name in ACCESS_SOURCES.items() if source & bit]
+            for col, source in zip(self.indices[start:end], self.sources[start:end])
+        }
+
+
+def _print_section(title: str, findings: list[str], limit: int) -> None:
+    """Print the findings of a kind, at most limit of them.
+
+    :param title: the kind of the findings
+    :param findings: the descriptions of the findings
+    :param limit: the max number of findings printed
+    :return: None
+    """
+    print(f"{title}: {len(findings)}")
+    for finding in findings[:limit]:
+        print(f"  {finding}")
+    if len(findings) > limit:
+        print(f"  ... and {len(findings) - limit} more")
+
+
+def print_findings(matrix: AccessMatrix, threshold: float = DEFAULT_FAN_OUT_THRESHOLD, limit: int = 20) -> None:
+    """Print the fan-out outliers, unused role grants and identical access clusters of an access matrix.
+
+    :param matrix: the access matrix
+    :param threshold: the robust z-score above which a user is a fan-out outlier
+    :param limit: the max number of findings printed of each kind
+    :return: None
+    """
+    fan_out = matrix.fan_out
+    median = np.median(fan_out) if len(fan_out) else 0
+    print(
+        f"Access matrix: {len(matrix.usernames)} users x {len(matrix.hostnames)} devices, "
+        f"{len(matrix.indices)} accesses, median devices per user {median:g}"
+    )
+    outliers = [
+        f"{outlier.username}: {outlier.devices} devices (robust z-score {outlier.score})"
+        for outlier in matrix.fan_out_outliers(threshold)
+    ]
+    _print_section("Fan-out outliers", outliers, limit)
+    grants = [f"{grant.username}: {grant.role}" for grant in matrix.unused_role_grants()]
+    _print_section("Unused role grants", grants, limit)
+    clusters = [
+        f"{len(cluster.usernames)} users with the same {cluster.devices} devices: "
+        + ", ".join(cluster.usernames[:5])
+        + (", ..." if len(cluster.usernames) > 5 else "")
+        for cluster in matrix.identical_access_clusters()
+    ]
+    _print_section("Identical access clusters", clusters, limit)
+
+
+def main():
+    """Print the access analytics of a snapshot, or of the JSON data files of the simulated appliance.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Find privilege sprawl in the access of users to devices.")
+    parser.add_argument("source", nargs="+", help="a snapshot, or a device configurations and a users JSON file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_FAN_OUT_THRESHOLD,
+        help="robust z-score of the number of devices above which a user is an outlier",
+    )
+    parser.add_argument("--limit", type=int, default=20, help="max number of findings printed of each kind")
+    args = parser.parse_args()
+    if len(args.source) > 2:
+        parser.error("expected a snapshot, or a device configurations and a users JSON file")
+
+    start = time.perf_counter()
+    if len(args.source) == 1:
+        from app.snapshot import load_snapshot
+
+        device_data, user_data = load_snapshot(args.source[0])
+    else:
+        with open(args.source[0], "r") as f:
+            device_data = json.load(f)
+        with open(args.source[1], "r") as f:
+            user_data = json.load(f)
+    matrix = AccessMatrix([Device(d) for d in device_data.values()], [User(u) for u in user_data.values()])
+    print_findings(matrix, args.threshold, args.limit)
+    print(f"Analyzed in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Compare the results of two audits."""
+
+import argparse
+import heapq
+import json
+import os
+import pickle
+import tempfile
+from collections.abc import Iterable, Iterator
+from contextlib import ExitStack, closing
+from datetime import datetime
+from typing import NamedTuple
+
+from app.audit_reporter import AuditReporter
+from app.audit_summary import parse_sub_checks
+from app.domain_models import AuditResult
+from app.results_store import ResultsStore
+
+# number of results sorted in memory at a time when a results file is not already ordered
+DEFAULT_SORT_CHUNK_SIZE = 200_000
+
+# status reported for a device check that is no longer audited, which is neither a pass nor a failure
+REMOVED_STATUS = "removed"
+
+
+class ResultChange(NamedTuple):
+    """A check result of a device that differs between two audits.
+
+    A status of None means that the device was not audited for the check in that audit.
+    """
+
+    device: str
+    zta_check: str
+    old_status: bool | None
+    new_status: bool | None
+    sub_check_changes: dict[str, tuple[str | None, str | None]]
+    new_details: str | None
+
+
+def _result_key(result: AuditResult) -> tuple[str, str]:
+    """Get the sort key of a result."""
+    return result.device, result.zta_check
+
+
+def write_results_file(results: Iterable[AuditResult], filepath: str) -> int:
+    """Write results to a newline delimited JSON results file.
+
+    :param results: the audit results
+    :param filepath: the path of the results file
+    :return: the number of results written
+    """
+    count = 0
+    with open(filepath, "w") as f:
+        for result in results:
+            f.write(json.dumps(result._asdict()))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def read_results_file(filepath: str) -> Iterator[AuditResult]:
+    """Read the results of a newline delimited JSON results file.
+
+    :param filepath: the path of the results file
+    :return: the audit results in file order
+    """
+    with open(filepath, "r") as f:
+        for line in f:
+            if line.strip():
+                yield AuditResult(**json.loads(line))
+
+
+def _write_sorted_run(results: list[AuditResult], filepath: str) -> None:
+    """Spill a sorted chunk of results to a temporary file.
+
+    :param results: the sorted audit results
+    :param filepath: the path of the temporary file
+    :return: None
+    """
+    with open(filepath, "wb") as f:
+        pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+        for result in results:
+            pickler.dump(tuple(result))
+
+
+def _read_sorted_run(filepath: str) -> Iterator[AuditResult]:
+    """Read the results of a temporary file written by _write_sorted_run.
+
+    :param filepath: the path of the temporary file
+    :return: the sorted audit results
+    """
+    with open(filepath, "rb") as f:
+        unpickler = pickle.Unpickler(f)
+        while True:
+            try:
+                yield AuditResult._make(unpickler.load())
+            except EOFError:
+                return
+
+
+def sorted_results(results: Iterable[AuditResult], chunk_size: int = DEFAULT_SORT_CHUNK_SIZE) -> Iterator[AuditResult]:
+    """Sort results by device and check without holding more than a chunk of them in memory.
+
+    Chunks are sorted in memory and spilled to temporary files, which are then merged.
+
+    :param results: the audit results
+    :param chunk_size: the max number of results sorted in memory
+    :return: the audit results ordered by device and check
+    """
+    results = iter(results)
+    chunk = sorted((result for _, result in zip(range(chunk_size), results)), key=_result_key)
+    if len(chunk) < chunk_size:
+        yield from chunk
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir, ExitStack() as stack:
+        runs = []
+        while chunk:
+            run_path = os.path.join(tmp_dir, f"run_{len(runs)}.pickle")
+            _write_sorted_run(chunk, run_path)
+            runs.append(stack.enter_context(closing(_read_sorted_run(run_path))))
+            chunk = sorted((result for _, result in zip(range(chunk_size), results)), key=_result_key)
+        yield from heapq.merge(*runs, key=_result_key)
+
+
+def _ordered(results: Iterable[AuditResult], name: str) -> Iterator[AuditResult]:
+    """Ensure that results are ordered by device and check.
+
+    :param results: the audit results
+    :param name: the name of the result set for the error message
+    :return: the audit results
+    """
+    previous = None
+    for result in results:
+        key = _result_key(result)
+        if previous is not None and key < previous:
+            raise ValueError(f"{name} results are not ordered by device and check at {key}.")
+        previous = key
+        yield result
+
+
+def _compare(old: AuditResult, new: AuditResult) -> ResultChange | None:
+    """Compare the results of a device check from two audits.
+
+    :param old: the earlier result
+    :param new: the later result
+    :return: the change, or None if the status and sub-check values are the same
+    """
+    if old.status == new.status and old.details == new.details:
+        return None
+    old_sub_checks = parse_sub_checks(old.details)
+    new_sub_checks = parse_sub_checks(new.details)
+    sub_check_changes = {
+        label: (old_sub_checks.get(label), new_sub_checks.get(label))
+        for label in old_sub_checks.keys() | new_sub_checks.keys()
+        if old_sub_checks.get(label) != new_sub_checks.get(label)
+    }
+    if old.status == new.status and not sub_check_changes:
+        return None
+    return ResultChange(new.device, new.zta_check, old.status, new.status, sub_check_changes, new.details)
+
+
+def diff_results(old_results: Iterable[AuditResult], new_results: Iterable[AuditResult]) -> Iterator[ResultChange]:
+    """Stream the changes between two result sets with a merge join on device and check.
+
+    Both result sets must be ordered by device and check, as returned by sorted_results or
+    ResultsStore.iter_results.
+
+    :param old_results: the results of the earlier audit
+    :param new_results: the results of the later audit
+    :return: the changed results, ordered by device and check
+    """
+    old_iter = _ordered(old_results, "Old")
+    new_iter = _ordered(new_results, "New")
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and _result_key(old) < _result_key(new)):
+            yield ResultChange(old.device, old.zta_check, old.status, None, {}, None)
+            old = next(old_iter, None)
+        elif old is None or _result_key(new) < _result_key(old):
+            yield ResultChange(new.device, new.zta_check, None, new.status, {}, new.details)
+            new = next(new_iter, None)
+        else:
+            change = _compare(old, new)
+            if change:
+                yield change
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+
+
+def report_changes(changes: Iterable[ResultChange], audit_reporter: AuditReporter) -> int:
+    """Add the changes to an audit report, with the new status and what changed as the details.
+
+    Device checks that are no longer audited are reported with the REMOVED_STATUS, which the summary does not count.
+
+    :param changes: the changed results
+    :param audit_reporter: the audit reporter
+    :return: the number of changes reported
+    """
+    count = 0
+    for change in changes:
+        if change.old_status is None:
+            details = f"Device added to the audit. \n{change.new_details}"
+        elif change.new_status is None:
+            details = "Device removed from the audit."
+        else:
+            details = f"Device status changed: {change.old_status} -> {change.new_status}."
+            for label, (old_value, new_value) in sorted(change.sub_check_changes.items()):
+                details += f" \n{label}: {old_value} -> {new_value}."
+        status = REMOVED_STATUS if change.new_status is None else change.new_status
+        audit_reporter.add_result(change.device, change.zta_check, status, details)
+        count += 1
+    return count
+
+
+def _load_results(source: str, results_store: ResultsStore | None) -> Iterator[AuditResult]:
+    """Get the ordered results of a results file or of a stored run given as 'run:<id>'.
+
+    :param source: the results file path or stored run
+    :param results_store: the results store of stored runs
+    :return: the audit results ordered by device and check
+    """
+    if source.startswith("run:"):
+        if results_store is None:
+            raise ValueError(f"A results database is required to compare stored run '{source}'.")
+        return results_store.iter_results(int(source.removeprefix("run:")))
+    return sorted_results(read_results_file(source))
+
+
+def main():
+    """Create an audit report of the device results that changed between two audits.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Report the device results that changed between two ZTA audits.")
+    parser.add_argument("old", help="results file or stored run ('run:<id>') of the earlier audit")
+    parser.add_argument("new", help="results file or stored run ('run:<id>') of the later audit")
+    parser.add_argument("--db", help="results database of stored runs")
+    parser.add_argument("--output", help="path of the diff report")
+    args = parser.parse_args()
+
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    filepath = args.output or f"zta_compliance_audit_diff_{current_date}.xlsx"
+    with ExitStack() as stack:
+        results_store = stack.enter_context(ResultsStore(args.db)) if args.db else None
+        changes = diff_results(_load_results(args.old, results_store), _load_results(args.new, results_store))
+        with AuditReporter(filepath) as audit_reporter:
+            count = report_changes(changes, audit_reporter)
+        print(f"Results changed between audits: {count}")
+
+
+if __name__ == "__main__":
+    main()
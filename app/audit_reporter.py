@@ -1,59 +1,256 @@
 """Creates audit report results."""
 
+import os
+import queue
+import threading
 from typing import Literal
 
-import xlsxwriter
 from datetime import datetime
 
+from app.audit_summary import AuditSummary
+from app.domain_models import AuditResult, Device
+from app.exceptions import AuditReportWriteError
+from app.metrics import metrics
+from app.profiling import profiler
+from app.results_store import ResultsStore
+
+# default number of results that may be waiting on the writer thread before add_result blocks
+DEFAULT_QUEUE_SIZE = 10_000
+
 
 class AuditReporter:
-    """Context manager to handle creation of an audit report."""
+    """Context manager to handle creation of an audit report.
 
-    VALID_ZTA_CHECKS = {"Logging", "Auth and AC", "Network Segmentation", "Least Privilege"}
-    ZtaCheckType = Literal["Logging", "Auth and AC", "Network Segmentation", "Least Privilege"]
+    In asynchronous mode, results are put on a bounded queue and a dedicated writer thread drains them into the
+    report so that the checks are not stalled by report serialization. A full queue blocks the caller until the
+    writer catches up.
+    """
 
-    def __init__(self):
-        """Initialize the audit report."""
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        self._filepath = f"zta_compliance_audit_report_{current_date}.xlsx"
-        self._workbook = xlsxwriter.Workbook(self._filepath)
+    VALID_ZTA_CHECKS = {
+        "Logging",
+        "Auth and AC",
+        "Network Segmentation",
+        "Least Privilege",
+        "Address Uniqueness",
+        "Segment Overlap",
+    }
+    # the order of the check columns of a constant memory report, which are written before any result
+    ZTA_CHECK_COLUMNS = ["Logging", "Auth and AC", "Network Segmentation", "Least Privilege", "Segment Overlap"]
+    ZtaCheckType = Literal[
+        "Logging", "Auth and AC", "Network Segmentation", "Least Privilege", "Address Uniqueness", "Segment Overlap"
+    ]
+
+    def __init__(
+        self,
+        filepath: str | None = None,
+        asynchronous: bool = False,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        results_store: ResultsStore | None = None,
+        constant_memory: bool = False,
+    ):
+        """Initialize the audit report.
+
+        :param filepath: the path of the report, defaults to one named after the current date
+        :param asynchronous: write results on a background writer thread
+        :param queue_size: the max number of results waiting on the writer thread
+        :param results_store: a store that the results are also recorded in
+        :param constant_memory: flush each device's row to disk once the next device's first result is written,
+            instead of keeping every row in memory. All results of a device must be added before the next device's.
+        """
+        self._filepath = filepath or self._default_filepath()
+        # imported when a report is created, so that runs start their first request without loading xlsxwriter
+        import xlsxwriter
+
+        self._constant_memory = constant_memory
+        self._workbook = xlsxwriter.Workbook(self._filepath, {"constant_memory": constant_memory})
         self._worksheet = self._workbook.add_worksheet()
         self._row = 1
         self._device_rows = {}
         self._col_headers = {}
 
+        self._lock = threading.Lock()
+        self._asynchronous = asynchronous
+        self._queue: queue.Queue[AuditResult | None] = queue.Queue(maxsize=queue_size)
+        self._writer: threading.Thread | None = None
+        self._writer_error: Exception | None = None
+
+        self._results_store = results_store
+        self._run_id: int | None = None
+
+        self._summary = AuditSummary()
+
+    @staticmethod
+    def _default_filepath() -> str:
+        """Get a report path named after the current date that does not overwrite an earlier report.
+
+        :return: the report path
+        """
+        current_date = datetime.now().strftime("%Y-%m-%d")
+        filepath = f"zta_compliance_audit_report_{current_date}.xlsx"
+        run = 1
+        while os.path.exists(filepath):
+            filepath = f"zta_compliance_audit_report_{current_date}_{run}.xlsx"
+            run += 1
+        return filepath
+
+    @property
+    def run_id(self) -> int | None:
+        """Return the id of the run in the results store."""
+        return self._run_id
+
+    @property
+    def summary(self) -> AuditSummary:
+        """Return the summary aggregates of the results."""
+        return self._summary
+
+    def register_devices(self, devices: list[Device]) -> None:
+        """Register the devices so that their results are summarized per device type, site and subnet.
+
+        :param devices: the devices
+        :return: None
+        """
+        for device in devices:
+            self._summary.register_device(device)
+
     def __enter__(self):
         """Start the audit report."""
         self._worksheet.write(0, 0, "Device")
+        if self._constant_memory:
+            # the header row is flushed with the first device's row
+            for zta_check in self.ZTA_CHECK_COLUMNS:
+                self._add_column(zta_check)
+        if self._results_store:
+            self._run_id = self._results_store.start_run(self._filepath)
+        if self._asynchronous:
+            self._writer = threading.Thread(target=self._drain_queue, name="audit-report-writer", daemon=True)
+            self._writer.start()
         return self
 
     def add_result(self, device, zta_check: ZtaCheckType, status, details) -> None:
-        """Add or update a result in the audit report for a given device."""
+        """Add or update a result in the audit report for a given device.
+
+        Safe to call from multiple threads. In asynchronous mode, this blocks while the queue is full.
+        """
 
         if zta_check not in self.VALID_ZTA_CHECKS:
             raise ValueError(f"Invalid ZTA Check: '{zta_check}'. Must be one of {self.VALID_ZTA_CHECKS}.")
 
+        result = AuditResult(device, zta_check, status, details)
+
+        if self._writer is None:
+            with self._lock:
+                self._write_result(result)
+            return
+
+        if self._writer_error:
+            raise AuditReportWriteError(self._filepath) from self._writer_error
+        self._queue.put(result)
+
+    def _write_result(self, result: AuditResult) -> None:
+        """Write a result to the worksheet.
+
+        :param result: the audit result
+        :return: None
+        """
+        device, zta_check, status, details = result
+
         if device not in self._device_rows:
             self._device_rows[device] = self._row
             self._worksheet.write(self._row, 0, device)
             self._row += 1
 
         device_row = self._device_rows[device]
+        self._summary.add(device_row - 1, result)
 
         if zta_check not in self._col_headers:
-            col = len(self._col_headers) * 3 + 1
-            self._col_headers[zta_check] = col
-            self._worksheet.write(0, col, f"{zta_check} - Status")
-            self._worksheet.write(0, col + 1, f"{zta_check} - Details")
+            self._add_column(zta_check)
 
         col = self._col_headers[zta_check]
 
         self._worksheet.write(device_row, col, status)
         self._worksheet.write(device_row, col + 1, details)
 
+        if self._results_store:
+            self._results_store.add_result(self._run_id, device, zta_check, status, details)
+        metrics.inc("zta_results_written_total", check=zta_check)
+
+    def _add_column(self, zta_check: ZtaCheckType) -> None:
+        """Add the status and details columns of a check.
+
+        :param zta_check: the check
+        :return: None
+        """
+        col = len(self._col_headers) * 3 + 1
+        self._col_headers[zta_check] = col
+        self._worksheet.write(0, col, f"{zta_check} - Status")
+        self._worksheet.write(0, col + 1, f"{zta_check} - Details")
+
+    def _drain_queue(self) -> None:
+        """Write queued results until the stop sentinel is received.
+
+        After a write fails, the remaining results are discarded so that producers never block on a dead writer.
+
+        :return: None
+        """
+        while True:
+            result = self._queue.get()
+            if result is None:
+                return
+            if self._writer_error:
+                continue
+            try:
+                self._write_result(result)
+            except Exception as err:
+                self._writer_error = err
+
+    def _stop_writer(self) -> None:
+        """Flush the queue and stop the writer thread.
+
+        :return: None
+        """
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+
     def __exit__(self, exc_type, exc_value, traceback):
         """Create the audit report."""
-        columns_to_format = ['B', 'E', 'H', 'K']
+        with metrics.timer("zta_phase_duration_seconds", phase="report_write"), profiler.phase("report_write"):
+            self._finish_report(exc_type)
+
+    def _close_workbook(self) -> None:
+        """Close the workbook, which writes the report file.
+
+        :return: None
+        """
+        try:
+            self._workbook.close()
+        except Exception as err:
+            raise AuditReportWriteError(self._filepath) from err
+
+    def _finish_report(self, exc_type) -> None:
+        """Write the queued results, the formatting and the summary, and close the report.
+
+        :param exc_type: the type of the exception raised in the with block, if any
+        :return: None
+        """
+        self._stop_writer()
+        if self._results_store:
+            if self._writer_error or exc_type is not None:
+                self._results_store.flush()
+            else:
+                self._results_store.finish_run(self._run_id)
+        if self._writer_error:
+            self._close_workbook()
+            if exc_type is None:
+                raise AuditReportWriteError(self._filepath) from self._writer_error
+            return
+
+        from xlsxwriter.utility import xl_col_to_name
+
+        # the status column of each check
+        columns_to_format = [xl_col_to_name(col) for col in self._col_headers.values()]
         for col in columns_to_format:
             self._worksheet.conditional_format(f'{col}2:{col}{len(self._device_rows) + 1}', {
                 'type': 'cell',
@@ -68,6 +265,46 @@ class AuditReporter:
                 'value': False,
                 'format': self._workbook.add_format({'bg_color': '#FFC7CE'})
             })
+        self._summary.write_worksheet(self._workbook)
+        metrics.set_gauge("zta_devices_reported", len(self._device_rows))
         print(f"ZTA compliance audit report successfully created: {self._filepath}. Total"
               f" devices processed: {len(self._device_rows)}")
-        self._workbook.close()
+        self._summary.print_summary()
+        self._close_workbook()
+
+
+class ResultCollector:
+    """Stands in for the AuditReporter, keeping the results in memory in the order they are added.
+
+    When an audit reporter is given, the devices and results are also passed on to it.
+    """
+
+    def __init__(self, audit_reporter: AuditReporter | None = None):
+        """Initialize the collector.
+
+        :param audit_reporter: a reporter that the devices and results are also passed on to
+        """
+        self._audit_reporter = audit_reporter
+        self.results: list[AuditResult] = []
+
+    def register_devices(self, devices: list[Device]) -> None:
+        """Register the devices with the audit reporter, if any.
+
+        :param devices: the devices
+        :return: None
+        """
+        if self._audit_reporter:
+            self._audit_reporter.register_devices(devices)
+
+    def add_result(self, device, zta_check: AuditReporter.ZtaCheckType, status, details) -> None:
+        """Keep a result, and add it to the audit reporter, if any."""
+        if self._audit_reporter:
+            self._audit_reporter.add_result(device, zta_check, status, details)
+        self.results.append(AuditResult(device, zta_check, status, details))
+
+    def by_device_and_check(self) -> dict[tuple[str, str], tuple[bool, str]]:
+        """Get the status and details of the last result of each device and check.
+
+        :return: the status and details by device and check
+        """
+        return {(result.device, result.zta_check): (result.status, result.details) for result in self.results}
@@ -0,0 +1,201 @@
+"""Summary aggregates of audit results."""
+
+import ipaddress
+from collections import Counter
+
+from app.domain_models import AuditResult, Device
+
+# status of a device check in the per-check status arrays
+_UNSET, _PASSED, _FAILED = 0, 1, 2
+
+UNKNOWN_SEGMENT = "unknown"
+
+
+class AuditSummary:
+    """Pass/fail counts of audit results, aggregated as the results are added.
+
+    Counts are kept per check, per device type, per site and per subnet for each check, along with the number of
+    failures of each sub-check. Adding a result is O(1), and a result that replaces an earlier one for the same
+    device and check moves the device between the pass and fail counts and takes back the earlier sub-check failures.
+    """
+
+    def __init__(self, subnet_prefix: int = 24):
+        """Initialize the summary.
+
+        :param subnet_prefix: the prefix length of the subnets that devices are grouped by
+        """
+        self._subnet_prefix = subnet_prefix
+        self._segments: dict[str, tuple[str, str, str]] = {}
+        self._statuses: dict[str, bytearray] = {}
+        self._check_counts: dict[str, list[int]] = {}
+        self._segment_counts: dict[tuple[str, str, str], list[int]] = {}
+        self._failed_sub_checks: Counter[tuple[str, str]] = Counter()
+        # the failed sub-check labels of each device's result of each check, taken back when the result is replaced
+        self._failed_labels: dict[tuple[str, int], list[str]] = {}
+
+    def register_device(self, device: Device) -> None:
+        """Register the device type, site and subnet that the results of a device are grouped by.
+
+        :param device: the device
+        :return: None
+        """
+        subnet = str(ipaddress.IPv4Network(f"{device.ip_address}/{self._subnet_prefix}", strict=False))
+        site = device.configuration.get("site", UNKNOWN_SEGMENT)
+        self._segments[device.hostname] = (device.device_type, site, subnet)
+
+    def add(self, device_index: int, result: AuditResult) -> None:
+        """Add a result to the aggregates.
+
+        :param device_index: the index of the device, unique per device and below the number of devices
+        :param result: the audit result
+        :return: None
+        """
+        device_type, site, subnet = self._segments.get(result.device, (UNKNOWN_SEGMENT,) * 3)
+        keys = (
+            ("Device Type", device_type, result.zta_check),
+            ("Site", site, result.zta_check),
+            ("Subnet", subnet, result.zta_check),
+        )
+
+        statuses = self._statuses.setdefault(result.zta_check, bytearray())
+        if device_index >= len(statuses):
+            statuses.extend(bytes(max(device_index + 1 - len(statuses), len(statuses))))
+        check_counts = self._check_counts.setdefault(result.zta_check, [0, 0])
+
+        previous = statuses[device_index]
+        if previous != _UNSET:
+            check_counts[previous - 1] -= 1
+            for key in keys:
+                self._segment_counts[key][previous - 1] -= 1
+
+        # a status that is not a boolean, such as a removal in a diff report, is neither a pass nor a failure
+        if not isinstance(result.status, bool):
+            status = _UNSET
+        else:
+            status = _PASSED if result.status else _FAILED
+        statuses[device_index] = status
+        if status != _UNSET:
+            check_counts[status - 1] += 1
+            for key in keys:
+                self._segment_counts.setdefault(key, [0, 0])[status - 1] += 1
+
+        for label in self._failed_labels.pop((result.zta_check, device_index), []):
+            key = (result.zta_check, label)
+            self._failed_sub_checks[key] -= 1
+            if not self._failed_sub_checks[key]:
+                del self._failed_sub_checks[key]
+        if status == _FAILED:
+            labels = [label for label, value in parse_sub_checks(result.details).items() if value == "False"]
+            for label in labels:
+                self._failed_sub_checks[(result.zta_check, label)] += 1
+            if labels:
+                self._failed_labels[(result.zta_check, device_index)] = labels
+
+    def check_counts(self) -> dict[str, tuple[int, int]]:
+        """Get the passed and failed counts of each check.
+
+        :return: the (passed, failed) counts by check
+        """
+        return {
+            check: (passed, failed) for check, (passed, failed) in sorted(self._check_counts.items()) if passed + failed
+        }
+
+    def segment_counts(self, dimension: str) -> dict[tuple[str, str], tuple[int, int]]:
+        """Get the passed and failed counts of each check per segment of a dimension.
+
+        :param dimension: one of 'Device Type', 'Site' or 'Subnet'
+        :return: the (passed, failed) counts by segment and check
+        """
+        return {
+            (segment, check): (passed, failed)
+            for (key_dimension, segment, check), (passed, failed) in sorted(self._segment_counts.items())
+            if key_dimension == dimension and passed + failed
+        }
+
+    def top_failing_sub_checks(self, count: int = 10) -> list[tuple[str, str, int]]:
+        """Get the sub-checks that failed the most.
+
+        :param count: the number of sub-checks
+        :return: the check, sub-check and number of failures
+        """
+        return [(check, label, failures) for (check, label), failures in self._failed_sub_checks.most_common(count)]
+
+    def write_worksheet(self, workbook) -> None:
+        """Write the summary to a new worksheet.
+
+        :param workbook: the xlsxwriter workbook of the report
+        :return: None
+        """
+        worksheet = workbook.add_worksheet("Summary")
+        bold = workbook.add_format({"bold": True})
+        percent = workbook.add_format({"num_format": "0.0%"})
+        row = 0
+
+        def write_table(title: str, headers: list[str], rows: list[tuple], pass_rates: bool = True) -> None:
+            nonlocal row
+            worksheet.write(row, 0, title, bold)
+            worksheet.write_row(row + 1, 0, headers + (["Pass Rate"] if pass_rates else []), bold)
+            row += 2
+            for values in rows:
+                worksheet.write_row(row, 0, values)
+                if pass_rates:
+                    worksheet.write(row, len(values), _pass_rate(*values[-2:]), percent)
+                row += 1
+            row += 1
+
+        write_table(
+            "Checks",
+            ["Check", "Passed", "Failed"],
+            [(check, passed, failed) for check, (passed, failed) in self.check_counts().items()],
+        )
+        for dimension in ("Device Type", "Site", "Subnet"):
+            write_table(
+                f"By {dimension}",
+                [dimension, "Check", "Passed", "Failed"],
+                [
+                    (segment, check, passed, failed)
+                    for (segment, check), (passed, failed) in self.segment_counts(dimension).items()
+                ],
+            )
+        write_table(
+            "Top Failing Sub-checks",
+            ["Check", "Sub-check", "Failures"],
+            self.top_failing_sub_checks(),
+            pass_rates=False,
+        )
+
+    def print_summary(self) -> None:
+        """Print the pass rates per check and device type, and the top failing sub-checks.
+
+        :return: None
+        """
+        print("Compliance summary:")
+        for check, (passed, failed) in self.check_counts().items():
+            print(f"  {check}: {passed}/{passed + failed} passed ({_pass_rate(passed, failed):.1%})")
+        print("Compliance by device type:")
+        for (device_type, check), (passed, failed) in self.segment_counts("Device Type").items():
+            print(f"  {device_type} - {check}: {passed}/{passed + failed} passed ({_pass_rate(passed, failed):.1%})")
+        top_failing_sub_checks = self.top_failing_sub_checks(5)
+        if top_failing_sub_checks:
+            print("Top failing sub-checks:")
+            for check, label, failures in top_failing_sub_checks:
+                print(f"  {check} - {label}: {failures} failures")
+
+
+def _pass_rate(passed: int, failed: int) -> float:
+    """Get the fraction of passed results."""
+    return passed / (passed + failed) if passed + failed else 0.0
+
+
+def parse_sub_checks(details: str) -> dict[str, str]:
+    """Parse the sub-check values of result details written as one 'label: value.' line per sub-check.
+
+    :param details: the details of a result
+    :return: the value of each sub-check by its label
+    """
+    sub_checks = {}
+    for line in details.splitlines():
+        label, separator, value = line.strip().rpartition(": ")
+        if separator:
+            sub_checks[label] = value.rstrip(".")
+    return sub_checks
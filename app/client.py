@@ -1,7 +1,10 @@
 """Client for interacting with the configured network appliance."""
 
+import base64
 import getpass
+import json
 import os
+from collections.abc import Iterator
 from typing import Any
 
 import urllib3
@@ -9,6 +12,8 @@ from dotenv import load_dotenv
 
 import requests
 
+from app.metrics import metrics
+
 JSON = dict[str, Any] | None
 JWT = str | None
 
@@ -19,6 +24,42 @@ VERIFY_SSL = os.getenv("VERIFY_SSL", "True").lower() in ["true", "1"]
 if not VERIFY_SSL:
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+DEFAULT_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class InventoryMirror:
+    """Local copy of an appliance inventory, kept up to date by applying the appliance's change feed."""
+
+    def __init__(self):
+        """Initialize an empty mirror."""
+        self.records: dict[str, dict] = {}
+        self.version = 0
+        self.epoch: str | None = None
+
+    def apply(self, changes: JSON) -> set[str]:
+        """Apply a change feed response.
+
+        :param changes: the change feed response
+        :return: the keys of the records that were added, updated or removed
+        """
+        changed_records = changes.get("changes", {})
+        if changes.get("reset"):
+            old_records = self.records
+            self.records = {key: record for key, record in changed_records.items() if record is not None}
+            changed = {key for key, record in self.records.items() if old_records.get(key) != record}
+            changed.update(old_records.keys() - self.records.keys())
+        else:
+            for key, record in changed_records.items():
+                if record is None:
+                    self.records.pop(key, None)
+                else:
+                    self.records[key] = record
+            changed = set(changed_records)
+        self.version = changes.get("version", 0)
+        self.epoch = changes.get("epoch")
+        return changed
+
 
 class APIClient:
     """Client to interact with the network appliance."""
@@ -27,6 +68,10 @@ class APIClient:
         """Initialize the client."""
         self._token: JWT = None
         self._base_url: str | None = None
+        # reuse connections to the appliance across requests
+        self._session = requests.Session()
+        self._device_mirror = InventoryMirror()
+        self._user_mirror = InventoryMirror()
 
     def authenticate(self) -> tuple[JWT, str] | None:
         """Authenticate with the appliance server and obtain an access token to run a ZTA compliance audit.
@@ -38,20 +83,54 @@ class APIClient:
         username = input("Enter your username: ")
         password = getpass.getpass("Enter your password: ")
 
-        auth_url = f"{base_url}/auth"
-        auth_data = {"username": username, "password": password}
-
         try:
-            response = requests.post(auth_url, json=auth_data, verify=VERIFY_SSL)
-            response.raise_for_status()
-            token = response.json().get("token")
+            self.login(base_url, username, password)
             print("Authentication successful!")
-            self._token = token
-            self._base_url = base_url
         except requests.exceptions.HTTPError as err:
             print(f"Authentication failed: {err}")
-            print("Response:", response.json())
+            try:
+                print("Response:", err.response.json())
+            except ValueError:
+                print("No JSON response received.")
+            return None
+
+    def login(self, base_url: str, username: str, password: str) -> JWT:
+        """Obtain an access token from the appliance without prompting.
+
+        :param base_url: the url of the appliance
+        :param username: the username
+        :param password: the password
+        :return: a JavaScript Web Token (str)
+        """
+        response = self._session.post(
+            f"{base_url}/auth", json={"username": username, "password": password}, verify=VERIFY_SSL
+        )
+        response.raise_for_status()
+        self._token = response.json().get("token")
+        self._base_url = base_url
+        return self._token
+
+    @property
+    def base_url(self) -> str | None:
+        """Return the url of the appliance that the client logged in to."""
+        return self._base_url
+
+    @property
+    def token_expires_at(self) -> float | None:
+        """Return the time the access token expires at, in seconds since the epoch.
+
+        The expiry is read from the token's claims without verifying the token, which is the appliance's job.
+
+        :return: the expiry, None without a token or if the token has no expiry
+        """
+        if not self._token:
+            return None
+        try:
+            payload = self._token.split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        except (IndexError, ValueError):
             return None
+        return claims.get("exp") if isinstance(claims, dict) else None
 
     def test_connection(self) -> JSON:
         """Test the connection by accessing the config of machine the user is authenticating on.
@@ -63,7 +142,7 @@ class APIClient:
             protected_url = f"{self._base_url}/device/{device}/config"
             headers = {"Authorization": f"Bearer {self._token}"}
             try:
-                response = requests.get(protected_url, headers=headers, verify=VERIFY_SSL)
+                response = self._session.get(protected_url, headers=headers, verify=VERIFY_SSL)
                 response.raise_for_status()
                 config = response.json().get("configuration")
                 print(f"Successfully tested connection. Accessed {device} configuration.")
@@ -90,8 +169,9 @@ class APIClient:
             protected_url = f"{self._base_url}/device/configs"
             headers = {"Authorization": f"Bearer {self._token}"}
             try:
-                response = requests.get(protected_url, headers=headers, verify=VERIFY_SSL)
+                response = self._session.get(protected_url, headers=headers, verify=VERIFY_SSL)
                 response.raise_for_status()
+                metrics.inc("zta_bytes_fetched_total", len(response.content), endpoint="/device/configs")
                 device_configs = response.json()
                 print(f"Successfully accessed device configurations for compliance checking.")
                 return device_configs
@@ -112,8 +192,9 @@ class APIClient:
             protected_url = f"{self._base_url}/users/data"
             headers = {"Authorization": f"Bearer {self._token}"}
             try:
-                response = requests.get(protected_url, headers=headers, verify=VERIFY_SSL)
+                response = self._session.get(protected_url, headers=headers, verify=VERIFY_SSL)
                 response.raise_for_status()
+                metrics.inc("zta_bytes_fetched_total", len(response.content), endpoint="/users/data")
                 device_configs = response.json()
                 print(f"Successfully accessed user info. for compliance checking.")
                 return device_configs
@@ -124,3 +205,195 @@ class APIClient:
                 except ValueError:
                     print("No JSON response received.")
                 return None
+
+    def _get(
+        self, path: str, params: dict | None = None, stream: bool = False, endpoint: str | None = None
+    ) -> requests.Response:
+        """Send an authenticated GET request to the appliance.
+
+        :param path: the path of the endpoint
+        :param params: the query parameters, parameters that are None are left out
+        :param stream: stream the response body instead of reading it at once
+        :param endpoint: the endpoint that metrics of the request are labeled with, the path by default
+        :return: the response
+        """
+        headers = {"Authorization": f"Bearer {self._token}"}
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        response = self._session.get(
+            f"{self._base_url}{path}", headers=headers, params=params, verify=VERIFY_SSL, stream=stream
+        )
+        response.raise_for_status()
+        if not stream:
+            metrics.inc("zta_bytes_fetched_total", len(response.content), endpoint=endpoint or path)
+        return response
+
+    def get_device_page(self, page_size: int | None = None, cursor: str | None = None) -> JSON:
+        """Get one page of device configurations.
+
+        :param page_size: the number of devices of the page, every device if None
+        :param cursor: the hostname that the page starts after, the first page if None
+        :return: JSON of the page, the device configurations and the cursor of the next page
+        """
+        return self._get("/device/configs", {"limit": page_size, "cursor": cursor}).json()
+
+    def get_user_page(self, page_size: int | None = None, cursor: str | None = None) -> JSON:
+        """Get one page of user info.
+
+        :param page_size: the number of users of the page, every user if None
+        :param cursor: the username that the page starts after, the first page if None
+        :return: JSON of the page, the user info. and the cursor of the next page
+        """
+        return self._get("/users/data", {"limit": page_size, "cursor": cursor}).json()
+
+    def get_device_data(self, hostname: str) -> JSON:
+        """Get the configuration of a single device.
+
+        :param hostname: the hostname of the device
+        :return: JSON of the device configuration
+        """
+        response = self._get(f"/device/{hostname}/config", endpoint="/device/<hostname>/config")
+        return response.json().get("configuration")
+
+    def get_device_index(self) -> list[tuple[str, str, str, list[str] | None]]:
+        """Get the hostname, device type, ip address and services of every device, without their configurations.
+
+        :return: the hostname, device type, ip address and services of each device, None for the services if the
+            appliance does not index them
+        """
+        response = self._get("/device/index")
+        return [(*row[:3], row[3] if len(row) > 3 else None) for row in response.json().get("devices", [])]
+
+    def _iter_pages(self, path: str, envelope_key: str, params: dict) -> Iterator[dict]:
+        """Get the records of a paginated endpoint, following the cursor of each page.
+
+        :param path: the path of the endpoint
+        :param envelope_key: the key of the records in the response
+        :param params: the query parameters
+        :return: the records
+        """
+        cursor = None
+        while True:
+            page = self._get(path, {**params, "cursor": cursor}).json()
+            yield from page.get(envelope_key, {}).values()
+            cursor = page.get("next_cursor")
+            if not cursor:
+                return
+
+    def _iter_ndjson(self, path: str, params: dict) -> Iterator[dict]:
+        """Get the records of a newline delimited JSON endpoint as they are received.
+
+        :param path: the path of the endpoint
+        :param params: the query parameters
+        :return: the records
+        """
+        size = 0
+        try:
+            with self._get(path, params, stream=True) as response:
+                for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
+                    size += len(line) + 1
+                    if line:
+                        yield json.loads(line)
+        finally:
+            metrics.inc("zta_bytes_fetched_total", size, endpoint=path)
+
+    def iter_device_data(
+        self, page_size: int = DEFAULT_PAGE_SIZE, device_type: str | None = None, hostname_prefix: str | None = None
+    ) -> Iterator[dict]:
+        """Get device configurations one page at a time.
+
+        :param page_size: the number of devices per request
+        :param device_type: only get devices of this type
+        :param hostname_prefix: only get devices with hostnames starting with this prefix
+        :return: the device configurations
+        """
+        params = {"limit": page_size, "device_type": device_type, "hostname_prefix": hostname_prefix}
+        try:
+            yield from self._iter_pages("/device/configs", "configurations", params)
+        except requests.exceptions.HTTPError as err:
+            print(f"Failed to access device configs. Error was: {err}")
+            raise
+
+    def stream_device_data(self, device_type: str | None = None, hostname_prefix: str | None = None) -> Iterator[dict]:
+        """Get device configurations from a single streamed response, one device at a time.
+
+        :param device_type: only get devices of this type
+        :param hostname_prefix: only get devices with hostnames starting with this prefix
+        :return: the device configurations
+        """
+        params = {"device_type": device_type, "hostname_prefix": hostname_prefix}
+        try:
+            yield from self._iter_ndjson("/device/configs/stream", params)
+        except requests.exceptions.HTTPError as err:
+            print(f"Failed to access device configs. Error was: {err}")
+            raise
+
+    def iter_user_info(self, page_size: int = DEFAULT_PAGE_SIZE, username_prefix: str | None = None) -> Iterator[dict]:
+        """Get user info. one page at a time.
+
+        :param page_size: the number of users per request
+        :param username_prefix: only get users with usernames starting with this prefix
+        :return: the user info.
+        """
+        try:
+            yield from self._iter_pages(
+                "/users/data", "users", {"limit": page_size, "username_prefix": username_prefix}
+            )
+        except requests.exceptions.HTTPError as err:
+            print(f"Failed to access user info. Error was: {err}")
+            raise
+
+    def stream_user_info(self, username_prefix: str | None = None) -> Iterator[dict]:
+        """Get user info. from a single streamed response, one user at a time.
+
+        :param username_prefix: only get users with usernames starting with this prefix
+        :return: the user info.
+        """
+        try:
+            yield from self._iter_ndjson("/users/data/stream", {"username_prefix": username_prefix})
+        except requests.exceptions.HTTPError as err:
+            print(f"Failed to access user info. Error was: {err}")
+            raise
+
+    @property
+    def device_mirror(self) -> InventoryMirror:
+        """Return the local mirror of the device inventory."""
+        return self._device_mirror
+
+    @property
+    def user_mirror(self) -> InventoryMirror:
+        """Return the local mirror of the user inventory."""
+        return self._user_mirror
+
+    def _sync(self, path: str, mirror: InventoryMirror) -> set[str]:
+        """Apply the changes since the mirror's version to the mirror.
+
+        :param path: the path of the change feed endpoint
+        :param mirror: the mirror
+        :return: the keys of the records that changed
+        """
+        changes = self._get(path, {"since": mirror.version, "epoch": mirror.epoch}).json()
+        return mirror.apply(changes)
+
+    def sync_device_data(self) -> set[str]:
+        """Bring the local mirror of the device configurations up to date.
+
+        The first sync gets every device. Later syncs only get the devices that changed since the previous one.
+
+        :return: the hostnames of the devices that were added, updated or removed
+        """
+        try:
+            return self._sync("/device/changes", self._device_mirror)
+        except requests.exceptions.HTTPError as err:
+            print(f"Failed to sync device configs. Error was: {err}")
+            raise
+
+    def sync_user_info(self) -> set[str]:
+        """Bring the local mirror of the user info. up to date.
+
+        :return: the usernames of the users that were added, updated or removed
+        """
+        try:
+            return self._sync("/users/changes", self._user_mirror)
+        except requests.exceptions.HTTPError as err:
+            print(f"Failed to sync user info. Error was: {err}")
+            raise
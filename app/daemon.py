@@ -0,0 +1,330 @@
+"""Continuous audit of the appliance inventory, re-evaluating only what changed between polls."""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from app.client import APIClient
+from app.domain_models import AuditResult, Device, User
+from app.exceptions import InvalidDeviceValueError, InvalidUserValueError
+from app.metrics import metrics
+from app.schema import validate_device, validate_user
+from app.zta_checks.address_uniqueness import AddressUniquenessCheck, device_addresses, hostname_key
+from app.zta_checks.auth_and_ac import AuthAndACCheck
+from app.zta_checks.least_privilege import LeastPrivilegeCheck
+from app.zta_checks.logging import LoggingCheck
+from app.zta_checks.network_segmentation import NetworkSegmentationCheck
+from app.zta_checks.segment_overlap import SegmentOverlapCheck, segment_intervals
+
+# seconds between the start of two cycles
+DEFAULT_INTERVAL = 60
+# seconds before the access token expires that it is renewed, the appliance's tokens are valid for 30 minutes
+TOKEN_RENEWAL_MARGIN = 120
+
+
+def _user_references(device: Device) -> set[str]:
+    """Get the usernames that the checks of a device look up.
+
+    :param device: the device
+    :return: the assigned user of a host, or the users of the ACL of any other device
+    """
+    auth = device.configuration.get("auth", {})
+    usernames = set(auth.get("acl", {}).get("allow", [])) | set(auth.get("acl", {}).get("Allow", []))
+    if auth.get("assigned_user"):
+        usernames.add(auth["assigned_user"])
+    return usernames
+
+
+def _connected_device(device: Device) -> str | None:
+    """Get the network device that a host or server is connected to.
+
+    :param device: the device
+    :return: the hostname of the network device, None if the device is not connected to one
+    """
+    return (device.configuration.get("connected_to") or {}).get("device")
+
+
+def _address_keys(device: Device) -> set[str]:
+    """Get the keys of the hostname and the ip addresses of a device that the Address Uniqueness check compares.
+
+    :param device: the device
+    :return: the hostname key, prefixed so that it cannot equal an ip address, and the ip addresses
+    """
+    return device_addresses(device) | {f"hostname:{hostname_key(device)}"}
+
+
+def _is_aaa_server(device: Device | None) -> bool:
+    """Check if the device is the AAA server that every device's logging and auth are checked against."""
+    return device is not None and "AAA" in device.configuration.get("services", [])
+
+
+class AuditDaemon:
+    """Keeps the device and user inventories and the results of every check in memory, polls the appliance's change
+    feeds and re-runs the checks of only the devices that a change can affect.
+
+    A device's results depend on its own configuration, the network device it is connected to, the users it references
+    or that have access to it, the devices that share its hostname or an ip address, and the AAA server. A change to
+    the AAA server re-evaluates every device, and a change to the IPv4 segments of a segmentation policy every device
+    that allows any.
+    """
+
+    def __init__(
+        self,
+        api_client: APIClient,
+        url: str,
+        username: str,
+        password: str,
+        publish: str,
+        interval: float = DEFAULT_INTERVAL,
+    ):
+        """Initialize the daemon.
+
+        :param api_client: the client, logged in or not
+        :param url: the url of the appliance
+        :param username: the username that the access token is renewed with
+        :param password: the password that the access token is renewed with
+        :param publish: the path of the newline delimited JSON file that the results are published to after each cycle
+        :param interval: the seconds between the start of two cycles
+        """
+        self._api_client = api_client
+        self._credentials = (url, username, password)
+        self._publish = publish
+        self._interval = interval
+        self._stop = threading.Event()
+        self._devices: dict[str, Device] = {}
+        self._users: dict[str, User] = {}
+        self._results: dict[tuple[str, str], AuditResult] = {}
+        # reverse indexes of the devices whose checks look up a network device or a user, and that use a hostname or ip
+        self._connected_hosts: dict[str, set[str]] = {}
+        self._referencing_devices: dict[str, set[str]] = {}
+        self._address_owners: dict[str, set[str]] = {}
+        # the devices that allow IPv4 segments, which the Segment Overlap check compares with each other
+        self._segmenting_devices: set[str] = set()
+        # set when a cycle fails part way, so the next cycle does not trust the results it left behind
+        self._full_evaluation = True
+        self.cycles = 0
+
+    @property
+    def results(self) -> list[AuditResult]:
+        """Return the current results, ordered by device and check."""
+        return [self._results[key] for key in sorted(self._results)]
+
+    def add_result(self, device, zta_check, status, details) -> None:
+        """Keep the result of a check, replacing the device's previous result of the check.
+
+        :param device: the hostname of the device
+        :param zta_check: the check
+        :param status: whether the device passed
+        :param details: the sub-check details
+        :return: None
+        """
+        self._results[(device, zta_check)] = AuditResult(device, zta_check, status, details)
+
+    def stop(self) -> None:
+        """Stop the daemon after the current cycle."""
+        self._stop.set()
+
+    def run(self) -> None:
+        """Run cycles until stopped. A failed cycle is reported and retried at the next interval.
+
+        :return: None
+        """
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self.run_cycle()
+            except Exception as err:
+                print(f"Audit cycle failed: {err}", file=sys.stderr)
+            self._stop.wait(max(0.0, self._interval - (time.monotonic() - start)))
+
+    def run_cycle(self) -> int:
+        """Sync the inventories, re-evaluate the devices that a change can affect and publish the results.
+
+        :return: the number of devices that were re-evaluated
+        """
+        start = time.perf_counter()
+        try:
+            devices = self._update()
+        except BaseException:
+            self._full_evaluation = True
+            raise
+
+        self.publish()
+        self.cycles += 1
+        metrics.set_gauge("zta_devices_reported", len(self._devices))
+        metrics.write()
+        failed = Counter(result.zta_check for result in self._results.values() if not result.status)
+        print(
+            f"Cycle {self.cycles}: re-evaluated {len(devices)} of {len(self._devices)} devices in "
+            f"{time.perf_counter() - start:.2f}s, {sum(failed.values())} failed results"
+            + "".join(f", {check}: {count}" for check, count in sorted(failed.items()))
+        )
+        return len(devices)
+
+    def _update(self) -> list[Device]:
+        """Sync the inventories and re-evaluate the devices that a change can affect.
+
+        :return: the devices that were re-evaluated
+        """
+        self._renew_token()
+        changed_devices = self._request(self._api_client.sync_device_data)
+        changed_users = self._request(self._api_client.sync_user_info)
+        if self._full_evaluation:
+            # a failed cycle may have left the inventory behind the mirrors, so rebuild it
+            changed_devices = set(self._devices) | set(self._api_client.device_mirror.records)
+            changed_users = set(self._users) | set(self._api_client.user_mirror.records)
+
+        affected = self._apply_device_changes(changed_devices) | self._apply_user_changes(changed_users)
+        if self._full_evaluation:
+            affected = set(self._devices)
+        for hostname, zta_check in list(self._results):
+            if hostname not in self._devices:
+                del self._results[(hostname, zta_check)]
+
+        devices = [device for hostname, device in self._devices.items() if hostname in affected]
+        if devices:
+            self._evaluate(devices)
+        self._full_evaluation = False
+        return devices
+
+    def _renew_token(self) -> None:
+        """Log in again when the access token is missing or about to expire."""
+        expires_at = self._api_client.token_expires_at
+        if expires_at is None or expires_at - time.time() < TOKEN_RENEWAL_MARGIN:
+            self._api_client.login(*self._credentials)
+
+    def _request(self, request):
+        """Send a request, logging in again and retrying once if the appliance rejected the access token.
+
+        :param request: the client method
+        :return: the response of the request
+        """
+        try:
+            return request()
+        except requests.exceptions.HTTPError as err:
+            if err.response is None or err.response.status_code != 401:
+                raise
+        self._api_client.login(*self._credentials)
+        return request()
+
+    def _apply_device_changes(self, changed: set[str]) -> set[str]:
+        """Apply the changed devices of the mirror to the inventory and its indexes. A device whose record is invalid is
+        reported and left out of the inventory.
+
+        :param changed: the hostnames of the devices that were added, updated or removed
+        :return: the hostnames of the devices whose results may have changed
+        """
+        records = self._api_client.device_mirror.records
+        affected = set(changed)
+        addresses = set()
+        policy_changed = False
+        for hostname in changed:
+            old_device = self._devices.pop(hostname, None)
+            device = None
+            if hostname in records:
+                try:
+                    device = Device(validate_device(records[hostname]))
+                except InvalidDeviceValueError as err:
+                    # an invalid record is left out of the inventory, like a removed device, until it is fixed
+                    print(f"Skipping device {hostname}, the appliance returned invalid data: {err}", file=sys.stderr)
+            if _is_aaa_server(old_device) or _is_aaa_server(device):
+                self._full_evaluation = True
+            segments = segment_intervals(device) if device is not None else set()
+            policy_changed |= segments != (segment_intervals(old_device) if old_device is not None else set())
+            if segments:
+                self._segmenting_devices.add(hostname)
+            else:
+                self._segmenting_devices.discard(hostname)
+            if old_device is not None:
+                self._index(old_device, remove=True)
+                addresses |= _address_keys(old_device)
+            if device is not None:
+                self._devices[hostname] = device
+                self._index(device)
+                addresses |= _address_keys(device)
+        for hostname in changed:
+            affected |= self._connected_hosts.get(hostname, set())
+        # the devices that shared an old hostname or ip address, or share a new one
+        for key in addresses:
+            affected |= self._address_owners.get(key, set())
+        if policy_changed:
+            affected |= self._segmenting_devices
+        return affected
+
+    def _apply_user_changes(self, changed: set[str]) -> set[str]:
+        """Apply the changed users of the mirror to the inventory. A user whose record is invalid is reported and left
+        out of the inventory.
+
+        :param changed: the usernames of the users that were added, updated or removed
+        :return: the hostnames of the devices whose results may have changed
+        """
+        records = self._api_client.user_mirror.records
+        affected = set()
+        for username in changed:
+            old_user = self._users.pop(username, None)
+            if username in records:
+                try:
+                    self._users[username] = User(validate_user(records[username]))
+                except InvalidUserValueError as err:
+                    print(f"Skipping user {username}, the appliance returned invalid data: {err}", file=sys.stderr)
+            for user in (old_user, self._users.get(username)):
+                if user is not None:
+                    affected.update(user.devices)
+            affected |= self._referencing_devices.get(username, set())
+        return affected
+
+    def _index(self, device: Device, remove: bool = False) -> None:
+        """Add a device to, or remove it from, the reverse indexes.
+
+        :param device: the device
+        :param remove: remove the device instead of adding it
+        :return: None
+        """
+        keys = [(self._referencing_devices, username) for username in _user_references(device)]
+        if _connected_device(device):
+            keys.append((self._connected_hosts, _connected_device(device)))
+        keys += [(self._address_owners, key) for key in _address_keys(device)]
+        for index, key in keys:
+            if remove:
+                index[key].discard(device.hostname)
+                if not index[key]:
+                    del index[key]
+            else:
+                index.setdefault(key, set()).add(device.hostname)
+
+    def _evaluate(self, devices: list[Device]) -> None:
+        """Run every check on the devices against the whole inventory.
+
+        :param devices: the devices to check
+        :return: None
+        """
+        all_devices = list(self._devices.values())
+        users = list(self._users.values())
+        LoggingCheck(all_devices).run_logging_checks(self, devices)
+        AuthAndACCheck(all_devices, users).run_auth_and_ac_checks(self, devices)
+        NetworkSegmentationCheck(all_devices).run_network_segmentation_checks(self, devices)
+        LeastPrivilegeCheck(all_devices, users).run_least_privilege_check(self, devices)
+        AddressUniquenessCheck(all_devices).run_address_uniqueness_check(self, devices)
+        SegmentOverlapCheck(all_devices).run_segment_overlap_check(self, devices)
+
+    def publish(self) -> None:
+        """Atomically replace the published results file with the current results.
+
+        :return: None
+        """
+        directory = os.path.dirname(os.path.abspath(self._publish))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".zta_results_", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                for result in self.results:
+                    f.write(json.dumps(result._asdict()) + "\n")
+            os.replace(tmp_path, self._publish)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,478 @@
+"""Distributed audit, in which a coordinator splits the fetched inventory into shards on a work queue and workers on
+any number of hosts run the checks of the shards and send back the results of their devices.
+
+The work queue is a directory that the coordinator and the workers share, a local directory or a network file system
+mount. Each state of a shard is a directory, and a shard moves between them by atomic renames:
+
+    pending/<shard>.<attempt>.json            waiting for a worker
+    leased/<shard>.<attempt>.<worker>.json    claimed by a worker, whose lease lasts until the file's modification
+                                              time is older than the lease seconds, and is renewed by touching it
+    results/<shard>.json                      the results of the devices of the shard
+    failed/<shard>.json                       given up after the max attempts
+
+Only one worker can rename a pending shard, so a shard is leased to one worker at a time. The coordinator puts shards
+whose lease expired, because their worker died or hung, back on the queue for another worker. A worker that loses its
+lease and finishes anyway writes the same results as the one that retries the shard, so results are merged once per
+shard whichever worker wrote them. The hosts' clocks must be synchronized, as lease expiry compares modification times
+with the coordinator's clock.
+
+The facts of the fleet that the checks of a device need (the AAA servers, the network devices and the users, like the
+pre-pass of the streaming audit) are written once to context.json. Address Uniqueness and Segment Overlap compare every
+device with the whole fleet, so the coordinator runs them itself on the inventory it fetched.
+
+Usage of a worker:
+    python -m app.distributed --queue /mnt/zta/queue
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import NamedTuple
+
+from app.audit_reporter import AuditReporter, ResultCollector
+from app.domain_models import AuditResult, Device, User
+from app.exceptions import WorkQueueError
+from app.metrics import metrics
+from app.pipeline import NETWORK_DEVICE_TYPES
+from app.zta_checks.address_uniqueness import AddressUniquenessCheck
+from app.zta_checks.auth_and_ac import AuthAndACCheck
+from app.zta_checks.least_privilege import LeastPrivilegeCheck
+from app.zta_checks.logging import LoggingCheck
+from app.zta_checks.network_segmentation import NetworkSegmentationCheck
+from app.zta_checks.segment_overlap import SegmentOverlapCheck
+
+# seconds that a worker holds a shard without renewing its lease before the shard is retried by another worker
+DEFAULT_LEASE_SECONDS = 30.0
+# times that a shard is attempted before the audit fails
+DEFAULT_MAX_ATTEMPTS = 3
+# default number of devices per shard
+DEFAULT_SHARD_SIZE = 500
+# seconds between the polls of the queue by idle workers and by the coordinator
+DEFAULT_POLL_INTERVAL = 0.5
+_STATES = ("pending", "leased", "results", "failed")
+
+
+class Lease(NamedTuple):
+    """A shard claimed by a worker."""
+
+    shard: str
+    attempt: int
+    path: str
+
+
+class FileWorkQueue:
+    """Work queue of shards in a shared directory, with leases that expire unless their worker renews them."""
+
+    def __init__(self, directory: str):
+        """Open the work queue that a coordinator created.
+
+        :param directory: the directory of the queue
+        """
+        self._directory = directory
+        with open(os.path.join(directory, "queue.json"), "r") as f:
+            settings = json.load(f)
+        self.lease_seconds = settings["lease_seconds"]
+        self.max_attempts = settings["max_attempts"]
+
+    @classmethod
+    def create(
+        cls, directory: str, lease_seconds: float = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ) -> "FileWorkQueue":
+        """Create an empty work queue.
+
+        :param directory: the directory of the queue, which must not hold a queue already
+        :param lease_seconds: the seconds a lease lasts unless it is renewed
+        :param max_attempts: the times a shard is attempted before it fails
+        :return: the work queue
+        """
+        if os.path.exists(os.path.join(directory, "queue.json")):
+            raise WorkQueueError(f"{directory} already holds a work queue")
+        for state in _STATES:
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+        _write_json(
+            os.path.join(directory, "queue.json"), {"lease_seconds": lease_seconds, "max_attempts": max_attempts}
+        )
+        return cls(directory)
+
+    def _path(self, state: str, *name_parts) -> str:
+        """Get the path of a shard file from the parts of its name."""
+        return os.path.join(self._directory, state, ".".join(str(part) for part in name_parts) + ".json")
+
+    def _names(self, state: str) -> list[str]:
+        """Get the names of the shard files of a state, without the partly written files."""
+        return [name for name in os.listdir(os.path.join(self._directory, state)) if not name.startswith(".")]
+
+    @property
+    def closed(self) -> bool:
+        """Whether the coordinator closed the queue, after which workers exit."""
+        return os.path.exists(os.path.join(self._directory, "closed"))
+
+    def close(self) -> None:
+        """Close the queue, so that its workers exit.
+
+        :return: None
+        """
+        open(os.path.join(self._directory, "closed"), "w").close()
+
+    def write_context(self, context: dict) -> None:
+        """Write the facts of the fleet that the checks of every shard need.
+
+        :param context: the context
+        :return: None
+        """
+        _write_json(os.path.join(self._directory, "context.json"), context)
+
+    def read_context(self) -> dict:
+        """Read the facts of the fleet that the checks of every shard need.
+
+        :return: the context
+        """
+        with open(os.path.join(self._directory, "context.json"), "r") as f:
+            return json.load(f)
+
+    def put(self, shard: str, payload: dict) -> None:
+        """Put a shard on the queue.
+
+        :param shard: the name of the shard, without dots
+        :param payload: the shard
+        :return: None
+        """
+        _write_json(self._path("pending", shard, 1), payload)
+
+    def claim(self, worker: str) -> tuple[Lease, dict] | None:
+        """Lease a pending shard.
+
+        :param worker: the name of the worker, without dots
+        :return: the lease and the shard, or None if no shard is pending
+        """
+        pending_dir = os.path.join(self._directory, "pending")
+        names = self._names("pending")
+        # workers start from different shards, so that they rarely race for the same one
+        random.shuffle(names)
+        for name in names:
+            shard, attempt, _ = name.split(".")
+            path = os.path.join(pending_dir, name)
+            lease_path = self._path("leased", shard, attempt, worker)
+            try:
+                # the lease starts when the shard is claimed, not when it was put on the queue
+                os.utime(path)
+                os.rename(path, lease_path)
+            except FileNotFoundError:
+                # another worker claimed it first
+                continue
+            lease = Lease(shard, int(attempt), lease_path)
+            if os.path.exists(self._path("results", shard)):
+                # a worker whose lease expired finished the shard after it was retried
+                self.complete(lease, None)
+                continue
+            with open(lease_path, "r") as f:
+                return lease, json.load(f)
+        return None
+
+    def renew(self, lease: Lease) -> bool:
+        """Renew a lease.
+
+        :param lease: the lease
+        :return: False if the lease expired and the shard was put back on the queue
+        """
+        try:
+            os.utime(lease.path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, lease: Lease, results: list | None) -> None:
+        """Write the results of a leased shard and end the lease.
+
+        :param lease: the lease
+        :param results: the results of the devices of the shard, None to keep those another worker wrote
+        :return: None
+        """
+        if results is not None:
+            _write_json(self._path("results", lease.shard), results)
+        try:
+            os.unlink(lease.path)
+        except FileNotFoundError:
+            pass
+
+    def release(self, lease: Lease) -> None:
+        """Put a leased shard back on the queue for another attempt, after its worker failed to check it.
+
+        :param lease: the lease
+        :return: None
+        """
+        self._retry(lease.path, lease.shard, lease.attempt)
+
+    def _retry(self, lease_path: str, shard: str, attempt: int) -> None:
+        """Put a leased shard back on the queue, or fail it when it ran out of attempts."""
+        retry_path = self._path("pending", shard, attempt + 1) if attempt < self.max_attempts else None
+        try:
+            os.rename(lease_path, retry_path or self._path("failed", shard))
+        except FileNotFoundError:
+            # the worker completed it, or it was already retried
+            pass
+
+    def requeue_expired(self) -> int:
+        """Put the shards whose lease expired back on the queue.
+
+        :return: the number of shards put back
+        """
+        leased_dir = os.path.join(self._directory, "leased")
+        expiry = time.time() - self.lease_seconds
+        requeued = 0
+        for name in self._names("leased"):
+            path = os.path.join(leased_dir, name)
+            try:
+                expired = os.stat(path).st_mtime < expiry
+            except FileNotFoundError:
+                continue
+            if expired:
+                shard, attempt, _, _ = name.split(".")
+                self._retry(path, shard, int(attempt))
+                requeued += 1
+        return requeued
+
+    def completed(self) -> list[str]:
+        """Get the shards that have results.
+
+        :return: the names of the shards
+        """
+        return [name.partition(".")[0] for name in self._names("results")]
+
+    def read_results(self, shard: str) -> list:
+        """Read the results of a shard.
+
+        :param shard: the name of the shard
+        :return: the results of the devices of the shard
+        """
+        with open(self._path("results", shard), "r") as f:
+            return json.load(f)
+
+    def failed(self) -> list[str]:
+        """Get the shards that ran out of attempts.
+
+        :return: the names of the shards
+        """
+        return [name.partition(".")[0] for name in self._names("failed")]
+
+
+def _write_json(filepath: str, value) -> None:
+    """Write a JSON file atomically, so that readers on any host see all of it or none of it."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class AuditWorker:
+    """Runs the checks of the shards of a work queue until the queue is closed."""
+
+    def __init__(self, work_queue: FileWorkQueue, name: str | None = None):
+        """Initialize the worker.
+
+        :param work_queue: the work queue
+        :param name: the name of the worker, the host name and process id by default
+        """
+        self._queue = work_queue
+        self.name = (name or f"{socket.gethostname()}-{os.getpid()}").replace(".", "-")
+        self._checks = None
+        self.shards = 0
+
+    def _load_checks(self) -> list:
+        """Create the checks with the context of the fleet, once for every shard."""
+        context = self._queue.read_context()
+        devices = [Device(record) for record in context["devices"]]
+        users = [User(record) for record in context["users"]]
+        return [
+            LoggingCheck(devices).run_logging_checks,
+            AuthAndACCheck(devices, users).run_auth_and_ac_checks,
+            NetworkSegmentationCheck(devices).run_network_segmentation_checks,
+            LeastPrivilegeCheck(devices, users).run_least_privilege_check,
+        ]
+
+    def check_shard(self, shard: dict) -> list[AuditResult]:
+        """Run the checks of the devices of a shard.
+
+        :param shard: the shard, with the records of its devices
+        :return: the results of the devices
+        """
+        if self._checks is None:
+            self._checks = self._load_checks()
+        devices = [Device(record) for record in shard["devices"]]
+        collector = ResultCollector()
+        for run_check in self._checks:
+            run_check(collector, devices)
+        return collector.results
+
+    def run(self, poll_interval: float = DEFAULT_POLL_INTERVAL) -> int:
+        """Check shards until the queue is closed.
+
+        :param poll_interval: the seconds between the polls of the queue while no shard is pending
+        :return: the number of shards checked
+        """
+        while not self._queue.closed:
+            claimed = self._queue.claim(self.name)
+            if claimed is None:
+                time.sleep(poll_interval)
+                continue
+            lease, shard = claimed
+            stop_renewing = threading.Event()
+            renewer = threading.Thread(target=self._renew, args=(lease, stop_renewing), daemon=True)
+            renewer.start()
+            try:
+                results = self.check_shard(shard)
+            except Exception as err:
+                print(f"Worker {self.name} failed shard {lease.shard}: {err!r}", file=sys.stderr)
+                self._queue.release(lease)
+                continue
+            finally:
+                stop_renewing.set()
+                renewer.join()
+            self._queue.complete(lease, results)
+            self.shards += 1
+        return self.shards
+
+    def _renew(self, lease: Lease, stop: threading.Event) -> None:
+        """Renew a lease until the shard is checked, three times per lease period."""
+        while not stop.wait(self._queue.lease_seconds / 3):
+            if not self._queue.renew(lease):
+                return
+
+
+class AuditCoordinator:
+    """Splits the inventory into shards on a work queue, and merges the results of the workers into the report."""
+
+    def __init__(
+        self,
+        work_queue: FileWorkQueue,
+        audit_reporter: AuditReporter,
+        shard_size: int = DEFAULT_SHARD_SIZE,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        """Initialize the coordinator.
+
+        :param work_queue: the work queue, created for this audit
+        :param audit_reporter: the audit reporter
+        :param shard_size: the number of devices per shard
+        :param poll_interval: the seconds between the polls of the queue for results and expired leases
+        """
+        self._queue = work_queue
+        self._audit_reporter = audit_reporter
+        self._shard_size = shard_size
+        self._poll_interval = poll_interval
+        self.requeued = 0
+
+    def run(self, device_records: list[dict], user_records: list[dict], timeout: float | None = None) -> int:
+        """Audit the devices with the workers of the queue, then close the queue.
+
+        :param device_records: the validated device records
+        :param user_records: the validated user records
+        :param timeout: the seconds to wait for the results of every shard, forever by default
+        :return: the number of shards
+        """
+        devices = [Device(record) for record in device_records]
+        self._audit_reporter.register_devices(devices)
+        try:
+            shards = self._put_shards(device_records, user_records)
+            self._merge_results(shards, time.monotonic() + timeout if timeout is not None else None)
+        finally:
+            self._queue.close()
+
+        with metrics.timer("zta_check_duration_seconds", check="Address Uniqueness"):
+            AddressUniquenessCheck(devices).run_address_uniqueness_check(self._audit_reporter)
+        with metrics.timer("zta_check_duration_seconds", check="Segment Overlap"):
+            SegmentOverlapCheck(devices).run_segment_overlap_check(self._audit_reporter)
+        metrics.inc("zta_devices_processed_total", len(devices))
+        return len(shards)
+
+    def _put_shards(self, device_records: list[dict], user_records: list[dict]) -> set[str]:
+        """Write the context of the fleet, then the shards of the devices.
+
+        :return: the names of the shards
+        """
+        context_devices = [
+            record
+            for record in device_records
+            if record["device_type"] == "server" and "AAA" in record["configuration"].get("services", [])
+        ]
+        context_devices += [record for record in device_records if record["device_type"] in NETWORK_DEVICE_TYPES]
+        self._queue.write_context({"devices": context_devices, "users": user_records})
+        shards = set()
+        for index in range(0, len(device_records), self._shard_size):
+            shard = f"shard-{index // self._shard_size:06d}"
+            self._queue.put(shard, {"devices": device_records[index : index + self._shard_size]})
+            shards.add(shard)
+        return shards
+
+    def _merge_results(self, shards: set[str], deadline: float | None) -> None:
+        """Add the results of each shard to the report once, retrying the shards whose lease expired.
+
+        :param shards: the names of the shards
+        :param deadline: the monotonic time by which every shard must have results
+        :return: None
+        """
+        merged = set()
+        while merged != shards:
+            for shard in sorted(set(self._queue.completed()) - merged):
+                for device, zta_check, status, details in self._queue.read_results(shard):
+                    self._audit_reporter.add_result(device, zta_check, status, details)
+                merged.add(shard)
+            if merged == shards:
+                break
+            failed = self._queue.failed()
+            if failed:
+                raise WorkQueueError(f"shards {', '.join(sorted(failed))} failed {self._queue.max_attempts} times")
+            if deadline is not None and time.monotonic() > deadline:
+                raise WorkQueueError(f"{len(shards - merged)} shards have no results before the timeout")
+            self.requeued += self._queue.requeue_expired()
+            time.sleep(self._poll_interval)
+
+
+def start_local_workers(directory: str, count: int) -> list[subprocess.Popen]:
+    """Start worker processes on this host.
+
+    :param directory: the directory of the work queue
+    :param count: the number of workers
+    :return: the worker processes
+    """
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return [
+        subprocess.Popen([sys.executable, "-m", "app.distributed", "--queue", directory], cwd=root_dir)
+        for _ in range(count)
+    ]
+
+
+def main():
+    """Run a worker of a distributed audit.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Run the checks of the shards of a distributed ZTA audit.")
+    parser.add_argument("--queue", required=True, help="directory of the work queue, shared with the coordinator")
+    parser.add_argument("--name", help="name of the worker (default: host name and process id)")
+    parser.add_argument(
+        "--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="seconds between polls of an idle queue"
+    )
+    args = parser.parse_args()
+
+    # the coordinator creates the queue, which workers started first wait for
+    while not os.path.exists(os.path.join(args.queue, "queue.json")):
+        time.sleep(args.poll_interval)
+    worker = AuditWorker(FileWorkQueue(args.queue), args.name)
+    shards = worker.run(args.poll_interval)
+    print(f"Worker {worker.name} checked {shards} shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 """Domain model for device."""
 
 import ipaddress
-from typing import Any
+from typing import Any, NamedTuple
 
 from app.exceptions import (
     InvalidDeviceTypeError,
@@ -108,3 +108,12 @@ class User:
     def __str__(self):
         """Return the string representation of the User."""
         return f"User(Username: {self._username}, Roles: {self._roles})"
+
+
+class AuditResult(NamedTuple):
+    """A single ZTA check result for a device."""
+
+    device: str
+    zta_check: str
+    status: bool
+    details: str
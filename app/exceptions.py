@@ -55,3 +55,38 @@ class InvalidUserRolesError(InvalidUserValueError):
     """Invalid user roles."""
 
     pass
+
+
+class AuditReportWriteError(Exception):
+    """Failed to write results to the audit report."""
+
+    def __init__(self, filepath):
+        super().__init__(f"Failed to write audit report results: {filepath}.")
+
+
+class ApplianceRequestError(Exception):
+    """Data could not be retrieved from the appliance."""
+
+    def __init__(self, resource):
+        super().__init__(f"Failed to get {resource} from the appliance.")
+
+
+class InvalidSnapshotError(Exception):
+    """An inventory snapshot could not be read."""
+
+    def __init__(self, filepath, reason):
+        super().__init__(f"Invalid inventory snapshot: {filepath}, {reason}.")
+
+
+class InvalidRuleSetError(Exception):
+    """A rule set could not be loaded."""
+
+    def __init__(self, source, reason):
+        super().__init__(f"Invalid rule set: {source}, {reason}.")
+
+
+class WorkQueueError(Exception):
+    """A distributed audit could not be completed."""
+
+    def __init__(self, reason):
+        super().__init__(f"Distributed audit failed: {reason}.")
@@ -0,0 +1,227 @@
+"""Timers, counters and gauges of an audit run.
+
+Metrics are enabled by setting METRICS_FILE, the path of a JSON metrics file, and/or METRICS_PROMETHEUS_FILE, the
+path of a file in the Prometheus text exposition format (e.g. for the node exporter's textfile collector). When
+neither is set, every call returns after a single attribute check, so instrumentation can stay in hot paths.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# environment variables of the paths of the metrics files
+METRICS_FILE_ENV_VAR = "METRICS_FILE"
+METRICS_PROMETHEUS_FILE_ENV_VAR = "METRICS_PROMETHEUS_FILE"
+
+_DISABLED_TIMER = nullcontext()
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _key(name: str, labels: dict[str, str]) -> tuple[str, Labels]:
+    """Get the key of a metric and its labels."""
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """Registry of timers, counters and gauges."""
+
+    def __init__(self, enabled: bool = False):
+        """Initialize the registry.
+
+        :param enabled: boolean indicating whether metrics are recorded
+        """
+        self.enabled = enabled
+        self.json_file: str | None = None
+        self.prometheus_file: str | None = None
+        self._lock = threading.Lock()
+        self._timers: dict[tuple[str, Labels], list[float]] = {}
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._gauges: dict[tuple[str, Labels], float] = {}
+
+    def configure(self, json_file: str | None, prometheus_file: str | None) -> None:
+        """Set the files that the metrics are written to, enabling the registry if either is set.
+
+        :param json_file: the path of the JSON metrics file
+        :param prometheus_file: the path of the Prometheus metrics file
+        :return: None
+        """
+        self.json_file = json_file
+        self.prometheus_file = prometheus_file
+        self.enabled = bool(json_file or prometheus_file)
+
+    def reset(self) -> None:
+        """Remove every recorded metric.
+
+        :return: None
+        """
+        with self._lock:
+            self._timers.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def timer(self, name: str, **labels: str):
+        """Time a block of code.
+
+        :param name: the metric name, in seconds
+        :param labels: the metric labels
+        :return: a context manager timing its block
+        """
+        if not self.enabled:
+            return _DISABLED_TIMER
+        return self._timer(name, labels)
+
+    @contextmanager
+    def _timer(self, name: str, labels: dict[str, str]):
+        """Time a block of code and record its duration."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """Record a duration of a timer.
+
+        :param name: the metric name
+        :param seconds: the duration
+        :param labels: the metric labels
+        :return: None
+        """
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            # count, sum and max of the durations
+            timer = self._timers.setdefault(key, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increment a counter.
+
+        :param name: the metric name
+        :param value: the increment
+        :param labels: the metric labels
+        :return: None
+        """
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """Set a gauge.
+
+        :param name: the metric name
+        :param value: the value
+        :param labels: the metric labels
+        :return: None
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def to_dict(self) -> dict[str, list[dict]]:
+        """Get the recorded metrics.
+
+        :return: the timers, counters and gauges, each a list of metrics with their name, labels and values
+        """
+        with self._lock:
+            return {
+                "timers": [
+                    {"name": name, "labels": dict(labels), "count": count, "sum": total, "max": maximum}
+                    for (name, labels), (count, total, maximum) in sorted(self._timers.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "gauges": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._gauges.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        """Format the recorded metrics in the Prometheus text exposition format.
+
+        Timers are exposed as summaries without quantiles, with a gauge of their max duration.
+
+        :return: the metrics text
+        """
+        metrics = self.to_dict()
+        lines = []
+        typed = set()
+
+        def add(name: str, metric_type: str, sample: str, labels: dict[str, str], value: float) -> None:
+            if name not in typed:
+                lines.append(f"# TYPE {name} {metric_type}")
+                typed.add(name)
+            label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+            lines.append(f"{sample}{{{label_text}}} {value}" if label_text else f"{sample} {value}")
+
+        for timer in metrics["timers"]:
+            add(timer["name"], "summary", f"{timer['name']}_sum", timer["labels"], timer["sum"])
+            add(timer["name"], "summary", f"{timer['name']}_count", timer["labels"], timer["count"])
+        for timer in metrics["timers"]:
+            add(f"{timer['name']}_max", "gauge", f"{timer['name']}_max", timer["labels"], timer["max"])
+        for counter in metrics["counters"]:
+            add(counter["name"], "counter", counter["name"], counter["labels"], counter["value"])
+        for gauge in metrics["gauges"]:
+            add(gauge["name"], "gauge", gauge["name"], gauge["labels"], gauge["value"])
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_file: str | None = None, prometheus_file: str | None = None) -> None:
+        """Write the recorded metrics, with the peak memory of the process as a gauge.
+
+        :param json_file: the path of the JSON metrics file, by default the configured one
+        :param prometheus_file: the path of the Prometheus metrics file, by default the configured one
+        :return: None
+        """
+        if not self.enabled:
+            return
+        json_file = json_file or self.json_file
+        prometheus_file = prometheus_file or self.prometheus_file
+        try:
+            import resource
+        except ImportError:  # pragma: no cover - resource is Unix only, so Windows runs have no peak memory gauge
+            pass
+        else:
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            self.set_gauge("zta_peak_memory_bytes", max_rss if sys.platform == "darwin" else max_rss * 1024)
+        self.set_gauge("zta_last_run_timestamp_seconds", time.time())
+        if json_file:
+            with open(json_file, "w") as f:
+                json.dump(self.to_dict(), f, indent=2)
+        if prometheus_file:
+            # written to a temporary file and renamed, so a collector never reads a partial file
+            tmp_file = f"{prometheus_file}.tmp"
+            with open(tmp_file, "w") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_file, prometheus_file)
+
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def configure_from_environment() -> None:
+    """Configure the metrics of the process from METRICS_FILE and METRICS_PROMETHEUS_FILE.
+
+    The entry point calls this after loading the .env file, so importing this module reads neither.
+
+    :return: None
+    """
+    metrics.configure(os.getenv(METRICS_FILE_ENV_VAR), os.getenv(METRICS_PROMETHEUS_FILE_ENV_VAR))
+
+
+metrics = Metrics()
@@ -0,0 +1,173 @@
+"""Streaming audit, in which devices flow from the appliance through validation and the checks to the report in small
+batches instead of each phase finishing over the whole fleet before the next one starts."""
+
+import queue
+import threading
+import time
+
+from app.audit_reporter import AuditReporter
+from app.client import APIClient
+from app.domain_models import Device, User
+from app.metrics import metrics
+from app.schema import validate_device, validate_user
+from app.zta_checks.auth_and_ac import AuthAndACCheck
+from app.zta_checks.least_privilege import LeastPrivilegeCheck
+from app.zta_checks.logging import LoggingCheck
+from app.zta_checks.network_segmentation import NetworkSegmentationCheck
+from app.zta_checks.segment_overlap import SegmentOverlapCheck
+
+NETWORK_DEVICE_TYPES = ["router", "switch", "firewall"]
+# device types streamed by the main pass, network devices are kept in memory by the pre-pass
+STREAMED_DEVICE_TYPES = ["server", "host"]
+# default number of devices per batch
+DEFAULT_BATCH_SIZE = 200
+# default number of fetched batches waiting on the checks before the fetcher blocks
+DEFAULT_QUEUE_SIZE = 8
+# seconds between checks of whether the checks stopped, while the fetcher waits on a full queue
+_PUT_TIMEOUT = 0.1
+
+
+class AuditPipeline:
+    """Runs every check on the devices of the appliance as they are streamed, with one thread fetching batches of
+    devices onto a bounded queue and the calling thread validating and checking them and adding their results to the
+    report.
+
+    The facts that the checks of a device need from the rest of the fleet are gathered by a pre-pass first: the
+    network devices that hosts and servers are connected to, the AAA server that is also the log server, and the users.
+    The AAA server is looked for among the servers, so only the network devices, the AAA servers and the users are
+    held in memory, plus the batches in flight. Segment Overlap only compares the segmentation policies of the network
+    devices, so it runs on the pre-pass too. Address Uniqueness needs every device of the fleet and is left out.
+    """
+
+    def __init__(
+        self,
+        api_client: APIClient,
+        audit_reporter: AuditReporter,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ):
+        """Initialize the pipeline.
+
+        :param api_client: the authenticated client
+        :param audit_reporter: the audit reporter, in constant memory mode or not
+        :param batch_size: the number of devices per batch
+        :param queue_size: the max number of fetched batches waiting on the checks
+        """
+        self._api_client = api_client
+        self._audit_reporter = audit_reporter
+        self._batch_size = batch_size
+        self._queue: queue.Queue[list[dict] | Exception | None] = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._check_durations = dict.fromkeys(AuditReporter.ZTA_CHECK_COLUMNS, 0.0)
+        self.devices = 0
+        self.first_result_seconds: float | None = None
+
+    def run(self) -> int:
+        """Audit every device of the appliance.
+
+        :return: the number of devices audited
+        """
+        start = time.perf_counter()
+        with metrics.timer("zta_phase_duration_seconds", phase="prepass"):
+            network_devices, aaa_servers, users = self._prepass()
+        metrics.inc("zta_users_processed_total", len(users))
+        context = aaa_servers + network_devices
+        checks = [
+            ("Logging", LoggingCheck(context).run_logging_checks),
+            ("Auth and AC", AuthAndACCheck(context, users).run_auth_and_ac_checks),
+            ("Network Segmentation", NetworkSegmentationCheck(context).run_network_segmentation_checks),
+            ("Least Privilege", LeastPrivilegeCheck(context, users).run_least_privilege_check),
+            ("Segment Overlap", SegmentOverlapCheck(network_devices).run_segment_overlap_check),
+        ]
+
+        fetcher = threading.Thread(target=self._fetch, name="audit-pipeline-fetcher", daemon=True)
+        fetcher.start()
+        try:
+            with metrics.timer("zta_phase_duration_seconds", phase="stream"):
+                for index in range(0, len(network_devices), self._batch_size):
+                    self._check_batch(network_devices[index : index + self._batch_size], checks, start)
+                while (records := self._queue.get()) is not None:
+                    if isinstance(records, Exception):
+                        raise records
+                    self._check_batch([Device(validate_device(record)) for record in records], checks, start)
+        finally:
+            self._stop.set()
+            fetcher.join()
+        for zta_check, seconds in self._check_durations.items():
+            metrics.observe("zta_check_duration_seconds", seconds, check=zta_check)
+        if self.first_result_seconds is not None:
+            metrics.set_gauge("zta_first_result_seconds", self.first_result_seconds)
+        return self.devices
+
+    def _prepass(self) -> tuple[list[Device], list[Device], list[User]]:
+        """Gather the facts of the fleet that the checks of a device depend on.
+
+        :return: the network devices, the AAA servers and the users
+        """
+        network_devices = [
+            Device(validate_device(record))
+            for device_type in NETWORK_DEVICE_TYPES
+            for record in self._api_client.stream_device_data(device_type)
+        ]
+        aaa_servers = [
+            Device(validate_device(record))
+            for record in self._api_client.stream_device_data("server")
+            if "AAA" in record.get("configuration", {}).get("services", [])
+        ]
+        users = [User(validate_user(record)) for record in self._api_client.stream_user_info()]
+        return network_devices, aaa_servers, users
+
+    def _fetch(self) -> None:
+        """Put batches of the streamed device records on the queue, then the end sentinel, or the error of the fetch.
+
+        :return: None
+        """
+        try:
+            batch = []
+            for device_type in STREAMED_DEVICE_TYPES:
+                records = self._api_client.stream_device_data(device_type)
+                for record in records:
+                    batch.append(record)
+                    if len(batch) == self._batch_size:
+                        if not self._put(batch):
+                            records.close()
+                            return
+                        batch = []
+            if batch and not self._put(batch):
+                return
+            self._put(None)
+        except Exception as err:
+            self._put(err)
+
+    def _put(self, item) -> bool:
+        """Put an item on the queue, waiting while it is full unless the checks stopped.
+
+        :param item: the batch, error or end sentinel
+        :return: False if the checks stopped
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _check_batch(self, devices: list[Device], checks: list, start: float) -> None:
+        """Run every check on a batch of devices, adding all results of a device before the next device's.
+
+        :param devices: the devices
+        :param checks: the checks and the functions that run them
+        :param start: the start time of the pipeline
+        :return: None
+        """
+        self._audit_reporter.register_devices(devices)
+        for device in devices:
+            for zta_check, run_check in checks:
+                check_start = time.perf_counter()
+                run_check(self._audit_reporter, [device])
+                self._check_durations[zta_check] += time.perf_counter() - check_start
+            if self.first_result_seconds is None:
+                self.first_result_seconds = time.perf_counter() - start
+        self.devices += len(devices)
+        metrics.inc("zta_devices_processed_total", len(devices))
@@ -0,0 +1,259 @@
+"""Profiling and memory tracing of an audit run.
+
+The CPU profile is either a cProfile pstats file, which only covers the main thread, or folded stacks from a sampling
+profiler, which covers every thread including the report writer, and can be rendered with flamegraph.pl or
+speedscope. Memory tracing records the peak traced memory of each phase, and the allocation sites and modules that
+retained the most memory during it, with tracemalloc. Tracing slows the run down, so the phase times of a traced run
+are not representative.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import NamedTuple
+
+PROFILERS = ["cprofile", "sampling"]
+# interval between samples of the sampling profiler in seconds
+DEFAULT_SAMPLE_INTERVAL = 0.005
+# number of frames kept per traced allocation
+TRACEMALLOC_FRAMES = 1
+TOP_SITES = 10
+
+_DISABLED_PHASE = nullcontext()
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class PhaseMemory(NamedTuple):
+    """Memory traced during a phase of the audit."""
+
+    phase: str
+    peak: int
+    retained: int
+    top_sites: list[tuple[str, int]]
+    top_modules: list[tuple[str, int]]
+
+
+def module_name(filename: str) -> str:
+    """Get the name of the module of a source file, e.g. 'app.domain_models' or 'xlsxwriter.worksheet'.
+
+    :param filename: the path of the source file
+    :return: the module name
+    """
+    if filename.startswith("<"):
+        # frozen and generated code, e.g. '<frozen importlib._bootstrap>'
+        return filename
+    if filename.startswith(_ROOT_DIR + os.sep):
+        return os.path.splitext(os.path.relpath(filename, _ROOT_DIR))[0].replace(os.sep, ".")
+    parts = filename.split(os.sep)
+    for marker in ("site-packages", "dist-packages"):
+        if marker in parts:
+            return os.path.splitext(".".join(parts[parts.index(marker) + 1 :]))[0]
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+class SamplingProfiler:
+    """Profiler that samples the stacks of every thread at an interval and counts them as folded stacks."""
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        """Initialize the profiler.
+
+        :param interval: the interval between samples in seconds
+        """
+        self._interval = interval
+        self._stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start sampling.
+
+        :return: None
+        """
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling.
+
+        :return: None
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self) -> None:
+        """Sample the stacks of the other threads until stopped."""
+        own_id = threading.get_ident()
+        thread_names = {}
+        while not self._stop.wait(self._interval):
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({module_name(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+
+    def write_folded(self, filepath: str) -> None:
+        """Write the samples as folded stacks, one 'frame;frame;frame count' line per stack.
+
+        :param filepath: the path of the folded stacks file
+        :return: None
+        """
+        with open(filepath, "w") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Profiles an audit run and traces its memory per phase."""
+
+    def __init__(self, profiler: str | None = None, trace_memory: bool = False, output_dir: str = "."):
+        """Initialize the profiler.
+
+        :param profiler: 'cprofile', 'sampling' or None for no CPU profile
+        :param trace_memory: boolean indicating whether to trace memory per phase
+        :param output_dir: the directory of the profile files
+        """
+        self.configure(profiler, trace_memory, output_dir)
+
+    def configure(self, profiler: str | None = None, trace_memory: bool = False, output_dir: str = ".") -> None:
+        """Set what is profiled and traced, before the run is started.
+
+        :param profiler: 'cprofile', 'sampling' or None for no CPU profile
+        :param trace_memory: boolean indicating whether to trace memory per phase
+        :param output_dir: the directory of the profile files
+        :return: None
+        """
+        if profiler not in PROFILERS + [None]:
+            raise ValueError(f"Invalid profiler: {profiler}. Must be one of {PROFILERS}.")
+        self._profiler = profiler
+        self.trace_memory = trace_memory
+        self._output_dir = output_dir
+        self._cprofile = None
+        self._sampler: SamplingProfiler | None = None
+        self.phases: list[PhaseMemory] = []
+
+    @property
+    def enabled(self) -> bool:
+        """Return whether the run is profiled or traced."""
+        return self._profiler is not None or self.trace_memory
+
+    def start(self) -> None:
+        """Start profiling and tracing.
+
+        :return: None
+        """
+        # imported only when profiling, so that normal runs do not load them
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self._profiler == "cprofile":
+            import cProfile
+
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif self._profiler == "sampling":
+            self._sampler = SamplingProfiler()
+            self._sampler.start()
+
+    def stop(self) -> list[str]:
+        """Stop profiling and tracing, and write the profile files.
+
+        :return: the paths of the written files
+        """
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        written = []
+        if self._cprofile:
+            self._cprofile.disable()
+            filepath = os.path.join(self._output_dir, f"zta_profile_{timestamp}.prof")
+            self._cprofile.dump_stats(filepath)
+            written.append(filepath)
+        if self._sampler:
+            self._sampler.stop()
+            filepath = os.path.join(self._output_dir, f"zta_profile_{timestamp}.folded")
+            self._sampler.write_folded(filepath)
+            written.append(filepath)
+        if self.trace_memory:
+            import tracemalloc
+
+            tracemalloc.stop()
+            filepath = os.path.join(self._output_dir, f"zta_memory_{timestamp}.txt")
+            with open(filepath, "w") as f:
+                f.write(self.memory_report())
+            written.append(filepath)
+        return written
+
+    def phase(self, name: str):
+        """Trace the memory of a phase of the audit.
+
+        :param name: the phase name
+        :return: a context manager tracing its block
+        """
+        if not self.trace_memory:
+            return _DISABLED_PHASE
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name: str):
+        """Record the peak memory and the retained allocations of a block."""
+        import tracemalloc
+
+        start = _take_snapshot()
+        start_size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            size, peak = tracemalloc.get_traced_memory()
+            end = _take_snapshot()
+            differences = [difference for difference in end.compare_to(start, "lineno") if difference.size_diff > 0]
+            differences.sort(key=lambda difference: difference.size_diff, reverse=True)
+            modules: Counter[str] = Counter()
+            for difference in differences:
+                modules[module_name(difference.traceback[0].filename)] += difference.size_diff
+            top_sites = []
+            for difference in differences[:TOP_SITES]:
+                frame = difference.traceback[0]
+                top_sites.append((f"{module_name(frame.filename)}:{frame.lineno}", difference.size_diff))
+            self.phases.append(
+                PhaseMemory(name, peak - start_size, size - start_size, top_sites, modules.most_common(TOP_SITES))
+            )
+
+    def memory_report(self) -> str:
+        """Format the memory traced per phase.
+
+        :return: the memory report
+        """
+        lines = ["Peak memory per phase (above the memory traced at the start of the phase):"]
+        for phase in self.phases:
+            lines.append(f"  {phase.phase}: peak {_format_size(phase.peak)}, retained {_format_size(phase.retained)}")
+        for phase in self.phases:
+            lines.append(f"\n{phase.phase} - top modules by retained memory:")
+            lines.extend(f"  {module}: {_format_size(size)}" for module, size in phase.top_modules)
+            lines.append(f"{phase.phase} - top allocation sites by retained memory:")
+            lines.extend(f"  {site}: {_format_size(size)}" for site, size in phase.top_sites)
+        return "\n".join(lines) + "\n"
+
+
+def _take_snapshot():
+    """Take a snapshot of the traced allocations, without the allocations of tracemalloc itself."""
+    import tracemalloc
+
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def _format_size(size: int) -> str:
+    """Format a size in KiB or MiB."""
+    return f"{size / 2**20:.1f} MiB" if abs(size) >= 2**20 else f"{size / 2**10:.1f} KiB"
+
+
+profiler = Profiler()
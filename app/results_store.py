@@ -0,0 +1,312 @@
+"""Historical store of audit results."""
+
+import argparse
+import sqlite3
+import threading
+from collections.abc import Iterator
+from datetime import datetime
+from typing import NamedTuple
+
+from app.domain_models import AuditResult
+
+# number of buffered results written per transaction
+DEFAULT_BATCH_SIZE = 5_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    report_path TEXT,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL,
+    hostname TEXT NOT NULL,
+    zta_check TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    details TEXT,
+    PRIMARY KEY (run_id, hostname, zta_check)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS run_check_summary (
+    run_id INTEGER NOT NULL,
+    zta_check TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    PRIMARY KEY (zta_check, run_id)
+) WITHOUT ROWID;
+"""
+
+
+class Run(NamedTuple):
+    """An audit run recorded in the store."""
+
+    run_id: int
+    started_at: str
+    report_path: str | None
+    completed: bool
+
+
+class CheckTrend(NamedTuple):
+    """Pass/fail counts of a ZTA check for one run."""
+
+    run_id: int
+    started_at: str
+    zta_check: str
+    passed: int
+    failed: int
+
+    @property
+    def pass_rate(self) -> float:
+        """Return the fraction of devices that passed the check."""
+        total = self.passed + self.failed
+        return self.passed / total if total else 0.0
+
+
+class StatusFlip(NamedTuple):
+    """A device whose check status differs between two runs."""
+
+    hostname: str
+    zta_check: str
+    old_status: bool
+    new_status: bool
+
+
+class ResultsStore:
+    """SQLite backed store of audit results across runs.
+
+    Results are buffered and written in bulk transactions. Per-check pass/fail counts are summarized when a run
+    finishes, so trend queries only read one row per run and check.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        """Open (or create) the results database.
+
+        :param db_path: the path of the SQLite database
+        :param batch_size: the number of results to buffer before writing them
+        """
+        self._db_path = db_path
+        self._batch_size = batch_size
+        self._pending: list[tuple] = []
+        self._lock = threading.Lock()
+        # results may be written by the AuditReporter writer thread
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start_run(self, report_path: str | None = None) -> int:
+        """Record the start of an audit run.
+
+        :param report_path: the path of the report created by the run
+        :return: the run id
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs (started_at, report_path) VALUES (?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), report_path),
+            )
+        return cursor.lastrowid
+
+    def add_result(self, run_id: int, device: str, zta_check: str, status: bool, details: str) -> None:
+        """Buffer a result for a run, writing the buffer once it is full.
+
+        :param run_id: the run id
+        :param device: the device hostname
+        :param zta_check: the ZTA check
+        :param status: whether the device passed the check
+        :param details: the details of the result
+        :return: None
+        """
+        with self._lock:
+            self._pending.append((run_id, device, zta_check, bool(status), details))
+            if len(self._pending) >= self._batch_size:
+                self._write_pending()
+
+    def flush(self) -> None:
+        """Write all buffered results.
+
+        :return: None
+        """
+        with self._lock:
+            self._write_pending()
+
+    def _write_pending(self) -> None:
+        """Write the buffered results in a single transaction. The caller must hold the lock.
+
+        :return: None
+        """
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results (run_id, hostname, zta_check, status, details) VALUES (?, ?, ?, ?, ?)",
+                self._pending,
+            )
+        self._pending = []
+
+    def finish_run(self, run_id: int) -> None:
+        """Write the remaining results of a run and summarize its pass/fail counts.
+
+        :param run_id: the run id
+        :return: None
+        """
+        with self._lock:
+            self._write_pending()
+            with self._connection:
+                self._connection.execute("DELETE FROM run_check_summary WHERE run_id = ?", (run_id,))
+                self._connection.execute(
+                    "INSERT INTO run_check_summary (run_id, zta_check, passed, failed) "
+                    "SELECT run_id, zta_check, SUM(status), SUM(1 - status) FROM results "
+                    "WHERE run_id = ? GROUP BY zta_check",
+                    (run_id,),
+                )
+                self._connection.execute("UPDATE runs SET completed = 1 WHERE run_id = ?", (run_id,))
+
+    def runs(self, limit: int | None = None) -> list[Run]:
+        """Get the recorded runs, newest first.
+
+        :param limit: the max number of runs to return
+        :return: the runs
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT run_id, started_at, report_path, completed FROM runs ORDER BY run_id DESC LIMIT ?",
+                (limit if limit is not None else -1,),
+            ).fetchall()
+        return [Run(run_id, started_at, path, bool(completed)) for run_id, started_at, path, completed in rows]
+
+    def pass_rate_trend(self, zta_check: str | None = None, limit: int | None = None) -> list[CheckTrend]:
+        """Get the pass/fail counts per check of completed runs, oldest first.
+
+        :param zta_check: only return the trend of this check
+        :param limit: only return the latest runs
+        :return: the trend of each check per run
+        """
+        query = (
+            "SELECT s.run_id, r.started_at, s.zta_check, s.passed, s.failed FROM run_check_summary s "
+            "JOIN runs r ON r.run_id = s.run_id "
+            "WHERE r.run_id IN (SELECT run_id FROM runs WHERE completed = 1 ORDER BY run_id DESC LIMIT ?)"
+        )
+        params: list = [limit if limit is not None else -1]
+        if zta_check:
+            query += " AND s.zta_check = ?"
+            params.append(zta_check)
+        query += " ORDER BY s.run_id, s.zta_check"
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [CheckTrend(*row) for row in rows]
+
+    def flipped_devices(
+        self, old_run_id: int, new_run_id: int, zta_check: str | None = None, regressions_only: bool = False
+    ) -> list[StatusFlip]:
+        """Get the devices whose check status changed between two runs.
+
+        :param old_run_id: the earlier run id
+        :param new_run_id: the later run id
+        :param zta_check: only compare this check
+        :param regressions_only: only return devices that went from passing to failing
+        :return: the status changes, ordered by hostname and check
+        """
+        query = (
+            "SELECT n.hostname, n.zta_check, o.status, n.status FROM results n "
+            "JOIN results o ON o.run_id = ? AND o.hostname = n.hostname AND o.zta_check = n.zta_check "
+            "WHERE n.run_id = ? AND o.status != n.status"
+        )
+        params: list = [old_run_id, new_run_id]
+        if zta_check:
+            query += " AND n.zta_check = ?"
+            params.append(zta_check)
+        if regressions_only:
+            query += " AND n.status = 0"
+        query += " ORDER BY n.hostname, n.zta_check"
+        with self._lock:
+            rows = self._connection.execute(query, params).fetchall()
+        return [StatusFlip(hostname, check, bool(old), bool(new)) for hostname, check, old, new in rows]
+
+    def iter_results(self, run_id: int, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[AuditResult]:
+        """Stream the results of a run in primary key order, ordered by device and check.
+
+        :param run_id: the run id
+        :param batch_size: the number of results read at a time
+        :return: the audit results
+        """
+        last_key = ("", "")
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT hostname, zta_check, status, details FROM results "
+                    "WHERE run_id = ? AND (hostname, zta_check) > (?, ?) ORDER BY hostname, zta_check LIMIT ?",
+                    (run_id, *last_key, batch_size),
+                ).fetchall()
+            for hostname, zta_check, status, details in rows:
+                yield AuditResult(hostname, zta_check, bool(status), details)
+            if len(rows) < batch_size:
+                return
+            last_key = rows[-1][:2]
+
+    def close(self) -> None:
+        """Write any buffered results and close the database.
+
+        :return: None
+        """
+        with self._lock:
+            self._write_pending()
+            self._connection.close()
+
+
+def main():
+    """Print the pass rate trend or status changes recorded in a results database.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Query the ZTA Lightning results database.")
+    parser.add_argument("db_path", help="path of the results database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    trend = commands.add_parser("trend", help="per check pass rate of each run")
+    trend.add_argument("--check", help="only show this ZTA check")
+    trend.add_argument("--limit", type=int, help="only show the latest runs")
+    flips = commands.add_parser("flips", help="devices whose status changed between two runs")
+    flips.add_argument("old_run_id", type=int, nargs="?", help="defaults to the previous completed run")
+    flips.add_argument("new_run_id", type=int, nargs="?", help="defaults to the latest completed run")
+    flips.add_argument("--check", help="only compare this ZTA check")
+    flips.add_argument("--regressions", action="store_true", help="only show devices that started failing")
+    export = commands.add_parser("export", help="write the results of a run to a results file")
+    export.add_argument("run_id", type=int)
+    export.add_argument("filepath", help="path of the newline delimited JSON results file")
+    args = parser.parse_args()
+
+    with ResultsStore(args.db_path) as store:
+        if args.command == "trend":
+            for row in store.pass_rate_trend(args.check, args.limit):
+                print(
+                    f"{row.run_id}\t{row.started_at}\t{row.zta_check}\t{row.passed}/{row.passed + row.failed}"
+                    f"\t{row.pass_rate:.1%}"
+                )
+            return
+
+        if args.command == "export":
+            # imported here since audit_diff builds on this module
+            from app.audit_diff import write_results_file
+
+            count = write_results_file(store.iter_results(args.run_id), args.filepath)
+            print(f"Exported {count} results of run {args.run_id} to {args.filepath}")
+            return
+
+        old_run_id, new_run_id = args.old_run_id, args.new_run_id
+        if old_run_id is None or new_run_id is None:
+            completed = [run.run_id for run in store.runs() if run.completed]
+            if len(completed) < 2:
+                parser.error("at least two completed runs are needed to compare")
+            new_run_id, old_run_id = completed[:2]
+        for flip in store.flipped_devices(old_run_id, new_run_id, args.check, args.regressions):
+            print(f"{flip.hostname}\t{flip.zta_check}\t{flip.old_status} -> {flip.new_status}")
+
+
+if __name__ == "__main__":
+    main()
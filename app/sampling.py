@@ -0,0 +1,324 @@
+"""Statistical sampling audit, which checks a stratified random sample of the devices and estimates the pass rate of
+each check over the fleet with a confidence interval."""
+
+import ipaddress
+import math
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+from typing import NamedTuple
+
+from app.audit_reporter import AuditReporter, ResultCollector
+from app.client import APIClient
+from app.domain_models import AuditResult, Device, User
+from app.exceptions import ApplianceRequestError
+from app.metrics import metrics
+from app.schema import validate_device, validate_user
+from app.zta_checks.auth_and_ac import AuthAndACCheck
+from app.zta_checks.least_privilege import LeastPrivilegeCheck
+from app.zta_checks.logging import LoggingCheck
+from app.zta_checks.network_segmentation import NetworkSegmentationCheck
+
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_MARGIN = 0.05
+# prefix length of the subnets that, with the device type, stratify the sample
+DEFAULT_SUBNET_PREFIX = 24
+# number of concurrent requests for the configurations of the sampled devices
+FETCH_WORKERS = 8
+# segment of the estimates over every device type
+ALL_DEVICES = "all"
+
+# max number of servers whose configurations are fetched to find the AAA server, when the device index has no services
+MAX_AAA_SERVER_SEARCH = 50
+
+# hostname, device type, ip address and services of a device of the appliance's device index, the services are None
+# when the appliance does not index them
+IndexEntry = tuple[str, str, str, list[str] | None]
+
+
+class PassRateEstimate(NamedTuple):
+    """The estimated pass rate of a check over the devices of a segment of the fleet."""
+
+    zta_check: str
+    segment: str
+    passed: int
+    sampled: int
+    population: int
+    pass_rate: float
+    lower: float
+    upper: float
+
+
+def _z_score(confidence: float) -> float:
+    """Get the two-sided z-score of a confidence level."""
+    if not 0 < confidence < 1:
+        raise ValueError(f"Invalid confidence: {confidence}. Must be between 0 and 1.")
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def required_sample_size(
+    population: int, confidence: float = DEFAULT_CONFIDENCE, margin: float = DEFAULT_MARGIN
+) -> int:
+    """Get the sample size that estimates a pass rate within a margin of error at a confidence level.
+
+    The size assumes the worst case pass rate of 50% and is reduced by the finite population correction.
+
+    :param population: the number of devices
+    :param confidence: the confidence level, e.g. 0.95
+    :param margin: the margin of error, e.g. 0.05 for +/- 5 percentage points
+    :return: the sample size
+    """
+    if not 0 < margin < 1:
+        raise ValueError(f"Invalid margin: {margin}. Must be between 0 and 1.")
+    if population <= 0:
+        return 0
+    size = _z_score(confidence) ** 2 * 0.25 / margin**2
+    return min(population, math.ceil(size / (1 + (size - 1) / population)))
+
+
+def wilson_interval(
+    passed: int, sampled: int, population: int | None = None, confidence: float = DEFAULT_CONFIDENCE
+) -> tuple[float, float]:
+    """Get the Wilson score interval of a pass rate, narrowed by the finite population correction.
+
+    :param passed: the number of sampled devices that passed
+    :param sampled: the number of sampled devices
+    :param population: the number of devices the sample was drawn from, infinite by default
+    :param confidence: the confidence level
+    :return: the lower and upper bounds of the pass rate
+    """
+    if sampled == 0:
+        return 0.0, 1.0
+    pass_rate = passed / sampled
+    correction = (population - sampled) / (population - 1) if population and population > 1 else 1.0
+    if correction <= 0:
+        # every device was checked, so the pass rate is exact
+        return pass_rate, pass_rate
+    effective_size = sampled / correction
+    z = _z_score(confidence)
+    denominator = 1 + z**2 / effective_size
+    center = (pass_rate + z**2 / (2 * effective_size)) / denominator
+    half_width = z * math.sqrt(pass_rate * (1 - pass_rate) / effective_size + z**2 / (4 * effective_size**2))
+    half_width /= denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def stratified_sample(
+    index: list[IndexEntry], size: int, seed: int | str | None = None, subnet_prefix: int = DEFAULT_SUBNET_PREFIX
+) -> list[str]:
+    """Draw a random sample of the devices, stratified by device type and subnet with proportional allocation.
+
+    The devices are grouped by stratum and shuffled within each one, and the sample is taken at even intervals from a
+    random start. Every device is equally likely to be sampled, and each stratum gets its proportional share of the
+    sample rounded up or down, so a stratum of any size is represented once its share reaches one device.
+
+    :param index: the hostname, device type and ip address, and optionally the services, of every device
+    :param size: the sample size
+    :param seed: the seed that makes the sample reproducible
+    :param subnet_prefix: the prefix length of the subnets
+    :return: the hostnames of the sampled devices
+    """
+    rng = random.Random(seed)
+    strata: dict[tuple[str, str], list[str]] = {}
+    for hostname, device_type, ip_address, *_ in index:
+        subnet = str(ipaddress.IPv4Network(f"{ip_address}/{subnet_prefix}", strict=False))
+        strata.setdefault((device_type, subnet), []).append(hostname)
+    frame = []
+    for stratum in sorted(strata):
+        hostnames = sorted(strata[stratum])
+        rng.shuffle(hostnames)
+        frame.extend(hostnames)
+
+    size = min(size, len(frame))
+    if size <= 0:
+        return []
+    interval = len(frame) / size
+    start = rng.random() * interval
+    return [frame[int(start + position * interval)] for position in range(size)]
+
+
+def estimate_pass_rates(
+    results: list[AuditResult],
+    device_types: dict[str, str],
+    population: Counter,
+    confidence: float = DEFAULT_CONFIDENCE,
+) -> list[PassRateEstimate]:
+    """Estimate the pass rate of each check over the fleet and over each device type from the results of a sample.
+
+    Every device has the same probability of being sampled, so the sample pass rate estimates the fleet's. The
+    interval of the simple random sample is conservative for a proportionally stratified one.
+
+    :param results: the results of the sampled devices
+    :param device_types: the device type of each sampled device
+    :param population: the number of devices of each device type in the fleet
+    :param confidence: the confidence level of the intervals
+    :return: the estimates of each check, over every device then per device type
+    """
+    counts: dict[tuple[str, str], list[int]] = {}
+    for result in results:
+        for segment in (ALL_DEVICES, device_types[result.device]):
+            counts.setdefault((result.zta_check, segment), [0, 0])[0 if result.status else 1] += 1
+
+    estimates = []
+    for (zta_check, segment), (passed, failed) in sorted(
+        counts.items(), key=lambda item: (item[0][0], item[0][1] != ALL_DEVICES, item[0][1])
+    ):
+        segment_population = sum(population.values()) if segment == ALL_DEVICES else population[segment]
+        sampled = passed + failed
+        lower, upper = wilson_interval(passed, sampled, segment_population, confidence)
+        estimates.append(
+            PassRateEstimate(zta_check, segment, passed, sampled, segment_population, passed / sampled, lower, upper)
+        )
+    return estimates
+
+
+def print_estimates(estimates: list[PassRateEstimate], confidence: float = DEFAULT_CONFIDENCE) -> None:
+    """Print the estimated pass rates.
+
+    :param estimates: the estimates
+    :param confidence: the confidence level of the intervals
+    :return: None
+    """
+    print(f"Estimated pass rates ({confidence:.0%} confidence):")
+    for estimate in estimates:
+        label = estimate.zta_check if estimate.segment == ALL_DEVICES else f"{estimate.segment} - {estimate.zta_check}"
+        print(
+            f"  {label}: {estimate.pass_rate:.1%} [{estimate.lower:.1%}, {estimate.upper:.1%}] "
+            f"({estimate.passed}/{estimate.sampled} sampled of {estimate.population})"
+        )
+
+
+class SampleAudit:
+    """Runs every check on a stratified random sample of the devices of the appliance.
+
+    Only the configurations of the sampled devices, and of the devices their checks depend on, are fetched, through
+    the per-device endpoint: the network devices that sampled hosts and servers are connected to, and the AAA server.
+    The AAA server is looked up in the services of the device index, preferring a server that sampled devices use as
+    their AAA or log server. When the appliance does not index services, it is found among the servers that sampled
+    devices use, or failing that among the first MAX_AAA_SERVER_SEARCH servers.
+    """
+
+    def __init__(
+        self,
+        api_client: APIClient,
+        sample_size: int | None = None,
+        confidence: float = DEFAULT_CONFIDENCE,
+        margin: float = DEFAULT_MARGIN,
+        seed: int | str | None = None,
+    ):
+        """Initialize the sample audit.
+
+        :param api_client: the authenticated client
+        :param sample_size: the number of devices to sample, by default the size that meets the margin of error
+        :param confidence: the confidence level of the sample size and of the intervals
+        :param margin: the margin of error that the default sample size meets
+        :param seed: the seed that makes the sample reproducible
+        """
+        self._api_client = api_client
+        self._sample_size = sample_size
+        self._confidence = confidence
+        self._margin = margin
+        self._seed = seed
+        self._configs: dict[str, dict] = {}
+
+    def run(self, audit_reporter: AuditReporter) -> list[PassRateEstimate]:
+        """Sample the devices, check them and estimate the pass rates of the fleet.
+
+        :param audit_reporter: the audit reporter of the sampled devices' results
+        :return: the estimates of each check, over every device then per device type
+        """
+        with metrics.timer("zta_phase_duration_seconds", phase="sample"):
+            index = self._api_client.get_device_index()
+            sample_size = self._sample_size or required_sample_size(len(index), self._confidence, self._margin)
+            sampled = stratified_sample(index, sample_size, self._seed)
+        by_hostname = {hostname: entry for hostname, *entry in index}
+
+        with metrics.timer("zta_phase_duration_seconds", phase="fetch_devices"):
+            self._fetch(sampled)
+            devices = [Device(validate_device(self._configs[hostname])) for hostname in sampled]
+            context = self._context(devices, by_hostname)
+        with metrics.timer("zta_phase_duration_seconds", phase="fetch_users"):
+            users = [User(validate_user(user)) for user in self._api_client.stream_user_info()]
+        metrics.inc("zta_devices_processed_total", len(devices))
+        metrics.inc("zta_users_processed_total", len(users))
+
+        audit_reporter.register_devices(devices)
+        recorder = ResultCollector(audit_reporter)
+        with metrics.timer("zta_check_duration_seconds", check="Logging"):
+            LoggingCheck(context).run_logging_checks(recorder, devices)
+        with metrics.timer("zta_check_duration_seconds", check="Auth and AC"):
+            AuthAndACCheck(context, users).run_auth_and_ac_checks(recorder, devices)
+        with metrics.timer("zta_check_duration_seconds", check="Network Segmentation"):
+            NetworkSegmentationCheck(context).run_network_segmentation_checks(recorder, devices)
+        with metrics.timer("zta_check_duration_seconds", check="Least Privilege"):
+            LeastPrivilegeCheck(context, users).run_least_privilege_check(recorder, devices)
+
+        population = Counter(entry[1] for entry in index)
+        device_types = {device.hostname: device.device_type for device in devices}
+        return estimate_pass_rates(recorder.results, device_types, population, self._confidence)
+
+    def _fetch(self, hostnames: list[str]) -> None:
+        """Fetch the configurations of the devices that are not fetched yet.
+
+        :param hostnames: the hostnames of the devices
+        :return: None
+        """
+        hostnames = [hostname for hostname in dict.fromkeys(hostnames) if hostname not in self._configs]
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            for hostname, config in zip(hostnames, executor.map(self._api_client.get_device_data, hostnames)):
+                if config is None:
+                    raise ApplianceRequestError(f"the configuration of {hostname}")
+                self._configs[hostname] = config
+
+    def _context(self, devices: list[Device], by_hostname: dict[str, tuple]) -> list[Device]:
+        """Fetch the devices that the checks of the sampled devices depend on.
+
+        :param devices: the sampled devices
+        :param by_hostname: the device type, ip address and services of every device by hostname
+        :return: the AAA server, if found, and the network devices that the sampled devices are connected to
+        """
+        connected = [
+            device.configuration["connected_to"]["device"]
+            for device in devices
+            if (device.configuration.get("connected_to") or {}).get("device") in by_hostname
+        ]
+        servers_by_ip = {
+            ip: hostname for hostname, (device_type, ip, _) in by_hostname.items() if device_type == "server"
+        }
+        referenced_ips = Counter(
+            ip
+            for device in devices
+            for ip in (
+                device.configuration.get("auth", {}).get("aaa_server"),
+                (device.configuration.get("logging") or {}).get("log_server"),
+            )
+            if ip in servers_by_ip
+        )
+        candidates = [servers_by_ip[ip] for ip, _ in referenced_ips.most_common()]
+        if any(services is not None for _, _, services in by_hostname.values()):
+            # the index names the AAA servers, so only the one that the checks use is fetched
+            indexed = sorted(
+                hostname for hostname, (_, _, services) in by_hostname.items() if "AAA" in (services or [])
+            )
+            aaa_servers = [hostname for hostname in candidates if hostname in indexed] + indexed
+            self._fetch(connected + aaa_servers[:1])
+        else:
+            self._fetch(connected + candidates)
+            aaa_servers = [hostname for hostname in candidates if self._is_aaa_server(hostname)]
+            if not aaa_servers:
+                servers = sorted(servers_by_ip.values())
+                if len(servers) > MAX_AAA_SERVER_SEARCH:
+                    print(
+                        f"The device index has no services and no referenced server is the AAA server, searching only "
+                        f"{MAX_AAA_SERVER_SEARCH} of {len(servers)} servers for it."
+                    )
+                    servers = servers[:MAX_AAA_SERVER_SEARCH]
+                self._fetch(servers)
+                aaa_servers = [hostname for hostname in servers if self._is_aaa_server(hostname)]
+        hostnames = dict.fromkeys(aaa_servers[:1] + connected)
+        return [Device(validate_device(self._configs[hostname])) for hostname in hostnames]
+
+    def _is_aaa_server(self, hostname: str) -> bool:
+        """Check if a fetched device provides the AAA service."""
+        return "AAA" in self._configs[hostname]["configuration"].get("services", [])
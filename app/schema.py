@@ -0,0 +1,356 @@
+"""Schemas of the device and user records of the appliance, validated when the records are ingested so that the checks
+can rely on the sections they read being present and well-formed.
+
+The schemas use a subset of JSON Schema: type (a name or a list of names), properties, required, additionalProperties
+(a schema of the values of an object that is a map), items, enum, minItems and maxLength. Each schema is compiled once
+into the Python source of a validator function that checks a record with the type tests and lookups its schema calls
+for, unrolled and with no schema left to walk. interpret_schema walks a schema for every record instead, for comparison
+with the compiled validators. Both report the same errors.
+"""
+
+from collections.abc import Callable
+
+from app.exceptions import InvalidConfigurationError, InvalidUserValueError
+
+_STRINGS = {"type": "array", "items": {"type": "string"}}
+
+LOGGING_SCHEMA = {
+    "type": "object",
+    "required": ["enabled", "log_server", "log_events"],
+    "properties": {
+        "enabled": {"type": "boolean"},
+        "log_server": {"type": "string"},
+        "log_events": _STRINGS,
+        "retention_period": {"type": "integer"},
+    },
+}
+AUTH_SCHEMA = {
+    "type": "object",
+    "required": ["enabled"],
+    "properties": {
+        "enabled": {"type": "boolean"},
+        "aaa_server": {"type": "string"},
+        "acl": {"type": "object", "additionalProperties": _STRINGS},
+        "assigned_user": {"type": "string"},
+    },
+}
+INTERFACES_SCHEMA = {
+    "type": "object",
+    "additionalProperties": {
+        "type": "object",
+        "properties": {
+            "ip_address": {"type": "string"},
+            "status": {"type": "string"},
+            "connected_device": {"type": "string"},
+        },
+    },
+}
+# a policy without allowed segments is valid, it allows none
+NETWORK_SEGMENTATION_SCHEMA = {
+    "type": "object",
+    "properties": {"allowed_segments": _STRINGS},
+}
+CONNECTED_TO_SCHEMA = {
+    "type": "object",
+    "required": ["device"],
+    "properties": {"device": {"type": "string"}, "interface": {"type": "string"}},
+}
+# the sections of the configuration of every device type
+_COMMON_PROPERTIES = {
+    "logging": LOGGING_SCHEMA,
+    "auth": AUTH_SCHEMA,
+    "roles": _STRINGS,
+    "services": _STRINGS,
+    "interfaces": INTERFACES_SCHEMA,
+    "site": {"type": "string"},
+}
+_NETWORK_DEVICE_CONFIGURATION = {
+    "type": "object",
+    "required": ["logging", "auth", "network_segmentation"],
+    "properties": {**_COMMON_PROPERTIES, "network_segmentation": NETWORK_SEGMENTATION_SCHEMA},
+}
+_ENDPOINT_CONFIGURATION = {
+    "type": "object",
+    "required": ["logging", "auth", "connected_to"],
+    "properties": {**_COMMON_PROPERTIES, "connected_to": CONNECTED_TO_SCHEMA, "allowed_segments": _STRINGS},
+}
+CONFIGURATION_SCHEMAS = {
+    "router": _NETWORK_DEVICE_CONFIGURATION,
+    "firewall": _NETWORK_DEVICE_CONFIGURATION,
+    "switch": {
+        **_NETWORK_DEVICE_CONFIGURATION,
+        "required": [*_NETWORK_DEVICE_CONFIGURATION["required"], "VLANs"],
+        "properties": {
+            **_NETWORK_DEVICE_CONFIGURATION["properties"],
+            # VLAN IDs, or VLAN names by ID
+            "VLANs": {
+                "type": ["array", "object"],
+                "items": {"type": "string"},
+                "additionalProperties": {"type": "string"},
+            },
+        },
+    },
+    "host": _ENDPOINT_CONFIGURATION,
+    "server": _ENDPOINT_CONFIGURATION,
+}
+USER_SCHEMA = {
+    "type": "object",
+    "required": ["username", "devices", "roles"],
+    "properties": {
+        "username": {"type": "string", "maxLength": 50},
+        "devices": {**_STRINGS, "minItems": 1},
+        "roles": {**_STRINGS, "minItems": 1},
+    },
+}
+
+# the Python types of the JSON types, bool is excluded from the numbers separately
+_PYTHON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "integer": int,
+    "number": (int, float),
+    "null": type(None),
+}
+# the source of the Python types in the compiled validators
+_TYPES = {
+    "object": "dict",
+    "array": "list",
+    "string": "str",
+    "boolean": "bool",
+    "integer": "int",
+    "number": "(int, float)",
+    "null": "type(None)",
+}
+
+
+def _type_names(schema: dict) -> list[str]:
+    """Get the JSON types that a schema allows."""
+    names = schema.get("type", [])
+    return [names] if isinstance(names, str) else list(names)
+
+
+def _type_error(schema: dict) -> str:
+    """Get the error of a value of the wrong type."""
+    return f"expected {' or '.join(_type_names(schema))}"
+
+
+def _is_type(value, name: str) -> bool:
+    """Check if a value is of a JSON type, where booleans are not numbers."""
+    if name in ("integer", "number") and isinstance(value, bool):
+        return False
+    return isinstance(value, _PYTHON_TYPES[name])
+
+
+def interpret_schema(schema: dict, value, path: str = "") -> list[str]:
+    """Validate a value by walking its schema.
+
+    :param schema: the schema
+    :param value: the value
+    :param path: the path of the value, for errors
+    :return: the errors, empty if the value is valid
+    """
+    errors = []
+    _interpret(schema, value, path, errors)
+    return errors
+
+
+def _at(path: str, message: str) -> str:
+    """Get an error at a path, the message alone for the value itself."""
+    return f"{path}: {message}" if path else message
+
+
+def _interpret(schema: dict, value, path: str, errors: list[str]) -> None:
+    """Validate a value by walking its schema, adding the errors to a list."""
+    names = _type_names(schema)
+    if names and not any(_is_type(value, name) for name in names):
+        errors.append(_at(path, _type_error(schema)))
+        return
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(_at(path, f"must be one of {schema['enum']}"))
+    if isinstance(value, str) and "maxLength" in schema and len(value) > schema["maxLength"]:
+        errors.append(_at(path, f"must be at most {schema['maxLength']} characters"))
+    if isinstance(value, list):
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append(_at(path, f"must have at least {schema['minItems']} items"))
+        if "items" in schema:
+            for index, item in enumerate(value):
+                _interpret(schema["items"], item, f"{path}[{index}]", errors)
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(_at(f"{path}.{key}".lstrip("."), "is required"))
+        for key, property_schema in schema.get("properties", {}).items():
+            if key in value:
+                _interpret(property_schema, value[key], f"{path}.{key}".lstrip("."), errors)
+        if "additionalProperties" in schema:
+            for key, item in value.items():
+                if key not in schema.get("properties", {}):
+                    _interpret(schema["additionalProperties"], item, f"{path}.{key}".lstrip("."), errors)
+
+
+class _Compiler:
+    """Generates the source of the validator function of a schema."""
+
+    def __init__(self):
+        self._lines: list[str] = []
+        self._names = 0
+
+    def _name(self, prefix: str) -> str:
+        """Get a new variable name."""
+        self._names += 1
+        return f"{prefix}{self._names}"
+
+    def _emit(self, depth: int, line: str) -> None:
+        """Emit a line of source, indented to a depth."""
+        self._lines.append("    " * depth + line)
+
+    @staticmethod
+    def _join(path: str, key: str) -> str:
+        """Get the f-string source of the path of a property, escaping the braces of the key."""
+        key = key.replace("{", "{{").replace("}", "}}")
+        return f"{path}.{key}" if path else key
+
+    def _error(self, depth: int, path: str, message: str) -> None:
+        """Emit the line that adds an error at a path, which is f-string source."""
+        message = message.replace("{", "{{").replace("}", "}}")
+        error = f"{path}: {message}" if path else message
+        self._emit(depth, f"errors.append(f{error!r})")
+
+    def compile(self, schema: dict, name: str) -> str:
+        """Generate the source of a validator function.
+
+        :param schema: the schema
+        :param name: the name of the function
+        :return: the source
+        """
+        self._emit(0, f"def {name}(value):")
+        self._emit(1, "errors = []")
+        self._value(schema, "value", "", 1)
+        self._emit(1, "return errors")
+        return "\n".join(self._lines) + "\n"
+
+    def _value(self, schema: dict, var: str, path: str, depth: int) -> None:
+        """Emit the validation of a value of a variable, at a path that is f-string source."""
+        names = _type_names(schema)
+        if names:
+            tests = []
+            for type_name in names:
+                test = f"isinstance({var}, {_TYPES[type_name]})"
+                if type_name in ("integer", "number"):
+                    test = f"({test} and not isinstance({var}, bool))"
+                tests.append(test)
+            self._emit(depth, f"if not ({' or '.join(tests)}):")
+            self._error(depth + 1, path, _type_error(schema))
+            self._emit(depth, "else:")
+            depth += 1
+        start = len(self._lines)
+        if "enum" in schema:
+            self._emit(depth, f"if {var} not in {schema['enum']!r}:")
+            self._error(depth + 1, path, f"must be one of {schema['enum']}")
+        if "maxLength" in schema:
+            self._emit(depth, f"if isinstance({var}, str) and len({var}) > {schema['maxLength']}:")
+            self._error(depth + 1, path, f"must be at most {schema['maxLength']} characters")
+        self._list(schema, var, path, depth, single=names == ["array"])
+        self._object(schema, var, path, depth, single=names == ["object"])
+        if len(self._lines) == start:
+            # nothing to validate past the type
+            if names:
+                self._lines.pop()
+            else:
+                self._emit(depth, "pass")
+
+    def _list(self, schema: dict, var: str, path: str, depth: int, single: bool) -> None:
+        """Emit the validation of a value that may be an array."""
+        if "minItems" not in schema and "items" not in schema:
+            return
+        if not single:
+            self._emit(depth, f"if isinstance({var}, list):")
+            depth += 1
+        if "minItems" in schema:
+            self._emit(depth, f"if len({var}) < {schema['minItems']}:")
+            self._error(depth + 1, path, f"must have at least {schema['minItems']} items")
+        if "items" in schema:
+            index, item = self._name("i"), self._name("v")
+            self._emit(depth, f"for {index}, {item} in enumerate({var}):")
+            self._value(schema["items"], item, f"{path}[{{{index}}}]", depth + 1)
+
+    def _object(self, schema: dict, var: str, path: str, depth: int, single: bool) -> None:
+        """Emit the validation of a value that may be an object."""
+        properties = schema.get("properties", {})
+        if not properties and "required" not in schema and "additionalProperties" not in schema:
+            return
+        if not single:
+            self._emit(depth, f"if isinstance({var}, dict):")
+            depth += 1
+        for key in schema.get("required", []):
+            self._emit(depth, f"if {key!r} not in {var}:")
+            self._error(depth + 1, self._join(path, key), "is required")
+        for key, property_schema in properties.items():
+            item = self._name("v")
+            self._emit(depth, f"{item} = {var}.get({key!r}, _MISSING)")
+            self._emit(depth, f"if {item} is not _MISSING:")
+            self._value(property_schema, item, self._join(path, key), depth + 1)
+        if "additionalProperties" in schema:
+            key, item = self._name("k"), self._name("v")
+            self._emit(depth, f"for {key}, {item} in {var}.items():")
+            if properties:
+                self._emit(depth + 1, f"if {key} in {tuple(properties)!r}:")
+                self._emit(depth + 2, "continue")
+            self._value(schema["additionalProperties"], item, f"{path}.{{{key}}}" if path else f"{{{key}}}", depth + 1)
+
+
+def compile_schema(schema: dict, name: str = "validate") -> Callable[[object], list[str]]:
+    """Compile a schema into a validator function.
+
+    :param schema: the schema
+    :param name: the name of the function, which shows in tracebacks
+    :return: the validator, which returns the errors of a value, empty if it is valid
+    """
+    source = _Compiler().compile(schema, name)
+    namespace = {"_MISSING": object()}
+    exec(compile(source, f"<schema {name}>", "exec"), namespace)
+    validator = namespace[name]
+    validator.source = source
+    return validator
+
+
+def _record_schema(configuration_schema: dict) -> dict:
+    """Get the schema of a device record of a type, whose top-level fields the Device model validates."""
+    return {"type": "object", "required": ["configuration"], "properties": {"configuration": configuration_schema}}
+
+
+# compiled when the module is imported, which happens once per run when the first records are ingested
+_DEVICE_VALIDATORS = {
+    device_type: compile_schema(_record_schema(schema), f"validate_{device_type}")
+    for device_type, schema in CONFIGURATION_SCHEMAS.items()
+}
+_USER_VALIDATOR = compile_schema(USER_SCHEMA, "validate_user")
+
+
+def validate_device(record: dict) -> dict:
+    """Validate the configuration of a device record against the schema of its type.
+
+    :param record: the device record
+    :return: the record
+    """
+    device_type = record.get("device_type")
+    # records of unknown types are rejected by the Device model
+    validator = _DEVICE_VALIDATORS.get(device_type) if isinstance(device_type, str) else None
+    errors = validator(record) if validator else []
+    if errors:
+        raise InvalidConfigurationError(f"{record.get('hostname')}: {'; '.join(errors)}")
+    return record
+
+
+def validate_user(record: dict) -> dict:
+    """Validate a user record.
+
+    :param record: the user record
+    :return: the record
+    """
+    errors = _USER_VALIDATOR(record)
+    if errors:
+        raise InvalidUserValueError(f"{record.get('username')}: {'; '.join(errors)}")
+    return record
@@ -0,0 +1,139 @@
+"""Check for fleet-wide uniqueness of hostnames and ip addresses."""
+
+from app.audit_reporter import AuditReporter
+from app.domain_models import Device
+
+
+def hostname_key(device: Device) -> str:
+    """Get the key that the hostname of a device is compared by. Hostnames are case-insensitive, like DNS names.
+
+    :param device: the device
+    :return: the case-folded hostname
+    """
+    return device.hostname.casefold()
+
+
+def interface_addresses(device: Device) -> set[str]:
+    """Get the ip addresses of the interfaces of a device, without their prefix lengths.
+
+    :param device: the device
+    :return: the ip addresses of the interfaces that have one
+    """
+    addresses = set()
+    for interface in (device.configuration.get("interfaces") or {}).values():
+        address = interface.get("ip_address") if isinstance(interface, dict) else None
+        if address:
+            addresses.add(address.partition("/")[0])
+    return addresses
+
+
+def device_addresses(device: Device) -> set[str]:
+    """Get every ip address of a device. An interface that carries the management ip address is not a second use.
+
+    :param device: the device
+    :return: the management ip address and the ip addresses of the interfaces
+    """
+    return interface_addresses(device) | {device.ip_address.partition("/")[0]}
+
+
+class AddressUniquenessCheck:
+    """Hostname and ip address uniqueness check."""
+
+    def __init__(self, devices: list[Device]):
+        """
+        Initialize with a list of Device objects, and index their hostnames and ip addresses.
+
+        :param devices: A list of Device objects to check.
+
+        Example interfaces configuration format:
+        "interfaces": {
+            "Gig0/0": {
+                "ip_address": "192.168.1.1",
+                "status": "up",
+                "connected_device": "Switch1"
+            }
+        }
+        """
+
+        self._devices = devices
+        self._shared_hostnames, self._shared_addresses = self._build_indexes()
+
+    def _build_indexes(self) -> tuple[dict[str, list[str]], dict[str, list[str]]]:
+        """Index the hostnames and the ip addresses of every device and interface in one pass.
+
+        Each key is looked up in a hash index of its first owner, so the pass takes linear time, and only the keys
+        that a second device uses get a list of owners, which keeps the indexes small on a fleet of millions of
+        interfaces that are mostly unique.
+
+        :return: the hostnames of the devices by each hostname key and ip address that more than one device uses
+        """
+        hostname_owners, shared_hostnames = {}, {}
+        address_owners, shared_addresses = {}, {}
+        for device in self._devices:
+            keys = [(hostname_key(device), hostname_owners, shared_hostnames)]
+            keys += [(address, address_owners, shared_addresses) for address in device_addresses(device)]
+            # a device has each of its keys once, so a key that is already indexed belongs to another device
+            for key, first_owners, shared in keys:
+                if key in first_owners:
+                    shared.setdefault(key, [first_owners[key]]).append(device.hostname)
+                else:
+                    first_owners[key] = device.hostname
+        return shared_hostnames, shared_addresses
+
+    @staticmethod
+    def _other_owners(owners: list[str], hostname: str) -> list[str]:
+        """Get the owners of a shared key other than the device, which are the device's own name if it is duplicated.
+
+        :param owners: the hostnames of the devices that use the key
+        :param hostname: the hostname of the device
+        :return: the hostnames of the other devices
+        """
+        others = list(owners)
+        others.remove(hostname)
+        return others
+
+    def _collisions(self, device: Device) -> tuple[list[str], list[str], dict[str, list[str]]]:
+        """Get the devices that share the hostname, the management ip address or an interface ip address of a device.
+
+        :param device: the device
+        :return: the other devices with the hostname, with the ip address, and with each colliding interface address
+        """
+        hostname_owners = self._shared_hostnames.get(hostname_key(device))
+        hostname_collisions = self._other_owners(hostname_owners, device.hostname) if hostname_owners else []
+        ip_address = device.ip_address.partition("/")[0]
+        address_owners = self._shared_addresses.get(ip_address)
+        address_collisions = self._other_owners(address_owners, device.hostname) if address_owners else []
+        interface_collisions = {
+            address: self._other_owners(self._shared_addresses[address], device.hostname)
+            for address in sorted(interface_addresses(device) - {ip_address})
+            if address in self._shared_addresses
+        }
+        return hostname_collisions, address_collisions, interface_collisions
+
+    def run_address_uniqueness_check(self, audit_reporter: AuditReporter, devices: list[Device] | None = None) -> None:
+        """Run the Address Uniqueness check for each device and report on results.
+
+        :param audit_reporter: the audit reporter.
+        :param devices: only check these devices, all devices by default
+        :return: None
+        """
+
+        for device in self._devices if devices is None else devices:
+            hostname_collisions, address_collisions, interface_collisions = self._collisions(device)
+            has_unique_hostname = not hostname_collisions
+            has_unique_ip_address = not address_collisions
+            has_unique_interface_addresses = not interface_collisions
+            compliant = all((has_unique_hostname, has_unique_ip_address, has_unique_interface_addresses))
+
+            details = (
+                f"Device has a unique hostname: {has_unique_hostname}. \n"
+                f"Device has a unique ip address ({device.ip_address}): {has_unique_ip_address}. \n"
+                f"Device has unique interface ip addresses: {has_unique_interface_addresses}."
+            )
+            if hostname_collisions:
+                details += f" \nHostname also used by: {', '.join(hostname_collisions)}."
+            if address_collisions:
+                details += f" \nIp address also used by: {', '.join(address_collisions)}."
+            for address, owners in interface_collisions.items():
+                details += f" \nInterface ip address {address} also used by: {', '.join(owners)}."
+            audit_reporter.add_result(device.hostname, "Address Uniqueness", compliant, details)
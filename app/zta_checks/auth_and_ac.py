@@ -89,14 +89,15 @@ class AuthAndACCheck:
                 return device.ip_address
         return ""
 
-    def run_auth_and_ac_checks(self, audit_reporter: AuditReporter) -> None:
+    def run_auth_and_ac_checks(self, audit_reporter: AuditReporter, devices: list[Device] | None = None) -> None:
         """Run all Authentication and Access control checks for each device and report on results.
 
         :param audit_reporter: the audit reporter
+        :param devices: only check these devices, all devices by default
         :return: None
         """
 
-        for device in self._devices:
+        for device in self._devices if devices is None else devices:
             device_config = device.configuration
             is_auth_enabled = self._is_auth_enabled(device_config)
             has_centralized_aaa_server = self._has_centralized_aaa_server(device_config)
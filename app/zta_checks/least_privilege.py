@@ -17,14 +17,15 @@ class LeastPrivilegeCheck:
         self._devices = devices
         self._user_data = user_data
 
-    def run_least_privilege_check(self, audit_reporter: AuditReporter) -> None:
+    def run_least_privilege_check(self, audit_reporter: AuditReporter, devices: list[Device] | None = None) -> None:
         """Run Least Privilege check for each device and report on results.
 
         :param audit_reporter: the audit reporter
+        :param devices: only check these devices, all devices by default
         :return: None
         """
 
-        for device in self._devices:
+        for device in self._devices if devices is None else devices:
             compliant = []
             if device.device_type == "host":
                 assigned_user = device.configuration.get("auth", {}).get("assigned_user", "")
@@ -73,14 +73,15 @@ class LoggingCheck:
             if "AAA" in device.configuration.get("services", []):
                 return device.ip_address
 
-    def run_logging_checks(self, audit_reporter: AuditReporter) -> None:
+    def run_logging_checks(self, audit_reporter: AuditReporter, devices: list[Device] | None = None) -> None:
         """Run all Logging checks for each device and report on results.
 
         :param audit_reporter: the audit reporter.
+        :param devices: only check these devices, all devices by default
         :return: None
         """
 
-        for device in self._devices:
+        for device in self._devices if devices is None else devices:
             device_config = device.configuration
             is_logging_enabled = self._is_logging_enabled(device_config)
             has_centralized_logging_server = self._has_centralized_logging_server(device_config)
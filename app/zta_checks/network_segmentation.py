@@ -87,13 +87,16 @@ class NetworkSegmentationCheck:
             compliant_segments.append(segment_valid)
         return compliant_segments
 
-    def run_network_segmentation_checks(self, audit_reporter: AuditReporter) -> None:
+    def run_network_segmentation_checks(
+        self, audit_reporter: AuditReporter, devices: list[Device] | None = None
+    ) -> None:
         """Run all Network Segmentation checks for each device and report on results.
 
         :param audit_reporter: the audit reporter
+        :param devices: only check these devices, all devices by default
         :return: None
         """
-        for device in self._devices:
+        for device in self._devices if devices is None else devices:
             device_config = device.configuration
             device_type = device.device_type
             compliant = []
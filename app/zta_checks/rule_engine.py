@@ -0,0 +1,510 @@
+"""Declarative compliance rules, compiled into closures.
+
+A rule set is a JSON document (or YAML, when PyYAML is installed) of checks, each a list of rules that a device must
+pass for the check. A rule has a test, or cases of tests by device type with a default test for the other types, and
+the details line of its result in the report, a template with the {result} and the context values. Context values are
+derived from the fleet, such as the ip address of the device that provides a service. zta_rules.json expresses the
+Logging and Auth and AC checks, and a copy can be edited to change their policy or add rules.
+
+Tests are expressions of operators:
+    {"config": "auth.acl.Allow", "default": []}     a value of the device configuration, the default if it is missing
+    {"device": "hostname"}                          the hostname, ip_address or device_type of the device
+    {"user": "roles"}                               the username, devices or roles of the user of a user test
+    {"context": "aaa_server"}                       a context value
+    {"value": {...}}, "admin", ["INFO", "WARNING"]  a constant
+    {"length": expression}                          the number of items of a value
+    {"equals": [a, b]}, {"at_most": [a, b]}, {"at_least": [a, b]}
+    {"contains": [collection, item]}, {"contains_all": [collection, items]}
+    {"all": [tests]}, {"any": [tests]}, {"not": test}
+    {"with_user": [username, user test]}            the user test of the named user, false if there is no such user
+    {"all_users_with_access": user test}            the user test of every user that has the device among its devices
+
+A rule set is compiled for each audit once the context values of the fleet are known, so that they are constants of
+the closures, and the users are indexed by name and by device instead of being scanned for every device.
+"""
+
+import json
+import os
+from collections.abc import Callable
+from typing import NamedTuple
+
+from app.audit_reporter import AuditReporter
+from app.domain_models import Device, User
+from app.exceptions import InvalidRuleSetError
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - PyYAML is an optional dependency of YAML rule sets
+    yaml = None
+
+DEFAULT_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zta_rules.json")
+DEVICE_FIELDS = {"hostname", "ip_address", "device_type"}
+USER_FIELDS = {"username", "devices", "roles"}
+# the placeholder of the result in the details of a rule
+RESULT_FIELD = "result"
+
+# a compiled expression, of a device, its configuration and the user of a user test
+Test = Callable[[Device, dict, User | None], object]
+
+
+class _CompiledRule(NamedTuple):
+    """A rule of a check, compiled for a fleet."""
+
+    tests: dict[str, Test]
+    default: Test
+    prefix: str
+    suffix: str
+
+
+class _Plan(NamedTuple):
+    """The evaluation of the rules of a check for a device type, and the %-format of their details."""
+
+    evaluate: Callable[[Device, dict], tuple]
+    details: str
+
+
+def _evaluator(tests: list[Test]) -> Callable[[Device, dict], tuple]:
+    """Get the function of a device and its configuration that returns the results of the tests.
+
+    The tests are called from one generated expression rather than a loop, whose overhead is about a third of the time
+    of evaluating the simple rules of most checks.
+    """
+    names = [f"test{index}" for index in range(len(tests))]
+    calls = "".join(f"{name}(device, config, None), " for name in names)
+    return eval(f"lambda device, config: ({calls})", dict(zip(names, tests)))
+
+
+def _literal(spec) -> tuple[bool, object]:
+    """Get whether an expression is a constant, and its value."""
+    if isinstance(spec, dict):
+        return ("value" in spec and len(spec) == 1), spec.get("value")
+    return True, spec
+
+
+class _Compiler:
+    """Compiles the expressions of rules into closures, with the context values as constants."""
+
+    def __init__(self, context: dict, users: list[User]):
+        self.context = context
+        self._users = users
+        # the rule that is being compiled, for errors
+        self.where = ""
+        self._users_by_name: dict[str, User] | None = None
+        self._users_by_device: dict[str, list[User]] | None = None
+
+    def error(self, reason: str) -> InvalidRuleSetError:
+        """Get the error of an invalid rule."""
+        return InvalidRuleSetError(self.where, reason)
+
+    def users_by_name(self) -> dict[str, User]:
+        """Index the users by name, the first of users with the same name like a scan would find."""
+        if self._users_by_name is None:
+            self._users_by_name = {}
+            for user in self._users:
+                self._users_by_name.setdefault(user.username, user)
+        return self._users_by_name
+
+    def users_by_device(self) -> dict[str, list[User]]:
+        """Index the users by the hostnames of their devices."""
+        if self._users_by_device is None:
+            self._users_by_device = {}
+            for user in self._users:
+                for hostname in user.devices:
+                    self._users_by_device.setdefault(hostname, []).append(user)
+        return self._users_by_device
+
+    def compile(self, spec, user_scope: bool = False) -> Test:
+        """Compile an expression.
+
+        :param spec: the expression
+        :param user_scope: whether the expression is part of a user test
+        :return: the closure of a device, its configuration and a user that evaluates it
+        """
+        constant, value = self.constant(spec)
+        if constant:
+            return lambda device, config, user: value
+        if not isinstance(spec, dict):
+            raise self.error(f"invalid expression {spec!r}")
+        operators = spec.keys() - {"default"}
+        if len(operators) != 1 or ("default" in spec and "config" not in spec):
+            raise self.error(f"an expression must have one operator: {sorted(spec)}")
+        (operator,) = operators
+        if operator not in _OPERATORS:
+            raise self.error(f"unknown operator {operator!r}, expected one of {sorted(_OPERATORS)}")
+        return _OPERATORS[operator](self, spec, user_scope)
+
+    def constant(self, spec) -> tuple[bool, object]:
+        """Get whether an expression is a constant, context values included, and its value."""
+        if isinstance(spec, dict) and len(spec) == 1 and "context" in spec:
+            if spec["context"] not in self.context:
+                raise self.error(f"undefined context value {spec['context']!r}")
+            return True, self.context[spec["context"]]
+        return _literal(spec)
+
+    def operands(self, spec, operator: str, count: int | None = None) -> list:
+        """Get the operands of an operator, which are a list of the count of operands when it is given."""
+        operands = spec[operator]
+        if not isinstance(operands, list) or (count is not None and len(operands) != count):
+            raise self.error(f"{operator} takes a list of {count or 'any number of'} operands")
+        return operands
+
+
+def _config(compiler: _Compiler, spec, user_scope: bool) -> Test:
+    """Compile a value of the device configuration, read without a loop for paths of one or two keys."""
+    path, default = spec["config"], spec.get("default")
+    if not isinstance(path, str) or not path:
+        raise compiler.error(f"invalid configuration path {path!r}")
+    keys = path.split(".")
+    if len(keys) == 1:
+        (key,) = keys
+        return lambda device, config, user: config.get(key, default)
+    if len(keys) == 2:
+        section, key = keys
+
+        def value_of_section(device: Device, config: dict, user: User | None):
+            try:
+                return config[section].get(key, default)
+            except (KeyError, AttributeError):
+                return default
+
+        # comparisons with a constant read the value themselves, saving a call on the hot path
+        value_of_section.path = section, key, default
+        return value_of_section
+
+    def value_of_path(device: Device, config: dict, user: User | None):
+        value = config
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                return default
+            value = value[key]
+        return value
+
+    return value_of_path
+
+
+def _field(fields: set[str], scope: str):
+    """Get the compiler of the fields of the device or of the user of a user test."""
+    def compile_field(compiler: _Compiler, spec, user_scope: bool) -> Test:
+        name = spec[scope]
+        if name not in fields:
+            raise compiler.error(f"unknown {scope} field {name!r}, expected one of {sorted(fields)}")
+        if scope == "user":
+            if not user_scope:
+                raise compiler.error(f"user field {name!r} outside of a user test")
+            return lambda device, config, user: getattr(user, name)
+        return lambda device, config, user: getattr(device, name)
+
+    return compile_field
+
+
+def _length(compiler: _Compiler, spec, user_scope: bool) -> Test:
+    """Compile the number of items of a value, 0 if it is missing."""
+    value = compiler.compile(spec["length"], user_scope)
+    return lambda device, config, user: len(values) if (values := value(device, config, user)) is not None else 0
+
+
+def _comparison(compare: Callable[[object, object], bool], with_constant: Callable[[Test, object], Test] | None = None):
+    """Get the compiler of a comparison of two values, compiled by with_constant when the second is a constant."""
+    def compile_comparison(compiler: _Compiler, spec, user_scope: bool) -> Test:
+        (operator,) = spec
+        first, second = (compiler.compile(operand, user_scope) for operand in compiler.operands(spec, operator, 2))
+        constant, value = compiler.constant(spec[operator][1])
+        if constant and with_constant:
+            return with_constant(first, value)
+        if constant:
+            return lambda device, config, user: compare(first(device, config, user), value)
+        return lambda device, config, user: compare(first(device, config, user), second(device, config, user))
+
+    return compile_comparison
+
+
+def _equals_constant(first: Test, value) -> Test:
+    """Compile the equality of a value and a constant."""
+    if not hasattr(first, "path"):
+        return lambda device, config, user: first(device, config, user) == value
+    section, key, default = first.path
+
+    def equals(device: Device, config: dict, user: User | None) -> bool:
+        try:
+            return config[section].get(key, default) == value
+        except (KeyError, AttributeError):
+            return default == value
+
+    return equals
+
+
+def _is_at_most(first, second) -> bool:
+    """Check that a value is at most another, false if either is missing."""
+    return first is not None and second is not None and first <= second
+
+
+def _is_at_least(first, second) -> bool:
+    """Check that a value is at least another, false if either is missing."""
+    return first is not None and second is not None and first >= second
+
+
+def _contains(collection, item) -> bool:
+    """Check that a collection contains an item, false if it is missing."""
+    return collection is not None and item in collection
+
+
+def _contains_all(collection, items) -> bool:
+    """Check that a collection contains all the items, false if it is missing."""
+    return collection is not None and all(item in collection for item in items)
+
+
+def _contains_all_constant(first: Test, items) -> Test:
+    """Compile the test that a collection contains all the constant items."""
+    # a list is tested with a set of the items, which is faster than testing every item when both are a few strings
+    if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+        return lambda device, config, user: _contains_all(first(device, config, user), items)
+    required = frozenset(items)
+    section, key, default = getattr(first, "path", (None, None, None))
+
+    def contains_all(device: Device, config: dict, user: User | None) -> bool:
+        if section is None:
+            collection = first(device, config, user)
+        else:
+            try:
+                collection = config[section].get(key, default)
+            except (KeyError, AttributeError):
+                collection = default
+        if type(collection) is list:
+            try:
+                return required.issubset(collection)
+            except TypeError:
+                pass
+        return _contains_all(collection, items)
+
+    return contains_all
+
+
+def _combination(combine: Callable):
+    """Get the compiler of a combination of tests by all or any."""
+    def compile_combination(compiler: _Compiler, spec, user_scope: bool) -> Test:
+        (operator,) = spec
+        tests = tuple(compiler.compile(operand, user_scope) for operand in compiler.operands(spec, operator))
+        return lambda device, config, user: combine(test(device, config, user) for test in tests)
+
+    return compile_combination
+
+
+def _not(compiler: _Compiler, spec, user_scope: bool) -> Test:
+    """Compile the negation of a test."""
+    test = compiler.compile(spec["not"], user_scope)
+    return lambda device, config, user: not test(device, config, user)
+
+
+def _with_user(compiler: _Compiler, spec, user_scope: bool) -> Test:
+    """Compile the user test of the user named by a value."""
+    username_spec, user_spec = compiler.operands(spec, "with_user", 2)
+    username, test = compiler.compile(username_spec, user_scope), compiler.compile(user_spec, user_scope=True)
+    users_by_name = compiler.users_by_name()
+
+    def test_named_user(device: Device, config: dict, user: User | None) -> bool:
+        named_user = users_by_name.get(username(device, config, user))
+        return named_user is not None and bool(test(device, config, named_user))
+
+    return test_named_user
+
+
+def _all_users_with_access(compiler: _Compiler, spec, user_scope: bool) -> Test:
+    """Compile the user test of every user with access to the device."""
+    test = compiler.compile(spec["all_users_with_access"], user_scope=True)
+    users_by_device = compiler.users_by_device()
+
+    def test_users_with_access(device: Device, config: dict, user: User | None) -> bool:
+        return all(test(device, config, other) for other in users_by_device.get(device.hostname, ()))
+
+    return test_users_with_access
+
+
+# the compilers of the operators of the expressions
+_OPERATORS: dict[str, Callable[[_Compiler, dict, bool], Test]] = {
+    "config": _config,
+    "device": _field(DEVICE_FIELDS, "device"),
+    "user": _field(USER_FIELDS, "user"),
+    "length": _length,
+    "equals": _comparison(lambda first, second: first == second, _equals_constant),
+    "at_most": _comparison(_is_at_most),
+    "at_least": _comparison(_is_at_least),
+    "contains": _comparison(_contains),
+    "contains_all": _comparison(_contains_all, _contains_all_constant),
+    "all": _combination(all),
+    "any": _combination(any),
+    "not": _not,
+    "with_user": _with_user,
+    "all_users_with_access": _all_users_with_access,
+}
+
+
+def _service_ip(devices: list[Device], service: str, default):
+    """Get the ip address of the first device that provides a service."""
+    for device in devices:
+        if service in device.configuration.get("services", []):
+            return device.ip_address
+    return default
+
+
+class RuleSet:
+    """A set of compliance rules, validated when it is created."""
+
+    def __init__(self, spec: dict, source: str = "<rules>"):
+        """
+        Initialize with the rules, and check that they compile.
+
+        :param spec: the rule set, with the context values and the checks
+        :param source: where the rule set was loaded from, for errors
+
+        Example rule set format:
+        {
+            "context": {"aaa_server": {"service_ip": "AAA", "default": ""}},
+            "checks": {
+                "Auth and AC": [
+                    {"details": "Device has auth enabled: {result}.", "test": {"config": "auth.enabled"}},
+                    {
+                        "details": "Device has expected centralized AAA server ({aaa_server}): {result}.",
+                        "test": {"equals": [{"config": "auth.aaa_server"}, {"context": "aaa_server"}]}
+                    }
+                ]
+            }
+        }
+        """
+        self._source = source
+        if not isinstance(spec, dict) or not isinstance(spec.get("checks"), dict) or not spec["checks"]:
+            raise InvalidRuleSetError(source, "a rule set must have checks")
+        self._context = spec.get("context", {})
+        for name, definition in self._context.items():
+            if not isinstance(definition, dict) or not isinstance(definition.get("service_ip"), str):
+                raise InvalidRuleSetError(source, f"context value {name!r} must have a service_ip")
+        self._checks = spec["checks"]
+        for check, rules in self._checks.items():
+            if check not in AuditReporter.VALID_ZTA_CHECKS:
+                raise InvalidRuleSetError(source, f"unknown check {check!r}")
+            if not isinstance(rules, list) or not rules:
+                raise InvalidRuleSetError(source, f"check {check!r} must have a list of rules")
+        self.compile([], [])
+
+    @classmethod
+    def load(cls, filepath: str = DEFAULT_RULES) -> "RuleSet":
+        """Load a rule set from a JSON or YAML file.
+
+        :param filepath: the path of the rule set, the rules of the Logging and Auth and AC checks by default
+        :return: the rule set
+        """
+        with open(filepath, "r") as f:
+            if filepath.endswith((".yaml", ".yml")):
+                if yaml is None:
+                    raise InvalidRuleSetError(filepath, "YAML rule sets require PyYAML")
+                spec = yaml.safe_load(f)
+            else:
+                try:
+                    spec = json.load(f)
+                except json.JSONDecodeError as err:
+                    raise InvalidRuleSetError(filepath, err) from err
+        return cls(spec, filepath)
+
+    @property
+    def checks(self) -> list[str]:
+        """The checks of the rule set."""
+        return list(self._checks)
+
+    def context(self, devices: list[Device]) -> dict:
+        """Get the context values of a fleet.
+
+        :param devices: the devices of the fleet
+        :return: the context values by name
+        """
+        return {
+            name: _service_ip(devices, definition["service_ip"], definition.get("default"))
+            for name, definition in self._context.items()
+        }
+
+    def compile(self, devices: list[Device], users: list[User]) -> dict[str, list[_CompiledRule]]:
+        """Compile the rules for a fleet.
+
+        :param devices: the devices of the fleet
+        :param users: the users of the fleet
+        :return: the compiled rules of each check
+        """
+        compiler = _Compiler(self.context(devices), users)
+        compiled = {check: [] for check in self._checks}
+        for check, rules in self._checks.items():
+            for index, rule in enumerate(rules):
+                compiler.where = f"{self._source}, {check} rule {index + 1}"
+                compiled[check].append(self._compile_rule(rule, compiler))
+        return compiled
+
+    @staticmethod
+    def _compile_rule(rule, compiler: _Compiler) -> _CompiledRule:
+        """Compile a rule, its test or its cases of tests by device type and default test."""
+        if not isinstance(rule, dict) or not isinstance(rule.get("details"), str):
+            raise compiler.error("a rule must have details")
+        if ("test" in rule) == isinstance(rule.get("cases"), list):
+            raise compiler.error("a rule must have either a test or a list of cases")
+        try:
+            details = rule["details"].format_map({**compiler.context, RESULT_FIELD: "\0"})
+        except (KeyError, IndexError, ValueError) as err:
+            raise compiler.error(f"invalid details {rule['details']!r}: {err!r}") from err
+        if "\0" not in details:
+            raise compiler.error(f"the details must show the {{{RESULT_FIELD}}}")
+        prefix, _, suffix = details.partition("\0")
+
+        if "test" in rule:
+            return _CompiledRule({}, compiler.compile(rule["test"]), prefix, suffix)
+        tests = {}
+        for case in rule["cases"]:
+            if not isinstance(case, dict) or not isinstance(case.get("device_types"), list) or "test" not in case:
+                raise compiler.error("a case must have device_types and a test")
+            test = compiler.compile(case["test"])
+            tests.update(dict.fromkeys(case["device_types"], test))
+        return _CompiledRule(tests, compiler.compile(rule.get("default", True)), prefix, suffix)
+
+
+class RuleCheck:
+    """Checks of a rule set."""
+
+    def __init__(self, rule_set: RuleSet, devices: list[Device], user_data: list[User]):
+        """
+        Initialize with a rule set, a list of Device objects and User data, and compile the rules for them.
+
+        :param rule_set: the rule set
+        :param devices: A list of Device objects to check.
+        :param user_data: A list of User objects representing users in the network.
+        """
+        self._devices = devices
+        self._rules = rule_set.compile(devices, user_data)
+        # the plans of each check by device type, resolved when a type is first checked
+        self._plans: dict[str, dict[str, _Plan]] = {check: {} for check in self._rules}
+
+    @property
+    def checks(self) -> list[str]:
+        """The checks of the rule set."""
+        return list(self._rules)
+
+    def _plan(self, check: str, device_type: str) -> _Plan:
+        """Get the tests of the rules of a check for a device type, and the format of their details."""
+        rules = self._rules[check]
+        plan = _Plan(
+            _evaluator([rule.tests.get(device_type, rule.default) for rule in rules]),
+            " \n".join(f"{rule.prefix.replace('%', '%%')}%s{rule.suffix.replace('%', '%%')}" for rule in rules),
+        )
+        self._plans[check][device_type] = plan
+        return plan
+
+    def run_rule_checks(
+        self, audit_reporter: AuditReporter, devices: list[Device] | None = None, checks: list[str] | None = None
+    ) -> None:
+        """Run the checks of the rule set for each device and report on results.
+
+        :param audit_reporter: the audit reporter
+        :param devices: only check these devices, all devices by default
+        :param checks: only run these checks, all checks of the rule set by default
+        :return: None
+        """
+        for check in self._rules if checks is None else checks:
+            plans = self._plans[check]
+            for device in self._devices if devices is None else devices:
+                plan = plans.get(device.device_type) or self._plan(check, device.device_type)
+                results = plan.evaluate(device, device.configuration)
+                audit_reporter.add_result(device.hostname, check, all(results), plan.details % results)
@@ -0,0 +1,173 @@
+"""Check for overlapping network segments across the segmentation policies of the fleet."""
+
+import heapq
+import ipaddress
+
+from app.audit_reporter import AuditReporter
+from app.domain_models import Device
+
+# max number of overlaps of a device, and of other devices of an overlapping segment, listed in its details
+MAX_LISTED_OVERLAPS = 5
+MAX_LISTED_OWNERS = 3
+
+Interval = tuple[int, int]
+
+
+def segment_interval(segment: str) -> Interval | None:
+    """Get the first and last address of an IPv4 segment as integers.
+
+    :param segment: the segment, a subnet or a VLAN ID/Name
+    :return: the interval of addresses, None if the segment is not an IPv4 subnet
+    """
+    # parsing the common dotted quad and prefix length form directly is several times faster than ipaddress
+    address, slash, prefix = segment.partition("/")
+    fields = [*address.split("."), prefix if slash else "32"]
+    if len(fields) == 5 and all(field.isascii() and field.isdecimal() and len(field) <= 3 for field in fields):
+        *octets, length = map(int, fields)
+        if max(octets) <= 255 and length <= 32:
+            value = octets[0] << 24 | octets[1] << 16 | octets[2] << 8 | octets[3]
+            host_bits = (1 << (32 - length)) - 1
+            return value & ~host_bits, value | host_bits
+        return None
+    try:
+        network = ipaddress.IPv4Network(segment, strict=False)
+    except ValueError:
+        return None
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def allowed_segments(device: Device) -> list[str]:
+    """Get the allowed segments of the segmentation policy of a device.
+
+    :param device: the device
+    :return: the allowed segments, which are empty for hosts and servers
+    """
+    return list((device.configuration.get("network_segmentation") or {}).get("allowed_segments") or [])
+
+
+def segment_intervals(device: Device) -> set[Interval]:
+    """Get the intervals of the allowed IPv4 segments of the segmentation policy of a device.
+
+    :param device: the device
+    :return: the intervals of addresses
+    """
+    return {interval for segment in allowed_segments(device) if (interval := segment_interval(segment)) is not None}
+
+
+class SegmentOverlapCheck:
+    """Segment overlap check.
+
+    Every allowed IPv4 segment is turned into an interval of integer addresses, and a sweep over the intervals sorted
+    by their first address finds every pair that overlaps in O(n log n + k) for n distinct segments and k overlapping
+    pairs. Devices that allow the same segment share it, e.g. the router and firewall of a site, which is not an
+    overlap. A segment that contains or partially overlaps another, on the same device or on another one, is.
+    """
+
+    def __init__(self, devices: list[Device]):
+        """
+        Initialize with a list of Device objects, and find the overlapping segments of their policies.
+
+        :param devices: A list of Device objects to check.
+
+        Example segment configuration format:
+            "network_segmentation": {
+                "allowed_segments": ["192.168.1.0/24", "10.0.0.0/24"]
+            }
+        """
+        self._devices = devices
+        self._overlaps: dict[str, list[str]] = {}
+        self._overlap_counts: dict[str, int] = {}
+        self._find_overlaps()
+
+    def _index_segments(self) -> tuple[list[Interval], dict[Interval, str], dict[Interval, list[str]]]:
+        """Index the distinct IPv4 segments of every policy by their interval.
+
+        :return: the intervals sorted by first address and then by size, largest first, the segment of each interval,
+            and the hostnames of the devices that allow it
+        """
+        parsed: dict[str, Interval | None] = {}
+        segments: dict[Interval, str] = {}
+        owners: dict[Interval, list[str]] = {}
+        for device in self._devices:
+            device_intervals = set()
+            for segment in allowed_segments(device):
+                if segment not in parsed:
+                    parsed[segment] = segment_interval(segment)
+                interval = parsed[segment]
+                if interval is not None and interval not in device_intervals:
+                    device_intervals.add(interval)
+                    segments.setdefault(interval, segment)
+                    owners.setdefault(interval, []).append(device.hostname)
+        # a segment comes before the segments it contains
+        intervals = sorted(segments, key=lambda interval: (interval[0], -interval[1]))
+        return intervals, segments, owners
+
+    def _find_overlaps(self) -> None:
+        """Sweep the intervals in order, keeping the ones that are still open in a heap by their last address.
+
+        Once the intervals that end before the next one starts are popped, every open interval starts before or with
+        it and ends after it starts, so every open interval overlaps it.
+
+        :return: None
+        """
+        intervals, segments, owners = self._index_segments()
+        open_intervals: list[Interval] = []
+        for interval in intervals:
+            start, end = interval
+            while open_intervals and open_intervals[0][0] < start:
+                heapq.heappop(open_intervals)
+            for open_end, open_start in open_intervals:
+                outer = (open_start, open_end)
+                if open_end >= end:
+                    self._add_overlap(outer, interval, "contains", "is contained by", segments, owners)
+                else:
+                    self._add_overlap(outer, interval, "overlaps", "overlaps", segments, owners)
+            heapq.heappush(open_intervals, (end, start))
+
+    def _add_overlap(
+        self,
+        first: Interval,
+        second: Interval,
+        relation: str,
+        inverse_relation: str,
+        segments: dict[Interval, str],
+        owners: dict[Interval, list[str]],
+    ) -> None:
+        """Record an overlap of two segments on the devices that allow either of them.
+
+        :param first: the interval that starts first
+        :param second: the other interval
+        :param relation: how the first segment relates to the second, e.g. contains
+        :param inverse_relation: how the second segment relates to the first, e.g. is contained by
+        :param segments: the segment of each interval
+        :param owners: the hostnames of the devices that allow each interval
+        :return: None
+        """
+        for interval, other, verb in ((first, second, relation), (second, first, inverse_relation)):
+            other_owners = owners[other]
+            listed = ", ".join(other_owners[:MAX_LISTED_OWNERS])
+            if len(other_owners) > MAX_LISTED_OWNERS:
+                listed += f" and {len(other_owners) - MAX_LISTED_OWNERS} more"
+            description = f"{segments[interval]} {verb} {segments[other]} ({listed})"
+            for hostname in owners[interval]:
+                count = self._overlap_counts.get(hostname, 0)
+                self._overlap_counts[hostname] = count + 1
+                if count < MAX_LISTED_OVERLAPS:
+                    self._overlaps.setdefault(hostname, []).append(description)
+
+    def run_segment_overlap_check(self, audit_reporter: AuditReporter, devices: list[Device] | None = None) -> None:
+        """Run the Segment Overlap check for each device and report on results.
+
+        :param audit_reporter: the audit reporter
+        :param devices: only check these devices, all devices by default
+        :return: None
+        """
+        for device in self._devices if devices is None else devices:
+            overlap_count = self._overlap_counts.get(device.hostname, 0)
+            compliant = overlap_count == 0
+            details = f"Device has allowed segments that overlap no other segment: {compliant}."
+            for description in self._overlaps.get(device.hostname, []):
+                details += f" \n{description}."
+            if overlap_count > MAX_LISTED_OVERLAPS:
+                details += f" \n{overlap_count - MAX_LISTED_OVERLAPS} more overlaps."
+            audit_reporter.add_result(device.hostname, "Segment Overlap", compliant, details)
@@ -1,57 +1,517 @@
 """ZTA Lightning
 Author: Joe Schmidt"""
 
-from app.audit_reporter import AuditReporter
-from app.domain_models import Device, User
-from app.zta_checks.auth_and_ac import AuthAndACCheck
-from app.zta_checks.least_privilege import LeastPrivilegeCheck
-from app.zta_checks.logging import LoggingCheck
-from app.cli import CLI
-from app.client import APIClient
-from app.zta_checks.network_segmentation import NetworkSegmentationCheck
+import argparse
+import json
+import os
+import signal
+import sys
+from contextlib import contextmanager
 
+from app.metrics import configure_from_environment as configure_metrics, metrics
+from app.profiling import PROFILERS, profiler
 
-def main():
-    """Run the ZTA Lightning application.
+# the modules of the audit are imported where they are first used, so that a headless run sends its first request
+# to the appliance before loading the checks, the report writer and the results store
+
+EXIT_COMPLIANT = 0
+EXIT_NON_COMPLIANT = 1
+# 2 is the exit code of argparse for invalid arguments
+EXIT_AUTHENTICATION_FAILED = 3
+EXIT_APPLIANCE_ERROR = 4
+EXIT_REPORT_ERROR = 5
+
+CONFIG_KEYS = {"url", "username", "password", "output", "results_db"}
+# environment variables of the settings of a headless run
+SETTING_ENV_VARS = {
+    "url": "ZTA_URL",
+    "username": "ZTA_USERNAME",
+    "password": "ZTA_PASSWORD",
+    "output": "ZTA_OUTPUT",
+    "results_db": "RESULTS_DB",
+}
+
+
+@contextmanager
+def _phase(name: str):
+    """Time a phase of the audit, and trace its memory when profiling."""
+    with metrics.timer("zta_phase_duration_seconds", phase=name), profiler.phase(name):
+        yield
+
+
+@contextmanager
+def _check(zta_check: str):
+    """Time a check of the audit, and trace its memory when profiling."""
+    with metrics.timer("zta_check_duration_seconds", check=zta_check), profiler.phase(f"check {zta_check}"):
+        yield
+
+
+def load_config(filepath: str) -> dict:
+    """Load the settings of a JSON config file.
 
-    :return: None
+    :param filepath: the path of the config file
+    :return: the settings
     """
+    with open(filepath, "r") as f:
+        config = json.load(f)
+    if not isinstance(config, dict) or config.keys() - CONFIG_KEYS:
+        raise ValueError(f"Invalid config file: {filepath}. Settings must be among {sorted(CONFIG_KEYS)}.")
+    return config
 
-    # get configuration details from the user
-    # and confirm connection to network appliance
-    cli = CLI()
-    cli.display_banner()
-    cli.display_instructions()
-    api_client = APIClient()
-    api_client.authenticate()
-    api_client.test_connection()
 
-    # with the connection confirmed, start the zta compliance audit
-    # by getting device configurations and normalizing the data
-    device_data = api_client.get_all_device_data()
+def resolve_settings(args: argparse.Namespace) -> dict:
+    """Get the settings of a run from the arguments, then the environment, then the config file.
+
+    :param args: the parsed arguments
+    :return: the settings, None for those that are not set
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    config = load_config(args.config) if args.config else {}
+    return {
+        key: getattr(args, key, None) or os.getenv(env_var) or config.get(key)
+        for key, env_var in SETTING_ENV_VARS.items()
+    }
+
+
+def run_audit(
+    api_client,
+    output: str | None = None,
+    results_db: str | None = None,
+    snapshot: str | None = None,
+    rule_set=None,
+):
+    """Run a ZTA compliance audit with an authenticated client.
+
+    :param api_client: the authenticated APIClient, or a SnapshotClient to audit a snapshot
+    :param output: the path of the report, dated in the working directory by default
+    :param results_db: the results database that the results are also recorded in
+    :param snapshot: the path of a snapshot that the fetched device and user data is saved to
+    :param rule_set: the RuleSet whose checks replace the check classes of the same name
+    :return: the AuditSummary of the results
+    """
+    from app.domain_models import Device, User
+    from app.exceptions import ApplianceRequestError
+    from app.schema import validate_device, validate_user
+
+    # start the zta compliance audit by getting device configurations and normalizing the data
+    with _phase("fetch_devices"):
+        device_data = api_client.get_all_device_data()
+    if device_data is None:
+        raise ApplianceRequestError("device configurations")
     device_data = device_data.get("configurations")
-    normalized_device_data = [Device(device) for device in device_data.values()]
+    with _phase("normalize_devices"):
+        normalized_device_data = [Device(validate_device(device)) for device in device_data.values()]
+    metrics.inc("zta_devices_processed_total", len(normalized_device_data))
+
+    from app.audit_reporter import AuditReporter
+    from app.results_store import ResultsStore
+    from app.zta_checks.address_uniqueness import AddressUniquenessCheck
+    from app.zta_checks.auth_and_ac import AuthAndACCheck
+    from app.zta_checks.least_privilege import LeastPrivilegeCheck
+    from app.zta_checks.logging import LoggingCheck
+    from app.zta_checks.network_segmentation import NetworkSegmentationCheck
+    from app.zta_checks.rule_engine import RuleCheck
+    from app.zta_checks.segment_overlap import SegmentOverlapCheck
+
+    # optionally keep the results of every run in a results database
+    results_store = ResultsStore(results_db) if results_db else None
 
     # conduct checks on zta principles and report compliance
-    with AuditReporter() as audit_reporter:
+    try:
+        with AuditReporter(output, asynchronous=True, results_store=results_store) as audit_reporter:
+            audit_reporter.register_devices(normalized_device_data)
+            with _phase("fetch_users"):
+                user_data = api_client.get_all_user_info()
+            if user_data is None:
+                raise ApplianceRequestError("user info.")
+            user_data = user_data.get("users")
+            if snapshot:
+                from app.snapshot import save_snapshot
+
+                with _phase("save_snapshot"):
+                    save_snapshot(snapshot, device_data, user_data, {"url": getattr(api_client, "base_url", None)})
+            with _phase("normalize_users"):
+                normalized_user_data = [User(validate_user(user)) for user in user_data.values()]
+            metrics.inc("zta_users_processed_total", len(normalized_user_data))
+
+            # the checks of a rule set replace the check classes of the same name
+            rule_check = RuleCheck(rule_set, normalized_device_data, normalized_user_data) if rule_set else None
+            replaced_checks = rule_check.checks if rule_check else []
+            for zta_check in replaced_checks:
+                with _check(zta_check):
+                    rule_check.run_rule_checks(audit_reporter, checks=[zta_check])
+
+            if "Logging" not in replaced_checks:
+                with _check("Logging"):
+                    logging_check = LoggingCheck(normalized_device_data)
+                    logging_check.run_logging_checks(audit_reporter)
+
+            if "Auth and AC" not in replaced_checks:
+                with _check("Auth and AC"):
+                    auth_and_ac_check = AuthAndACCheck(normalized_device_data, normalized_user_data)
+                    auth_and_ac_check.run_auth_and_ac_checks(audit_reporter)
+
+            if "Network Segmentation" not in replaced_checks:
+                with _check("Network Segmentation"):
+                    network_segmentation_check = NetworkSegmentationCheck(normalized_device_data)
+                    network_segmentation_check.run_network_segmentation_checks(audit_reporter)
+
+            # the implication here is that the other checks support
+            # least privilege because it is the core tenet to zta
+            if "Least Privilege" not in replaced_checks:
+                with _check("Least Privilege"):
+                    least_privilege_check = LeastPrivilegeCheck(normalized_device_data, normalized_user_data)
+                    least_privilege_check.run_least_privilege_check(audit_reporter)
+
+            if "Address Uniqueness" not in replaced_checks:
+                with _check("Address Uniqueness"):
+                    address_uniqueness_check = AddressUniquenessCheck(normalized_device_data)
+                    address_uniqueness_check.run_address_uniqueness_check(audit_reporter)
+
+            if "Segment Overlap" not in replaced_checks:
+                with _check("Segment Overlap"):
+                    segment_overlap_check = SegmentOverlapCheck(normalized_device_data)
+                    segment_overlap_check.run_segment_overlap_check(audit_reporter)
+    finally:
+        if results_store:
+            results_store.close()
+        metrics.write()
+    return audit_reporter.summary
+
+
+def run_streaming_audit(api_client, output: str | None = None, results_db: str | None = None):
+    """Run a ZTA compliance audit in which devices are streamed from the appliance through the checks to the report.
+
+    :param api_client: the authenticated APIClient
+    :param output: the path of the report, dated in the working directory by default
+    :param results_db: the results database that the results are also recorded in
+    :return: the AuditSummary of the results
+    """
+    from app.audit_reporter import AuditReporter
+    from app.pipeline import AuditPipeline
+    from app.results_store import ResultsStore
+
+    print("Address Uniqueness compares every device with the whole fleet, so streaming audits leave it out.")
+    results_store = ResultsStore(results_db) if results_db else None
+    try:
+        with AuditReporter(
+            output, asynchronous=True, results_store=results_store, constant_memory=True
+        ) as audit_reporter:
+            AuditPipeline(api_client, audit_reporter).run()
+    finally:
+        if results_store:
+            results_store.close()
+        metrics.write()
+    return audit_reporter.summary
+
+
+def run_sample_audit(api_client, args: argparse.Namespace, output: str | None = None, results_db: str | None = None):
+    """Run a ZTA compliance audit of a stratified random sample of the devices, and print the estimated pass rates.
+
+    :param api_client: the authenticated APIClient
+    :param args: the parsed arguments, with the sample size or margin of error, confidence and seed
+    :param output: the path of the report of the sampled devices, dated in the working directory by default
+    :param results_db: the results database that the results are also recorded in
+    :return: the AuditSummary of the sampled devices' results
+    """
+    from app.audit_reporter import AuditReporter
+    from app.results_store import ResultsStore
+    from app.sampling import SampleAudit, print_estimates
+
+    sample_audit = SampleAudit(api_client, args.sample_size, args.confidence, args.margin, args.sample_seed)
+    results_store = ResultsStore(results_db) if results_db else None
+    try:
+        with AuditReporter(output, asynchronous=True, results_store=results_store) as audit_reporter:
+            estimates = sample_audit.run(audit_reporter)
+    finally:
+        if results_store:
+            results_store.close()
+        metrics.write()
+    print_estimates(estimates, args.confidence)
+    return audit_reporter.summary
+
+
+def run_distributed_audit(
+    api_client, args: argparse.Namespace, output: str | None = None, results_db: str | None = None
+):
+    """Run a ZTA compliance audit whose checks are run by the workers of a work queue, and merge their results.
+
+    :param api_client: the authenticated APIClient, or a SnapshotClient to audit a snapshot
+    :param args: the parsed arguments, with the directory of the work queue, the shard size and local workers
+    :param output: the path of the report, dated in the working directory by default
+    :param results_db: the results database that the results are also recorded in
+    :return: the AuditSummary of the results
+    """
+    from app.audit_reporter import AuditReporter
+    from app.distributed import AuditCoordinator, FileWorkQueue, start_local_workers
+    from app.exceptions import ApplianceRequestError
+    from app.results_store import ResultsStore
+    from app.schema import validate_device, validate_user
+
+    with _phase("fetch_devices"):
+        device_data = api_client.get_all_device_data()
+    if device_data is None:
+        raise ApplianceRequestError("device configurations")
+    with _phase("fetch_users"):
         user_data = api_client.get_all_user_info()
-        user_data = user_data.get("users")
-        normalized_user_data = [User(user) for user in user_data.values()]
+    if user_data is None:
+        raise ApplianceRequestError("user info.")
+    with _phase("validate"):
+        device_records = [validate_device(record) for record in device_data.get("configurations").values()]
+        user_records = [validate_user(record) for record in user_data.get("users").values()]
+    metrics.inc("zta_users_processed_total", len(user_records))
+
+    work_queue = FileWorkQueue.create(args.distribute, args.lease_seconds)
+    workers = start_local_workers(args.distribute, args.workers)
+    results_store = ResultsStore(results_db) if results_db else None
+    try:
+        with AuditReporter(output, asynchronous=True, results_store=results_store) as audit_reporter:
+            with _phase("distributed_checks"):
+                AuditCoordinator(work_queue, audit_reporter, args.shard_size).run(device_records, user_records)
+    finally:
+        work_queue.close()
+        for worker in workers:
+            worker.wait()
+        if results_store:
+            results_store.close()
+        metrics.write()
+    return audit_reporter.summary
+
+
+def _connect(args: argparse.Namespace, settings: dict):
+    """Connect to the appliance, prompting for the url and credentials unless the run is headless.
+
+    :param args: the parsed arguments
+    :param settings: the settings of the run
+    :return: the authenticated APIClient, or None if authentication failed
+    """
+    if args.from_snapshot:
+        from app.snapshot import SnapshotClient
+
+        with _phase("load_snapshot"):
+            return SnapshotClient(args.from_snapshot)
+
+    import requests
+
+    from app.client import APIClient
+
+    api_client = APIClient()
+    if not args.headless:
+        # get configuration details from the user
+        # and confirm connection to network appliance
+        from app.cli import CLI
+
+        cli = CLI()
+        cli.display_banner()
+        cli.display_instructions()
+        with _phase("authenticate"):
+            api_client.authenticate()
+            # authenticate reports a failed login and leaves the client logged out
+            if api_client.base_url is None:
+                return None
+            api_client.test_connection()
+        return api_client
+
+    with _phase("authenticate"):
+        try:
+            api_client.login(settings["url"], settings["username"], settings["password"])
+        except requests.exceptions.RequestException as err:
+            print(f"Authentication failed: {err}", file=sys.stderr)
+            return None
+    return api_client
+
+
+def _run(args: argparse.Namespace, settings: dict) -> int:
+    """Connect to the appliance and run the audit.
+
+    :param args: the parsed arguments
+    :param settings: the settings of the run
+    :return: the exit code
+    """
+    import requests
+
+    from app.exceptions import (
+        ApplianceRequestError,
+        AuditReportWriteError,
+        InvalidDeviceValueError,
+        InvalidSnapshotError,
+        InvalidUserValueError,
+        WorkQueueError,
+    )
+
+    try:
+        api_client = _connect(args, settings)
+    except (InvalidSnapshotError, OSError) as err:
+        print(f"Snapshot failed: {err}", file=sys.stderr)
+        return EXIT_APPLIANCE_ERROR
+    if api_client is None:
+        return EXIT_AUTHENTICATION_FAILED
+    try:
+        if args.stream:
+            summary = run_streaming_audit(api_client, settings["output"], settings["results_db"])
+        elif args.sample:
+            summary = run_sample_audit(api_client, args, settings["output"], settings["results_db"])
+        elif args.distribute:
+            summary = run_distributed_audit(api_client, args, settings["output"], settings["results_db"])
+        else:
+            summary = run_audit(api_client, settings["output"], settings["results_db"], args.snapshot, args.rule_set)
+    except (ApplianceRequestError, WorkQueueError, requests.exceptions.RequestException) as err:
+        print(f"Audit failed: {err}", file=sys.stderr)
+        return EXIT_APPLIANCE_ERROR
+    except (InvalidDeviceValueError, InvalidUserValueError) as err:
+        print(f"Audit failed, the appliance returned invalid data: {err}", file=sys.stderr)
+        return EXIT_APPLIANCE_ERROR
+    except (AuditReportWriteError, OSError) as err:
+        print(f"Audit report failed: {err}", file=sys.stderr)
+        return EXIT_REPORT_ERROR
+    failed = any(failed for _, failed in summary.check_counts().values())
+    return EXIT_NON_COMPLIANT if failed else EXIT_COMPLIANT
+
+
+def _run_daemon(args: argparse.Namespace, settings: dict) -> int:
+    """Audit the appliance continuously until interrupted.
+
+    :param args: the parsed arguments
+    :param settings: the settings of the run
+    :return: the exit code
+    """
+    from app.client import APIClient
+    from app.daemon import AuditDaemon
+
+    daemon = AuditDaemon(
+        APIClient(), settings["url"], settings["username"], settings["password"], args.publish, args.interval
+    )
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    daemon.run()
+    return EXIT_COMPLIANT
+
+
+def main() -> int:
+    """Run the ZTA Lightning application.
+
+    :return: the exit code, 0 if every device passed every check and 1 if any failed
+    """
+    parser = argparse.ArgumentParser(
+        description="Audit a network for compliance with ZTA principles.",
+        epilog=(
+            f"exit codes: {EXIT_COMPLIANT} compliant, {EXIT_NON_COMPLIANT} non-compliant results, 2 invalid arguments, "
+            f"{EXIT_AUTHENTICATION_FAILED} authentication failed, {EXIT_APPLIANCE_ERROR} appliance error, "
+            f"{EXIT_REPORT_ERROR} report error"
+        ),
+    )
+    parser.add_argument(
+        "--headless", action="store_true", help="run without prompts, with the url and credentials of the settings"
+    )
+    parser.add_argument(
+        "--config", help=f"JSON config file of settings, any of {sorted(CONFIG_KEYS)} (overridden by the environment)"
+    )
+    parser.add_argument("--url", help="url of the appliance (ZTA_URL)")
+    parser.add_argument("--username", help="username (ZTA_USERNAME); the password is read from ZTA_PASSWORD")
+    parser.add_argument("--output", help="path of the report (ZTA_OUTPUT)")
+    parser.add_argument("--results-db", dest="results_db", help="results database to record the run in (RESULTS_DB)")
+    parser.add_argument(
+        "--daemon", action="store_true", help="audit continuously, re-evaluating only what changed (implies --headless)"
+    )
+    parser.add_argument("--interval", type=float, default=60, help="seconds between the polls of the daemon")
+    parser.add_argument(
+        "--publish",
+        default="zta_results.ndjson",
+        help="newline delimited JSON results file that the daemon replaces after each poll",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream devices through the checks to the report in batches, for less memory and earlier results",
+    )
+    parser.add_argument(
+        "--sample",
+        action="store_true",
+        help="only check a random sample of the devices, stratified by device type and subnet, and estimate the "
+        "pass rates of the fleet",
+    )
+    parser.add_argument(
+        "--sample-size", dest="sample_size", type=int, help="number of devices to sample (default: meet --margin)"
+    )
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of the estimates")
+    parser.add_argument("--margin", type=float, default=0.05, help="margin of error that the sample size meets")
+    parser.add_argument("--sample-seed", dest="sample_seed", help="seed that makes the sample reproducible")
+    parser.add_argument(
+        "--distribute",
+        metavar="QUEUE_DIR",
+        help="run the checks on the workers of a work queue in this new shared directory (python -m app.distributed)",
+    )
+    parser.add_argument("--workers", type=int, default=0, help="number of workers to start on this host")
+    parser.add_argument("--shard-size", dest="shard_size", type=int, default=500, help="number of devices per shard")
+    parser.add_argument(
+        "--lease-seconds",
+        dest="lease_seconds",
+        type=float,
+        default=30,
+        help="seconds before the shard of a worker that stopped renewing its lease is retried",
+    )
+    parser.add_argument("--snapshot", help="save the fetched device and user data to a snapshot file")
+    parser.add_argument(
+        "--rules",
+        help="JSON or YAML rule set whose checks replace the built-in checks of the same name "
+        "(app/zta_checks/zta_rules.json expresses Logging and Auth and AC)",
+    )
+    parser.add_argument(
+        "--from-snapshot",
+        dest="from_snapshot",
+        help="audit the data of a snapshot file instead of the appliance, without the network",
+    )
+    parser.add_argument("--profile", choices=PROFILERS, help="write a CPU profile of the run")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="write the peak memory and top allocation sites of each phase"
+    )
+    parser.add_argument("--profile-dir", default=".", help="directory of the profile files")
+    args = parser.parse_args()
+    args.headless = args.headless or args.daemon
 
-        logging_check = LoggingCheck(normalized_device_data)
-        logging_check.run_logging_checks(audit_reporter)
+    try:
+        settings = resolve_settings(args)
+    except (OSError, ValueError) as err:
+        parser.error(str(err))
+    configure_metrics()
+    if args.from_snapshot and args.daemon:
+        parser.error("the daemon audits the appliance, not a snapshot")
+    if args.stream and (args.snapshot or args.from_snapshot or args.daemon):
+        parser.error("--stream cannot be combined with snapshots or the daemon")
+    if args.sample and (args.stream or args.snapshot or args.from_snapshot or args.daemon):
+        parser.error("--sample cannot be combined with --stream, snapshots or the daemon")
+    if args.distribute and (args.stream or args.sample or args.snapshot or args.daemon or args.rules):
+        parser.error("--distribute cannot be combined with --stream, --sample, --snapshot, --rules or the daemon")
+    if args.rules and (args.stream or args.sample or args.daemon):
+        parser.error("--rules cannot be combined with --stream, --sample or the daemon")
+    args.rule_set = None
+    if args.rules:
+        from app.exceptions import InvalidRuleSetError
+        from app.zta_checks.rule_engine import RuleSet
 
-        auth_and_ac_check = AuthAndACCheck(normalized_device_data, normalized_user_data)
-        auth_and_ac_check.run_auth_and_ac_checks(audit_reporter)
+        try:
+            args.rule_set = RuleSet.load(args.rules)
+        except (InvalidRuleSetError, OSError) as err:
+            parser.error(str(err))
+    if args.headless and not args.from_snapshot:
+        missing = [f"{key} ({SETTING_ENV_VARS[key]})" for key in ("url", "username", "password") if not settings[key]]
+        if missing:
+            parser.error(f"a headless run requires the settings {', '.join(missing)}")
 
-        network_segmentation_check = NetworkSegmentationCheck(normalized_device_data)
-        network_segmentation_check.run_network_segmentation_checks(audit_reporter)
+    run = _run_daemon if args.daemon else _run
+    profiler.configure(args.profile, args.trace_memory, args.profile_dir)
+    if not profiler.enabled:
+        return run(args, settings)
 
-        # the implication here is that the other checks support
-        # least privilege because it is the core tenet to zta
-        least_privilege_check = LeastPrivilegeCheck(normalized_device_data, normalized_user_data)
-        least_privilege_check.run_least_privilege_check(audit_reporter)
+    profiler.start()
+    try:
+        return run(args, settings)
+    finally:
+        for filepath in profiler.stop():
+            print(f"Profile written: {filepath}")
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
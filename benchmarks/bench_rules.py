@@ -0,0 +1,82 @@
+"""Throughput benchmark of the compiled rule set against the hand-written Logging and Auth and AC checks.
+
+A seeded fleet is generated in memory, and each check is run by its check class and by a RuleCheck of the default
+rule set's rules of the check, counting the construction (the compilation of the rules, for the rule set) and the run.
+The results of both are compared, and each mode runs --repeat times and the fastest time is kept.
+
+Usage:
+    python benchmarks/bench_rules.py --devices 5000 --repeat 5
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections.abc import Callable
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "simulation"))
+
+from app.audit_reporter import ResultCollector  # noqa: E402
+from app.domain_models import Device, User  # noqa: E402
+from app.zta_checks.auth_and_ac import AuthAndACCheck  # noqa: E402
+from app.zta_checks.logging import LoggingCheck  # noqa: E402
+from app.zta_checks.rule_engine import DEFAULT_RULES, RuleCheck, RuleSet  # noqa: E402
+from fleet_generator import FleetGenerator  # noqa: E402
+
+
+def best_time(run: Callable[[ResultCollector], None], repeat: int) -> tuple[float, dict]:
+    """Time a check, keeping the fastest of the repeats.
+
+    :param run: the function that runs the check with a result collector
+    :param repeat: the number of repeats
+    :return: the fastest time in seconds and the results
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        collector = ResultCollector()
+        start = time.perf_counter()
+        run(collector)
+        best = min(best, time.perf_counter() - start)
+    return best, collector.by_device_and_check()
+
+
+def main():
+    """Run the benchmark.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the compiled rule set against the hand-written checks.")
+    parser.add_argument("--devices", type=int, default=5000, help="number of devices of the generated fleet")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs of each mode")
+    args = parser.parse_args()
+
+    devices, users = [], []
+    for site_devices, site_users in FleetGenerator(args.devices, seed=1).generate():
+        devices.extend(Device(record) for record in site_devices)
+        users.extend(User(record) for record in site_users)
+    with open(DEFAULT_RULES, "r") as f:
+        spec = json.load(f)
+
+    checks = {
+        "Logging": lambda collector: LoggingCheck(devices).run_logging_checks(collector),
+        "Auth and AC": lambda collector: AuthAndACCheck(devices, users).run_auth_and_ac_checks(collector),
+    }
+    print(f"{'check':<14}{'devices':>8}{'hand-written (dev/s)':>23}{'rule set (dev/s)':>19}{'speedup':>10}")
+    for check, run_check in checks.items():
+        rule_set = RuleSet({"context": spec["context"], "checks": {check: spec["checks"][check]}})
+        hand_written_time, expected = best_time(run_check, args.repeat)
+        rule_time, results = best_time(
+            lambda collector: RuleCheck(rule_set, devices, users).run_rule_checks(collector), args.repeat
+        )
+        if results != expected:
+            raise RuntimeError(f"The results of the rule set differ from the {check} check")
+        print(
+            f"{check:<14}{len(devices):>8}{len(devices) / hand_written_time:>23.0f}{len(devices) / rule_time:>19.0f}"
+            f"{hand_written_time / rule_time:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Throughput benchmark of the compiled schema validators against the interpreted validator.
+
+A seeded fleet is generated in memory, and every device and user record is validated by the validators compiled from
+the schemas and by interpret_schema walking the same schemas. Each mode runs --repeat times and the fastest time is
+kept.
+
+Usage:
+    python benchmarks/bench_schema.py --devices 20000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+from collections.abc import Callable
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "simulation"))
+
+from app.schema import CONFIGURATION_SCHEMAS, USER_SCHEMA, compile_schema, interpret_schema  # noqa: E402
+from fleet_generator import FleetGenerator  # noqa: E402
+
+
+def records_per_second(validate: Callable[[dict], list[str]], records: list[dict], repeat: int) -> float:
+    """Time the validation of the records, keeping the fastest of the repeats.
+
+    :param validate: the function that validates a record
+    :param records: the records
+    :param repeat: the number of repeats
+    :return: the records validated per second
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for record in records:
+            if validate(record):
+                raise RuntimeError(f"Record failed validation: {validate(record)}")
+        best = min(best, time.perf_counter() - start)
+    return len(records) / best
+
+
+def main():
+    """Run the benchmark.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the compiled schema validators.")
+    parser.add_argument("--devices", type=int, default=20000, help="number of devices of the generated fleet")
+    parser.add_argument("--repeat", type=int, default=5, help="number of runs of each mode")
+    args = parser.parse_args()
+
+    devices, users = [], []
+    for site_devices, site_users in FleetGenerator(args.devices, seed=1).generate():
+        devices.extend(site_devices)
+        users.extend(site_users)
+
+    start = time.perf_counter()
+    compiled = {device_type: compile_schema(schema) for device_type, schema in CONFIGURATION_SCHEMAS.items()}
+    compiled_user = compile_schema(USER_SCHEMA)
+    print(f"Compiled {len(compiled) + 1} schemas in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    modes = {
+        "devices": (
+            devices,
+            lambda record: interpret_schema(CONFIGURATION_SCHEMAS[record["device_type"]], record["configuration"]),
+            lambda record: compiled[record["device_type"]](record["configuration"]),
+        ),
+        "users": (users, lambda record: interpret_schema(USER_SCHEMA, record), compiled_user),
+    }
+    print(f"{'records':<10}{'count':>8}{'interpreted (rec/s)':>22}{'compiled (rec/s)':>20}{'speedup':>10}")
+    for name, (records, interpreted, compiled_validate) in modes.items():
+        interpreted_rate = records_per_second(interpreted, records, args.repeat)
+        compiled_rate = records_per_second(compiled_validate, records, args.repeat)
+        print(
+            f"{name:<10}{len(records):>8}{interpreted_rate:>22.0f}{compiled_rate:>20.0f}"
+            f"{compiled_rate / interpreted_rate:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Per-phase benchmark suite of an audit, with regression gates against stored baselines.
+
+For each fleet size, a seeded fleet is generated and served by the simulated appliance in-process, then each phase of
+an audit is timed: fetching the devices and users, normalizing them into Device and User objects, each of the ZTA
+checks, and writing the report. Every phase runs --repeat times and the fastest time is kept, since slower runs are
+noise from the machine rather than the code.
+
+The times are compared to the baselines file, and the suite exits with status 1 if a phase is slower than its
+baseline by more than the threshold. Run with --update-baselines on a reference machine to record new baselines.
+Everything runs offline.
+
+Usage:
+    python benchmarks/bench_suite.py --sizes 1000,4000 --threshold 0.25
+    python benchmarks/bench_suite.py --update-baselines
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "simulation"))
+
+import appliance  # noqa: E402
+import token_verification  # noqa: E402
+from app.audit_reporter import AuditReporter, ResultCollector  # noqa: E402
+from app.client import APIClient  # noqa: E402
+from app.domain_models import Device, User  # noqa: E402
+from app.zta_checks.auth_and_ac import AuthAndACCheck  # noqa: E402
+from app.zta_checks.least_privilege import LeastPrivilegeCheck  # noqa: E402
+from app.zta_checks.logging import LoggingCheck  # noqa: E402
+from app.zta_checks.network_segmentation import NetworkSegmentationCheck  # noqa: E402
+from data_store import sanitize_user  # noqa: E402
+from fleet_generator import FleetGenerator, write_fleet  # noqa: E402
+from inventory import Inventory  # noqa: E402
+
+DEFAULT_BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_SIZES = "1000,4000"
+DEFAULT_THRESHOLD = 0.25
+# slowdowns smaller than this are not gated, since short phases are too noisy to gate on a fraction alone
+MIN_REGRESSION_SECONDS = 0.02
+
+
+def time_phase(function: Callable, repeat: int):
+    """Time the fastest of several runs of a phase, with its output silenced.
+
+    As with timeit, garbage collection is disabled while a phase runs, so collections triggered by earlier phases
+    are not timed.
+
+    :param function: the phase
+    :param repeat: the number of runs
+    :return: the fastest time in seconds and the return value of the last run
+    """
+    best = float("inf")
+    value = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                value = function()
+                best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best, value
+
+
+def serve_fleet(devices_file: str, users_file: str):
+    """Serve a fleet with the simulated appliance in a background thread.
+
+    :param devices_file: the path of the devices file
+    :param users_file: the path of the users file
+    :return: the werkzeug server, to be stopped with shutdown and server_close
+    """
+    from werkzeug.serving import make_server
+
+    appliance.device_inventory = Inventory(devices_file, index_field="device_type")
+    appliance.user_inventory = token_verification.user_inventory = Inventory(users_file, sanitize=sanitize_user)
+    token_verification.token_cache.clear()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, appliance.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_size(size: int, seed: int, repeat: int, tmp_dir: str) -> dict[str, float]:
+    """Time each phase of an audit of a generated fleet.
+
+    :param size: the number of devices
+    :param seed: the seed of the fleet
+    :param repeat: the number of runs of each phase
+    :param tmp_dir: the directory of the fleet files and reports
+    :return: the time of each phase in seconds
+    """
+    devices_file = os.path.join(tmp_dir, f"devices_{size}.json")
+    users_file = os.path.join(tmp_dir, f"users_{size}.json")
+    write_fleet(FleetGenerator(size, seed=seed), devices_file, users_file)
+    timings = {}
+    server = serve_fleet(devices_file, users_file)
+    try:
+        client = APIClient()
+        client.login(f"http://127.0.0.1:{server.server_port}", "joe", "admin")
+        timings["fetch_devices"], device_data = time_phase(client.get_all_device_data, repeat)
+        timings["fetch_users"], user_data = time_phase(client.get_all_user_info, repeat)
+    finally:
+        # the server of each size is stopped before the next one, and before the other phases are timed
+        server.shutdown()
+        server.server_close()
+    device_data = list(device_data["configurations"].values())
+    user_data = list(user_data["users"].values())
+    timings["normalize_devices"], devices = time_phase(lambda: [Device(device) for device in device_data], repeat)
+    timings["normalize_users"], users = time_phase(lambda: [User(user) for user in user_data], repeat)
+
+    checks = {
+        "check_logging": lambda reporter: LoggingCheck(devices).run_logging_checks(reporter),
+        "check_auth_and_ac": lambda reporter: AuthAndACCheck(devices, users).run_auth_and_ac_checks(reporter),
+        "check_network_segmentation": lambda reporter: NetworkSegmentationCheck(
+            devices
+        ).run_network_segmentation_checks(reporter),
+        "check_least_privilege": lambda reporter: LeastPrivilegeCheck(devices, users).run_least_privilege_check(
+            reporter
+        ),
+    }
+    results = []
+    for phase, check in checks.items():
+
+        def run_check(check=check):
+            collector = ResultCollector()
+            check(collector)
+            return collector.results
+
+        timings[phase], check_results = time_phase(run_check, repeat)
+        results.extend(check_results)
+
+    def write_report():
+        with AuditReporter(os.path.join(tmp_dir, f"report_{size}.xlsx")) as audit_reporter:
+            audit_reporter.register_devices(devices)
+            for result in results:
+                audit_reporter.add_result(*result)
+
+    timings["report"], _ = time_phase(write_report, repeat)
+    return timings
+
+
+def find_regressions(
+    timings: dict[str, dict[str, float]], baselines: dict[str, dict[str, float]], threshold: float
+) -> list[str]:
+    """Find the phases that are slower than their baselines by more than the threshold.
+
+    :param timings: the time of each phase by fleet size
+    :param baselines: the baseline time of each phase by fleet size
+    :param threshold: the allowed slowdown as a fraction of the baseline
+    :return: a description of each regression
+    """
+    regressions = []
+    for size, phases in timings.items():
+        for phase, seconds in phases.items():
+            baseline = baselines.get(size, {}).get(phase)
+            if baseline is None:
+                continue
+            if seconds > baseline * (1 + threshold) and seconds - baseline > MIN_REGRESSION_SECONDS:
+                regressions.append(f"{phase} at {size} devices: {seconds:.4f}s vs baseline {baseline:.4f}s")
+    return regressions
+
+
+def main():
+    """Run the benchmark suite.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark each phase of an audit against stored baselines.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma separated fleet sizes, default {DEFAULT_SIZES}")
+    parser.add_argument("--seed", type=int, default=7, help="seed of the generated fleets")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs of each phase")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES_FILE, help="path of the baselines file")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown as a fraction of the baseline"
+    )
+    parser.add_argument("--update-baselines", action="store_true", help="record the timings as the new baselines")
+    args = parser.parse_args()
+
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in (int(size) for size in args.sizes.split(",")):
+            timings[str(size)] = run_size(size, args.seed, args.repeat, tmp_dir)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, "r") as f:
+            baselines = json.load(f)
+
+    print(f"{'size':>8} {'phase':<28}{'seconds':>10}{'baseline':>10}{'change':>9}")
+    for size, phases in timings.items():
+        for phase, seconds in phases.items():
+            baseline = baselines.get(size, {}).get(phase)
+            change = f"{seconds / baseline - 1:+.0%}" if baseline else ""
+            baseline = f"{baseline:.4f}" if baseline else ""
+            print(f"{size:>8} {phase:<28}{seconds:>10.4f}{baseline:>10}{change:>9}")
+
+    if args.update_baselines:
+        with open(args.baselines, "w") as f:
+            json.dump({**baselines, **timings}, f, indent=2)
+            f.write("\n")
+        print(f"Baselines written to {args.baselines}")
+        return
+
+    regressions = find_regressions(timings, baselines, args.threshold)
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
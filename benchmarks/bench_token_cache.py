@@ -0,0 +1,64 @@
+"""Micro-benchmark of the protected appliance endpoints with and without the verified-token cache.
+
+Requests are sent through the Flask test client, so the numbers measure the appliance's request handling without
+any network.
+
+Usage:
+    python benchmarks/bench_token_cache.py --requests 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "simulation"))
+
+import appliance  # noqa: E402
+import token_verification  # noqa: E402
+
+ENDPOINTS = ["/device/Router1/config", "/device/Host1/config", "/users/data?limit=10"]
+
+
+def requests_per_second(client, headers: dict, path: str, count: int) -> float:
+    """Time a number of requests to an endpoint.
+
+    :param client: the Flask test client
+    :param headers: the request headers
+    :param path: the endpoint path
+    :param count: the number of requests
+    :return: the requests per second
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get(path, headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f"Request to {path} failed: {response.status_code}")
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    """Run the benchmark.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the verified-token cache.")
+    parser.add_argument("--requests", type=int, default=5000, help="number of requests per endpoint and mode")
+    args = parser.parse_args()
+
+    client = appliance.app.test_client()
+    token = client.post("/auth", json={"username": "joe", "password": "admin"}).json["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    cache_size = token_verification.token_cache.max_size
+
+    print(f"{'endpoint':<28}{'no cache (req/s)':>18}{'cache (req/s)':>16}{'speedup':>10}")
+    for path in ENDPOINTS:
+        token_verification.token_cache.max_size = 0
+        token_verification.token_cache.clear()
+        uncached = requests_per_second(client, headers, path, args.requests)
+        token_verification.token_cache.max_size = cache_size
+        cached = requests_per_second(client, headers, path, args.requests)
+        print(f"{path:<28}{uncached:>18.0f}{cached:>16.0f}{cached / uncached:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Load test of the appliance API.
+
+Concurrent workers, each with its own APIClient and connection pool, send a weighted mix of requests to /auth,
+/device/<hostname>/config, /device/configs and /users/data for a fixed duration, then the throughput and latency
+percentiles of each request type are reported. With --serve, the simulated appliance is served in-process by a
+threaded werkzeug server, so the test runs fully locally; otherwise --url points at a running appliance, e.g. one
+started with simulation/serve.py.
+
+Usage:
+    python benchmarks/load_test.py --serve --concurrency 16 --duration 30 --mix device=80,devices_page=10,users=5,auth=5
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 --concurrency 64 --json results.json
+"""
+import argparse
+import bisect
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from app.client import APIClient  # noqa: E402
+
+# operations of the request mix, see build_operations
+OPERATIONS = ("auth", "device", "devices", "devices_page", "users")
+DEFAULT_MIX = "device=80,devices_page=10,users=5,auth=5"
+# upper bounds of the latency histogram buckets in milliseconds
+HISTOGRAM_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, math.inf]
+
+
+class LatencyStats:
+    """Latencies and errors of one request type."""
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+
+    def percentile(self, fraction: float) -> float:
+        """Get a latency percentile of the sorted latencies, in milliseconds."""
+        if not self.latencies:
+            return 0.0
+        return self.latencies[min(len(self.latencies) - 1, int(fraction * len(self.latencies)))] * 1000
+
+    def histogram(self) -> list[int]:
+        """Get the number of latencies in each histogram bucket."""
+        counts = [0] * len(HISTOGRAM_BUCKETS_MS)
+        for latency in self.latencies:
+            counts[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, latency * 1000)] += 1
+        return counts
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """Parse a request mix given as 'operation=weight,...'.
+
+    :param mix: the request mix
+    :return: the weight of each operation
+    """
+    weights = {}
+    for item in mix.split(","):
+        operation, _, weight = item.partition("=")
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Invalid operation: {operation}. Must be one of {list(OPERATIONS)}.")
+        try:
+            weights[operation] = int(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight of {operation}: {weight}. Must be an integer.") from None
+        if weights[operation] < 0:
+            raise argparse.ArgumentTypeError(f"Invalid weight of {operation}: {weight}. Must not be negative.")
+    if not any(weights.values()):
+        raise argparse.ArgumentTypeError(f"Invalid request mix: {mix}. At least one weight must be positive.")
+    return weights
+
+
+def build_operations(
+    url: str, credentials: tuple[str, str], hostnames: list[str]
+) -> dict[str, Callable[[APIClient, random.Random], object]]:
+    """Build the request of each operation of the mix.
+
+    :param url: the url of the appliance
+    :param credentials: the username and password
+    :param hostnames: the hostnames that device requests are drawn from
+    :return: the function of each operation, which sends its request with a client and a random number generator
+    """
+    return {
+        "auth": lambda client, rng: client.login(url, *credentials),
+        "device": lambda client, rng: client.get_device_data(rng.choice(hostnames)),
+        "devices": lambda client, rng: client.get_device_page(),
+        "devices_page": lambda client, rng: client.get_device_page(100, rng.choice(hostnames)),
+        "users": lambda client, rng: client.get_user_page(),
+    }
+
+
+def run_worker(
+    worker: int,
+    url: str,
+    credentials: tuple[str, str],
+    weights: dict[str, int],
+    hostnames: list[str],
+    deadline: float,
+    seed: int,
+) -> dict[str, LatencyStats]:
+    """Send requests of the mix until the deadline.
+
+    :param worker: the worker number
+    :param url: the url of the appliance
+    :param credentials: the username and password
+    :param weights: the weight of each operation
+    :param hostnames: the hostnames that device requests are drawn from
+    :param deadline: the time.perf_counter time to stop at
+    :param seed: the seed of the request order
+    :return: the stats of each operation
+    """
+    rng = random.Random(f"{seed}:{worker}")
+    client = APIClient()
+    client.login(url, *credentials)
+    requests_by_operation = build_operations(url, credentials, hostnames)
+    operations = list(weights)
+    cumulative_weights = list(itertools.accumulate(weights.values()))
+    stats = {operation: LatencyStats() for operation in operations}
+    while time.perf_counter() < deadline:
+        operation = rng.choices(operations, cum_weights=cumulative_weights)[0]
+        start = time.perf_counter()
+        try:
+            requests_by_operation[operation](client, rng)
+        except requests.exceptions.RequestException as err:
+            stats[operation].errors += 1
+            if getattr(err.response, "status_code", None) == 401:
+                client.login(url, *credentials)
+            continue
+        stats[operation].latencies.append(time.perf_counter() - start)
+    return stats
+
+
+def run_load_test(
+    url: str,
+    credentials: tuple[str, str],
+    weights: dict[str, int],
+    concurrency: int,
+    duration: float,
+    seed: int = 0,
+) -> dict:
+    """Run the load test.
+
+    :param url: the url of the appliance
+    :param credentials: the username and password
+    :param weights: the weight of each operation
+    :param concurrency: the number of concurrent workers
+    :param duration: the duration in seconds
+    :param seed: the seed of the request order
+    :return: the report of each operation, with the overall throughput
+    """
+    client = APIClient()
+    client.login(url, *credentials)
+    hostnames = [device["hostname"] for device in client.iter_device_data()]
+
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(run_worker, worker, url, credentials, weights, hostnames, deadline, seed)
+            for worker in range(concurrency)
+        ]
+        worker_stats = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    report = {"concurrency": concurrency, "duration": elapsed, "operations": {}}
+    total = 0
+    for operation in weights:
+        stats = LatencyStats()
+        for worker in worker_stats:
+            stats.latencies.extend(worker[operation].latencies)
+            stats.errors += worker[operation].errors
+        stats.latencies.sort()
+        total += len(stats.latencies)
+        report["operations"][operation] = {
+            "requests": len(stats.latencies),
+            "errors": stats.errors,
+            "throughput": len(stats.latencies) / elapsed,
+            "p50_ms": stats.percentile(0.50),
+            "p95_ms": stats.percentile(0.95),
+            "p99_ms": stats.percentile(0.99),
+            "histogram": dict(zip((str(bound) for bound in HISTOGRAM_BUCKETS_MS), stats.histogram())),
+        }
+    report["throughput"] = total / elapsed
+    return report
+
+
+def print_report(report: dict) -> None:
+    """Print the throughput, latency percentiles and latency histogram of each operation.
+
+    :param report: the load test report
+    :return: None
+    """
+    print(f"Concurrency {report['concurrency']}, {report['duration']:.1f}s, {report['throughput']:.0f} req/s")
+    print(f"{'operation':<14}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for operation, stats in report["operations"].items():
+        print(
+            f"{operation:<14}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput']:>9.0f}"
+            f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+        )
+    for operation, stats in report["operations"].items():
+        print(f"{operation} latency histogram:")
+        peak = max(stats["histogram"].values()) or 1
+        for bound, count in stats["histogram"].items():
+            if count:
+                print(f"  <= {bound:>5} ms {count:>9} {'#' * max(1, 40 * count // peak)}")
+
+
+def serve_in_process() -> str:
+    """Serve the simulated appliance in a background thread.
+
+    :return: the url of the appliance
+    """
+    from werkzeug.serving import make_server
+
+    sys.path.insert(0, os.path.join(ROOT_DIR, "simulation"))
+    import appliance
+
+    # the per-request access log would slow the server and bury the report
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, appliance.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    """Run the load test.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Load test the appliance API.")
+    parser.add_argument("--url", help="url of a running appliance")
+    parser.add_argument("--serve", action="store_true", help="serve the simulated appliance in-process")
+    parser.add_argument("--username", default="joe", help="username of an admin user")
+    parser.add_argument("--password", default="admin", help="password of the user")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of concurrent workers")
+    parser.add_argument("--duration", type=float, default=10, help="duration in seconds")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help=f"request mix, default {DEFAULT_MIX}")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the request order")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    args = parser.parse_args()
+    if not args.url and not args.serve:
+        parser.error("one of --url or --serve is required")
+
+    url = serve_in_process() if args.serve else args.url
+    report = run_load_test(url, (args.username, args.password), args.mix, args.concurrency, args.duration, args.seed)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
 """Simulated appliance for testing ZTA lightning."""
-import json
 import os
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import jwt
 import datetime
 
 from flask.cli import load_dotenv
 
+from data_store import device_inventory, user_inventory
+from fault_injection import install, load_profile
 from token_verification import token_verification
 
 app = Flask(__name__)
@@ -15,19 +16,44 @@ app = Flask(__name__)
 load_dotenv()
 
 # load configuration for the appliance
-SIMULATION_DIR = os.path.dirname(os.path.abspath(__file__))
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "default_secret_key")
 USE_HTTPS = os.getenv("USE_HTTPS", "False").lower() == "true"
-USERS_FILE = os.path.join(SIMULATION_DIR, os.getenv("USERS_FILE", "partial_compliant_users.json"))
-DEVICES_FILE = os.path.join(SIMULATION_DIR, os.getenv("DEVICES_FILE", "partial_compliant_configurations.json"))
+profile = load_profile(os.getenv("APPLIANCE_PROFILE"), os.getenv("APPLIANCE_SEED"))
+if profile.active:
+    install(app, profile)
 
-if os.path.exists(USERS_FILE):
-    with open(USERS_FILE, "r") as f:
-        users = json.load(f)
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+# fields of each device in the device index, nested fields by their dotted path
+DEVICE_INDEX_FIELDS = ["hostname", "device_type", "ip_address", "configuration.services"]
 
-if os.path.exists(DEVICES_FILE):
-    with open(DEVICES_FILE, "r") as f:
-        device_configurations = json.load(f)
+
+def json_response(payload: bytes, status: int = 200) -> Response:
+    """Create a response from an already serialized JSON payload.
+
+    :param payload: the JSON payload
+    :param status: the HTTP status
+    :return: the response
+    """
+    return Response(payload, status=status, mimetype="application/json")
+
+
+def ndjson_response(chunks) -> Response:
+    """Create a chunked response streaming newline delimited JSON.
+
+    :param chunks: the chunks of the response
+    :return: the response
+    """
+    return Response(chunks, mimetype="application/x-ndjson")
+
+
+def page_args() -> tuple[int, str | None]:
+    """Get the page size and cursor of a paginated request.
+
+    :return: the page size and the cursor of the page
+    """
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE)), request.args.get("cursor")
 
 
 @app.route("/auth", methods=["POST"])
@@ -40,7 +66,7 @@ def authenticate():
     # password handled this way for simulation simplicity
     username = data.get("username")
     password = data.get("password")
-    user = users.get(username)
+    user = user_inventory.get(username)
     if user and user["password"] == password:
         token = jwt.encode(
             {"username": username, "exp": datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=30)},
@@ -80,7 +106,7 @@ def get_device_configuration(current_user, hostname):
     if "admin" not in current_user["roles"]:
         return jsonify({"status": "Unauthorized"}), 403
 
-    device_config = device_configurations.get(hostname)
+    device_config = device_inventory.get(hostname)
     if device_config:
         return jsonify({"status": "success", "configuration": device_config}), 200
     else:
@@ -92,17 +118,81 @@ def get_device_configuration(current_user, hostname):
 def get_all_device_configurations(current_user):
     """Get all device configuration data.
 
+    With any of the query parameters limit, cursor, device_type or hostname_prefix, a page of the device
+    configurations is returned along with the cursor of the next page (null on the last page).
+
     :param current_user: the user
     :return: a JSON response
     """
     if "admin" not in current_user["roles"]:
         return jsonify({"status": "Unauthorized"}), 403
 
-    if device_configurations:
-        return jsonify({"status": "success", "configurations": device_configurations}), 200
-    else:
+    if not device_inventory.records:
         return jsonify({"status": "error", "message": "Device configurations not found"}), 404
 
+    paginated = {"limit", "cursor", "device_type", "hostname_prefix"} & request.args.keys()
+    if not paginated:
+        return json_response(device_inventory.payload("configurations"))
+
+    limit, cursor = page_args()
+    payload = device_inventory.page(
+        "configurations",
+        limit,
+        cursor,
+        index_value=request.args.get("device_type"),
+        key_prefix=request.args.get("hostname_prefix"),
+    )
+    return json_response(payload)
+
+
+@app.route("/device/index", methods=["GET"])
+@token_verification
+def get_device_index(current_user):
+    """Get the hostname, device type, ip address and services of every device, without their configurations.
+
+    :param current_user: the user
+    :return: a JSON response with the fields and a row of their values per device
+    """
+    if "admin" not in current_user["roles"]:
+        return jsonify({"status": "Unauthorized"}), 403
+
+    return json_response(device_inventory.fields_payload("devices", DEVICE_INDEX_FIELDS))
+
+
+@app.route("/device/configs/stream", methods=["GET"])
+@token_verification
+def stream_device_configurations(current_user):
+    """Stream device configuration data as newline delimited JSON, one device per line.
+
+    Devices can be filtered with the device_type and hostname_prefix query parameters.
+
+    :param current_user: the user
+    :return: a chunked NDJSON response
+    """
+    if "admin" not in current_user["roles"]:
+        return jsonify({"status": "Unauthorized"}), 403
+
+    return ndjson_response(
+        device_inventory.iter_ndjson(
+            index_value=request.args.get("device_type"), key_prefix=request.args.get("hostname_prefix")
+        )
+    )
+
+
+@app.route("/device/changes", methods=["GET"])
+@token_verification
+def get_device_changes(current_user):
+    """Get the device configurations that changed since a version of the device inventory.
+
+    :param current_user: the user
+    :return: a JSON response with the current version and the changed configurations (null for removed devices)
+    """
+    if "admin" not in current_user["roles"]:
+        return jsonify({"status": "Unauthorized"}), 403
+
+    since = request.args.get("since", 0, type=int)
+    return json_response(device_inventory.changes(since, request.args.get("epoch")))
+
 
 @app.route("/users/data", methods=["GET"])
 @token_verification
@@ -115,14 +205,44 @@ def get_all_user_info(current_user):
     if "admin" not in current_user["roles"]:
         return jsonify({"status": "Unauthorized"}), 403
 
-    if users:
-        sanitized_users = {
-            user: {key: value for key, value in info.items() if key != "password"} for user, info in users.items()
-        }
-        return jsonify({"status": "success", "users": sanitized_users}), 200
-    else:
+    if not user_inventory.records:
         return jsonify({"status": "error", "message": "User info. not found"}), 404
 
+    if not {"limit", "cursor", "username_prefix"} & request.args.keys():
+        return json_response(user_inventory.payload("users"))
+
+    limit, cursor = page_args()
+    return json_response(user_inventory.page("users", limit, cursor, key_prefix=request.args.get("username_prefix")))
+
+
+@app.route("/users/data/stream", methods=["GET"])
+@token_verification
+def stream_user_info(current_user):
+    """Stream user info data as newline delimited JSON, one user per line.
+
+    :param current_user: the user
+    :return: a chunked NDJSON response
+    """
+    if "admin" not in current_user["roles"]:
+        return jsonify({"status": "Unauthorized"}), 403
+
+    return ndjson_response(user_inventory.iter_ndjson(key_prefix=request.args.get("username_prefix")))
+
+
+@app.route("/users/changes", methods=["GET"])
+@token_verification
+def get_user_changes(current_user):
+    """Get the user info that changed since a version of the user inventory.
+
+    :param current_user: the user
+    :return: a JSON response with the current version and the changed user info (null for removed users)
+    """
+    if "admin" not in current_user["roles"]:
+        return jsonify({"status": "Unauthorized"}), 403
+
+    since = request.args.get("since", 0, type=int)
+    return json_response(user_inventory.changes(since, request.args.get("epoch")))
+
 
 if __name__ == "__main__":
     if USE_HTTPS:
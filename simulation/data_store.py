@@ -0,0 +1,26 @@
+"""Data shared by the simulated appliance modules."""
+import os
+
+from flask.cli import load_dotenv
+
+from inventory import Inventory
+
+load_dotenv()
+
+SIMULATION_DIR = os.path.dirname(os.path.abspath(__file__))
+USERS_FILE = os.path.join(SIMULATION_DIR, os.getenv("USERS_FILE", "partial_compliant_users.json"))
+DEVICES_FILE = os.path.join(SIMULATION_DIR, os.getenv("DEVICES_FILE", "partial_compliant_configurations.json"))
+
+
+def sanitize_user(user: dict) -> dict:
+    """Remove the password from a copy of the user info.
+
+    :param user: the user info
+    :return: the user info without the password
+    """
+    return {key: value for key, value in user.items() if key != "password"}
+
+
+# data is reloaded, and its serialized responses rebuilt, only when the files change
+device_inventory = Inventory(DEVICES_FILE, index_field="device_type")
+user_inventory = Inventory(USERS_FILE, sanitize=sanitize_user)
@@ -0,0 +1,225 @@
+"""Latency, bandwidth and fault injection profiles for the simulated appliance.
+
+A profile makes the appliance act like a slow, flaky WAN appliance. It is selected with APPLIANCE_PROFILE, either the
+name of a built-in profile or the path of a JSON profile file, and APPLIANCE_SEED overrides its seed. Every random
+draw comes from the seed, the route and the number of the request on that route, so a run with the same seed and
+request order sees the same latencies and faults.
+
+Example profile file:
+    {
+        "seed": 7,
+        "bandwidth_kbps": 2000,
+        "timeout_seconds": 30,
+        "token_expiry_storm": {"every_requests": 500, "length_requests": 20},
+        "routes": {
+            "default": {"latency": {"distribution": "lognormal", "median_ms": 80, "sigma": 0.6}, "error_rate": 0.01},
+            "/device/configs": {"latency": {"distribution": "uniform", "min_ms": 200, "max_ms": 900}, "timeout_rate": 0.01}
+        }
+    }
+"""
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections.abc import Iterable, Iterator
+
+from flask import Flask, Response, jsonify, request
+
+# size of the chunks that throttled responses are written in
+THROTTLE_CHUNK_SIZE = 16 * 1024
+# routes that do not require a token, so are not affected by token expiry storms
+UNPROTECTED_ROUTES = {"/auth"}
+ERROR_STATUSES = (500, 502, 503)
+
+BUILT_IN_PROFILES = {
+    "none": {"routes": {}},
+    "wan": {
+        "bandwidth_kbps": 10_000,
+        "routes": {"default": {"latency": {"distribution": "lognormal", "median_ms": 40, "sigma": 0.4}}},
+    },
+    "flaky-wan": {
+        "bandwidth_kbps": 2_000,
+        "timeout_seconds": 30,
+        "routes": {
+            "default": {
+                "latency": {"distribution": "lognormal", "median_ms": 120, "sigma": 0.8},
+                "error_rate": 0.05,
+                "timeout_rate": 0.01,
+            }
+        },
+    },
+    "token-storm": {
+        "token_expiry_storm": {"every_requests": 200, "length_requests": 20},
+        "routes": {"default": {"latency": {"distribution": "fixed", "ms": 5}}},
+    },
+}
+
+
+class RouteFaults:
+    """The latency distribution, bandwidth and fault rates of a route."""
+
+    def __init__(self, config: dict, bandwidth_kbps: float | None):
+        """Initialize from a route's profile config.
+
+        :param config: the route config
+        :param bandwidth_kbps: the default bandwidth of the profile
+        """
+        self.latency = config.get("latency", {"distribution": "fixed", "ms": 0})
+        self.error_rate = config.get("error_rate", 0.0)
+        self.timeout_rate = config.get("timeout_rate", 0.0)
+        self.bandwidth_kbps = config.get("bandwidth_kbps", bandwidth_kbps)
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """Draw a latency from the route's distribution.
+
+        :param rng: the random number generator of the request
+        :return: the latency in seconds
+        """
+        distribution = self.latency.get("distribution", "fixed")
+        if distribution == "fixed":
+            latency_ms = self.latency.get("ms", 0)
+        elif distribution == "uniform":
+            latency_ms = rng.uniform(self.latency["min_ms"], self.latency["max_ms"])
+        elif distribution == "normal":
+            latency_ms = rng.gauss(self.latency["mean_ms"], self.latency["stddev_ms"])
+        elif distribution == "lognormal":
+            latency_ms = rng.lognormvariate(math.log(self.latency["median_ms"]), self.latency["sigma"])
+        elif distribution == "exponential":
+            latency_ms = rng.expovariate(1 / self.latency["mean_ms"])
+        else:
+            raise ValueError(f"Invalid latency distribution: {distribution}.")
+        return max(latency_ms, 0) / 1000
+
+
+class FaultProfile:
+    """A seeded profile of latencies, bandwidth limits and faults per route."""
+
+    def __init__(self, config: dict, seed: int | None = None):
+        """Initialize the profile.
+
+        :param config: the profile config
+        :param seed: overrides the seed of the profile config
+        """
+        self.seed = seed if seed is not None else config.get("seed", 0)
+        self.timeout_seconds = config.get("timeout_seconds", 60)
+        bandwidth_kbps = config.get("bandwidth_kbps")
+        routes = config.get("routes", {})
+        self._default = RouteFaults(routes.get("default", {}), bandwidth_kbps)
+        self._routes = {route: RouteFaults(faults, bandwidth_kbps) for route, faults in routes.items()}
+        storm = config.get("token_expiry_storm", {})
+        self._storm_every = storm.get("every_requests", 0)
+        self._storm_length = storm.get("length_requests", 0)
+        self.active = bool(routes or bandwidth_kbps or self._storm_every)
+
+        self._lock = threading.Lock()
+        self._route_counters: dict[str, Iterator[int]] = {}
+        self._request_counter = itertools.count()
+
+    def route_faults(self, route: str) -> RouteFaults:
+        """Get the faults of a route, or the default faults.
+
+        :param route: the route rule, e.g. '/device/<hostname>/config'
+        :return: the route faults
+        """
+        return self._routes.get(route, self._default)
+
+    def request_rng(self, route: str) -> tuple[random.Random, int]:
+        """Get the random number generator of the next request on a route.
+
+        :param route: the route rule
+        :return: the random number generator and the number of the request across all routes
+        """
+        with self._lock:
+            counter = self._route_counters.setdefault(route, itertools.count())
+            route_request = next(counter)
+            request_number = next(self._request_counter)
+        return random.Random(f"{self.seed}:{route}:{route_request}"), request_number
+
+    def in_token_expiry_storm(self, request_number: int) -> bool:
+        """Check if a request falls in a token expiry storm.
+
+        :param request_number: the number of the request across all routes
+        :return: boolean indicating if the request's token should be treated as expired
+        """
+        if not self._storm_every:
+            return False
+        return request_number % self._storm_every >= self._storm_every - self._storm_length
+
+
+def load_profile(name_or_path: str | None, seed: str | int | None = None) -> FaultProfile:
+    """Load a built-in profile by name or a profile file by path.
+
+    :param name_or_path: the name of a built-in profile or the path of a JSON profile file
+    :param seed: overrides the seed of the profile
+    :return: the profile
+    """
+    name_or_path = name_or_path or "none"
+    if name_or_path in BUILT_IN_PROFILES:
+        config = BUILT_IN_PROFILES[name_or_path]
+    elif os.path.exists(name_or_path):
+        with open(name_or_path, "r") as f:
+            config = json.load(f)
+    else:
+        raise ValueError(
+            f"Invalid appliance profile: {name_or_path}. Must be a file or one of {list(BUILT_IN_PROFILES)}."
+        )
+    return FaultProfile(config, int(seed) if seed not in (None, "") else None)
+
+
+def throttle(chunks: Iterable[bytes], bandwidth_kbps: float) -> Iterator[bytes]:
+    """Write a response body no faster than a bandwidth.
+
+    :param chunks: the chunks of the response body
+    :param bandwidth_kbps: the bandwidth in kilobits per second
+    :return: the chunks, split and delayed to the bandwidth
+    """
+    bytes_per_second = bandwidth_kbps * 1000 / 8
+    start = time.monotonic()
+    sent = 0
+    for chunk in chunks:
+        for offset in range(0, len(chunk), THROTTLE_CHUNK_SIZE):
+            part = chunk[offset : offset + THROTTLE_CHUNK_SIZE]
+            sent += len(part)
+            delay = sent / bytes_per_second - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+            yield part
+
+
+def install(app: Flask, profile: FaultProfile) -> None:
+    """Inject the profile's latencies, faults and bandwidth limits into every request of an app.
+
+    :param app: the Flask app
+    :param profile: the profile
+    :return: None
+    """
+
+    @app.before_request
+    def inject_faults():
+        """Delay the request, or fail it with a 5xx, timeout or expired token."""
+        route = request.url_rule.rule if request.url_rule else request.path
+        faults = profile.route_faults(route)
+        rng, request_number = profile.request_rng(route)
+        request.environ["fault_injection.faults"] = faults
+
+        time.sleep(faults.sample_latency(rng))
+        if rng.random() < faults.timeout_rate:
+            time.sleep(profile.timeout_seconds)
+            return jsonify({"status": "error", "message": "Gateway timeout"}), 504
+        if rng.random() < faults.error_rate:
+            status = rng.choice(ERROR_STATUSES)
+            return jsonify({"status": "error", "message": "Injected server error"}), status
+        if route not in UNPROTECTED_ROUTES and profile.in_token_expiry_storm(request_number):
+            return jsonify({"message": "Token has expired!"}), 401
+        return None
+
+    @app.after_request
+    def limit_bandwidth(response: Response) -> Response:
+        """Throttle the response body to the route's bandwidth."""
+        faults = request.environ.get("fault_injection.faults")
+        if faults and faults.bandwidth_kbps:
+            response.response = throttle(response.response, faults.bandwidth_kbps)
+        return response
@@ -0,0 +1,521 @@
+"""Seeded generator of synthetic device and user sets for scale testing.
+
+The generated fleet follows the topology in topology.txt, repeated per site: a router connected to a firewall and
+to access switches, with hosts and servers connected to the switches. Site 0 also holds the ApplianceServer (AAA,
+NMS and logging) and the AdminMachine. Sites are generated and written one at a time, so the whole fleet is never
+held in memory.
+
+Usage:
+    python fleet_generator.py --devices 100000 --seed 7 --violation-rate 0.05 --template-reuse 0.8
+"""
+import argparse
+import json
+import os
+import random
+from collections.abc import Iterator
+
+SIMULATION_DIR = os.path.dirname(os.path.abspath(__file__))
+
+VIOLATION_KINDS = ("logging", "auth", "segmentation", "privilege", "addressing")
+NETWORK_LOG_EVENTS = ["INFO", "WARNING", "ERROR", "FATAL"]
+HOST_LOG_EVENTS = ["INFO", "WARNING"]
+VLANS = {"10": "Management", "20": "Engineering"}
+HOST_OPERATING_SYSTEMS = ["Windows 10", "Windows 11", "Ubuntu 20.04", "Ubuntu 22.04", "macOS 14"]
+SERVER_OPERATING_SYSTEMS = ["Windows Server 2019", "Windows Server 2022", "CentOS 7", "Rocky Linux 9"]
+SERVER_SERVICES = [["File Sharing", "FTP"], ["Web"], ["Database"], ["Mail"]]
+PORTS_PER_SWITCH = 47
+SERVER_RATIO = 0.15
+
+ADMIN_USERNAME = "joe"
+ADMIN_PASSWORD = "admin"
+APPLIANCE_IP = "10.0.0.254"
+# max number of sites, one per /24 subnet of 10.0.0.0/8 except 10.255.255.0/24, whose addresses logging and auth
+# violations point to
+MAX_SITES = 256 * 256 - 1
+
+
+class FleetGenerator:
+    """Deterministic generator of device configurations and users."""
+
+    def __init__(
+        self,
+        device_count: int,
+        seed: int = 0,
+        site_size: int = 200,
+        violation_rates: dict[str, float] | None = None,
+        template_reuse: float = 0.8,
+    ):
+        """Initialize the generator.
+
+        :param device_count: the number of devices to generate
+        :param seed: the seed that makes the output reproducible
+        :param site_size: the number of devices per site, at most 232 so that a site fits a /24 subnet
+        :param violation_rates: the probability of a device having each kind of compliance violation
+        :param template_reuse: the probability of a device sharing its type's template configuration sections,
+            instead of having per-device variations
+        """
+        if not 8 <= site_size <= 232:
+            raise ValueError(f"Invalid site size: {site_size}. Must be between 8 and 232.")
+        if device_count < 8:
+            raise ValueError(f"Invalid device count: {device_count}. Must be at least 8.")
+        # every site but the last has site_size devices, and the last takes a remainder of fewer than 8 devices
+        if (device_count - 8) // site_size + 1 > MAX_SITES:
+            raise ValueError(
+                f"Invalid device count: {device_count}. Must be at most {MAX_SITES} sites of {site_size} devices."
+            )
+        unknown_kinds = set(violation_rates or {}) - set(VIOLATION_KINDS)
+        if unknown_kinds:
+            raise ValueError(f"Invalid violation kinds: {unknown_kinds}. Must be in {VIOLATION_KINDS}.")
+        self._device_count = device_count
+        self._seed = seed
+        self._site_size = site_size
+        self._violation_rates = violation_rates or {}
+        self._template_reuse = template_reuse
+        self._templates = self._build_templates()
+
+    def _build_templates(self) -> dict[str, dict]:
+        """Build the configuration sections that devices of the same type share.
+
+        :return: the template sections by device type
+        """
+        templates = {}
+        for device_type in ("router", "switch", "firewall", "host", "server"):
+            log_events = HOST_LOG_EVENTS if device_type == "host" else NETWORK_LOG_EVENTS
+            templates[device_type] = {
+                "logging": {
+                    "enabled": True,
+                    "log_server": APPLIANCE_IP,
+                    "log_events": log_events,
+                    "retention_period": 30,
+                },
+                "auth": {"enabled": True, "aaa_server": APPLIANCE_IP},
+            }
+        return templates
+
+    def generate(self) -> Iterator[tuple[list[dict], list[dict]]]:
+        """Generate the devices and users of each site.
+
+        :return: the devices and users per site
+        """
+        remaining = self._device_count
+        site = 0
+        while remaining > 0:
+            # a remainder too small to be a site of its own is added to the last site
+            size = remaining if remaining < self._site_size + 8 else self._site_size
+            rng = random.Random(self._seed * 1_000_003 + site)
+            devices, users = self._generate_site(site, size, rng)
+            remaining -= len(devices)
+            site += 1
+            yield devices, users
+
+    def _site_subnet(self, site: int) -> str:
+        """Get the /24 subnet prefix of a site, e.g. '10.0.3'."""
+        return f"10.{site // 256}.{site % 256}"
+
+    def _transit_ips(self, site: int) -> tuple[str, str, str]:
+        """Get the /30 transit subnet and the router and firewall ip addresses between them, in 172.16.0.0/12."""
+        base = (site % 64) * 4
+        prefix = f"172.{16 + site // (64 * 256)}.{site // 64 % 256}"
+        return f"{prefix}.{base}/30", f"{prefix}.{base + 1}", f"{prefix}.{base + 2}"
+
+    def _generate_site(self, site: int, size: int, rng: random.Random) -> tuple[list[dict], list[dict]]:
+        """Generate the devices and users of a site.
+
+        :param site: the site index
+        :param size: the number of devices in the site
+        :param rng: the random number generator of the site
+        :return: the devices and users of the site
+        """
+        subnet = self._site_subnet(site)
+        transit_subnet, router_transit_ip, firewall_transit_ip = self._transit_ips(site)
+        site_name = f"site-{site}"
+        router_name = f"Router{site}"
+        firewall_name = f"Firewall{site}"
+        admin = ADMIN_USERNAME if site == 0 else f"admin{site}"
+
+        endpoints = size - 2
+        if site == 0:
+            endpoints -= 2
+        switch_count = max(1, -(-endpoints // (PORTS_PER_SWITCH + 1)))
+        endpoints -= switch_count
+        switch_names = [f"Switch{site}-{n}" for n in range(1, switch_count + 1)]
+        network_segments = [f"{subnet}.0/24", transit_subnet]
+
+        devices = []
+        router_interfaces = {
+            "Gig0/0": {
+                "ip_address": router_transit_ip,
+                "status": "up",
+                "connected_device": firewall_name,
+                "connected_interface": "Gig0/0",
+            }
+        }
+        for n, switch_name in enumerate(switch_names, start=1):
+            router_interfaces[f"Gig0/{n}"] = {"status": "up", "connected_device": switch_name}
+        router_interfaces["Gig0/1"]["ip_address"] = f"{subnet}.1"
+        if site == 0:
+            router_interfaces[f"Gig0/{switch_count + 1}"] = {
+                "status": "up",
+                "connected_device": "ApplianceServer",
+                "connected_interface": "eth0",
+            }
+        devices.append(
+            self._network_device(
+                router_name,
+                f"{subnet}.1",
+                "router",
+                site_name,
+                admin,
+                rng,
+                {
+                    "interfaces": router_interfaces,
+                    "routing_protocol": "OSPF",
+                    "ACL": {"name": "BLOCK_SSH", "rules": ["deny tcp any any eq 22"]},
+                    "network_segmentation": {"allowed_segments": list(network_segments)},
+                },
+            )
+        )
+        devices.append(
+            self._network_device(
+                firewall_name,
+                f"{subnet}.2",
+                "firewall",
+                site_name,
+                admin,
+                rng,
+                {
+                    "interfaces": {
+                        "Gig0/0": {
+                            "ip_address": firewall_transit_ip,
+                            "status": "up",
+                            "connected_device": router_name,
+                            "connected_interface": "Gig0/0",
+                        }
+                    },
+                    "policies": {
+                        "allow_ssh": {"source": f"{subnet}.10", "destination": "any", "port": "22", "action": "allow"}
+                    },
+                    "network_segmentation": {"allowed_segments": list(network_segments)},
+                },
+            )
+        )
+
+        # the admin of site 0 is assigned to the AdminMachine, other site admins to their network devices
+        admin_devices = ["AdminMachine"] if site == 0 else [router_name, firewall_name, *switch_names]
+        users = [
+            {
+                "username": admin,
+                "password": ADMIN_PASSWORD if site == 0 else f"{admin}-pass",
+                "roles": ["admin"],
+                "devices": admin_devices,
+            }
+        ]
+
+        endpoint_ip = 10
+        switch_ports = {switch_name: {} for switch_name in switch_names}
+        endpoint_devices = []
+        if site == 0:
+            endpoint_devices.append(self._admin_machine(switch_names[0], site_name, rng))
+            switch_ports[switch_names[0]]["Gig0/1"] = {"status": "up", "connected_device": "AdminMachine"}
+
+        for n in range(endpoints):
+            switch_name = switch_names[n % switch_count]
+            ports = switch_ports[switch_name]
+            interface = f"Gig0/{len(ports) + 1}"
+            ip_address = f"{subnet}.{endpoint_ip}"
+            endpoint_ip += 1
+            if rng.random() < SERVER_RATIO:
+                hostname = f"Server{site}-{n}"
+                endpoint_devices.append(
+                    self._server(hostname, ip_address, switch_name, interface, site_name, admin, rng)
+                )
+            else:
+                hostname = f"Host{site}-{n}"
+                username = f"user{site}-{n}"
+                endpoint_devices.append(
+                    self._host(hostname, ip_address, switch_name, interface, site_name, username, rng)
+                )
+                users.append(
+                    {"username": username, "password": f"{username}-pass", "roles": ["user"], "devices": [hostname]}
+                )
+            ports[interface] = {"status": "up", "connected_device": hostname}
+
+        for n, switch_name in enumerate(switch_names, start=1):
+            interfaces = {
+                "Gig0/0": {"status": "up", "connected_device": router_name, "connected_interface": f"Gig0/{n}"}
+            }
+            interfaces.update(switch_ports[switch_name])
+            devices.append(
+                self._network_device(
+                    switch_name,
+                    f"{subnet}.{2 + n}",
+                    "switch",
+                    site_name,
+                    admin,
+                    rng,
+                    {
+                        "interfaces": interfaces,
+                        "VLANs": dict(VLANS),
+                        "network_segmentation": {"allowed_segments": list(VLANS)},
+                    },
+                )
+            )
+        if site == 0:
+            devices.append(self._appliance_server(router_name, f"Gig0/{switch_count + 1}", network_segments))
+        devices.extend(endpoint_devices)
+
+        for device in devices:
+            self._apply_violation(device, devices, users, rng)
+        return devices, users
+
+    def _shared_sections(self, device_type: str, rng: random.Random) -> dict:
+        """Get the logging and auth sections, either shared with the template or varied per device.
+
+        :param device_type: the device type
+        :param rng: the random number generator of the site
+        :return: the configuration sections
+        """
+        template = self._templates[device_type]
+        if rng.random() < self._template_reuse:
+            return {"logging": template["logging"], "auth": dict(template["auth"])}
+        logging = dict(template["logging"])
+        logging["retention_period"] = rng.choice([7, 14, 60, 90, 365])
+        logging["log_events"] = rng.sample(logging["log_events"], len(logging["log_events"]))
+        return {"logging": logging, "auth": dict(template["auth"])}
+
+    def _network_device(
+        self,
+        hostname: str,
+        ip_address: str,
+        device_type: str,
+        site_name: str,
+        admin: str,
+        rng: random.Random,
+        configuration: dict,
+    ) -> dict:
+        """Build a router, switch or firewall."""
+        sections = self._shared_sections(device_type, rng)
+        sections["auth"]["acl"] = {"allow": [admin]}
+        return {
+            "hostname": hostname,
+            "ip_address": ip_address,
+            "device_type": device_type,
+            "configuration": {**configuration, "site": site_name, "roles": ["admin"], **sections},
+        }
+
+    def _host(
+        self,
+        hostname: str,
+        ip_address: str,
+        switch_name: str,
+        interface: str,
+        site_name: str,
+        username: str,
+        rng: random.Random,
+    ) -> dict:
+        """Build a host assigned to a single user."""
+        sections = self._shared_sections("host", rng)
+        sections["auth"]["assigned_user"] = username
+        return {
+            "hostname": hostname,
+            "ip_address": ip_address,
+            "device_type": "host",
+            "configuration": {
+                "connected_to": {"device": switch_name, "interface": interface},
+                "operating_system": rng.choice(HOST_OPERATING_SYSTEMS),
+                "status": "up",
+                "site": site_name,
+                "roles": ["user"],
+                **sections,
+                "allowed_segments": [rng.choice(list(VLANS))],
+            },
+        }
+
+    def _server(
+        self,
+        hostname: str,
+        ip_address: str,
+        switch_name: str,
+        interface: str,
+        site_name: str,
+        admin: str,
+        rng: random.Random,
+    ) -> dict:
+        """Build a server that only the site admin may access."""
+        sections = self._shared_sections("server", rng)
+        sections["auth"]["acl"] = {"allow": [admin]}
+        return {
+            "hostname": hostname,
+            "ip_address": ip_address,
+            "device_type": "server",
+            "configuration": {
+                "connected_to": {"device": switch_name, "interface": interface},
+                "operating_system": rng.choice(SERVER_OPERATING_SYSTEMS),
+                "status": "up",
+                "site": site_name,
+                "services": rng.choice(SERVER_SERVICES),
+                "roles": ["admin"],
+                **sections,
+                "allowed_segments": ["20"],
+            },
+        }
+
+    def _admin_machine(self, switch_name: str, site_name: str, rng: random.Random) -> dict:
+        """Build the AdminMachine that the client tests its connection with."""
+        device = self._host("AdminMachine", "10.0.0.9", switch_name, "Gig0/1", site_name, ADMIN_USERNAME, rng)
+        device["configuration"]["roles"] = ["admin"]
+        device["configuration"]["allowed_segments"] = list(VLANS)
+        return device
+
+    def _appliance_server(self, router_name: str, interface: str, network_segments: list[str]) -> dict:
+        """Build the ApplianceServer providing AAA, NMS and logging."""
+        sections = self._templates["server"]
+        return {
+            "hostname": "ApplianceServer",
+            "ip_address": APPLIANCE_IP,
+            "device_type": "server",
+            "configuration": {
+                "connected_to": {"device": router_name, "interface": interface},
+                "operating_system": "CentOS 7",
+                "status": "up",
+                "site": "site-0",
+                "services": ["NMS", "AAA"],
+                "roles": ["admin"],
+                "logging": sections["logging"],
+                "auth": {**sections["auth"], "acl": {"allow": [ADMIN_USERNAME]}},
+                "allowed_segments": list(network_segments),
+            },
+        }
+
+    def _apply_violation(self, device: dict, site_devices: list[dict], users: list[dict], rng: random.Random) -> None:
+        """Give a device at most one compliance violation, drawn from the violation rates.
+
+        :param device: the device
+        :param site_devices: the devices of the site
+        :param users: the users of the site
+        :param rng: the random number generator of the site
+        :return: None
+        """
+        if device["hostname"] in ("ApplianceServer", "AdminMachine"):
+            return
+        configuration = device["configuration"]
+        device_type = device["device_type"]
+        for kind in VIOLATION_KINDS:
+            if rng.random() >= self._violation_rates.get(kind, 0.0):
+                continue
+            if kind == "logging":
+                logging = dict(configuration["logging"])
+                choice = rng.randrange(3)
+                if choice == 0:
+                    logging["enabled"] = False
+                elif choice == 1:
+                    logging["log_server"] = "10.255.255.254"
+                else:
+                    logging["log_events"] = ["INFO"]
+                configuration["logging"] = logging
+            elif kind == "auth":
+                auth = dict(configuration["auth"])
+                if rng.random() < 0.5:
+                    auth["enabled"] = False
+                else:
+                    auth["aaa_server"] = "10.255.255.253"
+                configuration["auth"] = auth
+            elif kind == "segmentation":
+                if device_type in ("host", "server"):
+                    configuration["allowed_segments"] = ["99"]
+                elif device_type == "switch":
+                    configuration["VLANs"] = {**configuration["VLANs"], "99": "Unassigned"}
+                else:
+                    # an overly broad segment that overlaps every site
+                    segments = configuration["network_segmentation"]["allowed_segments"]
+                    configuration["network_segmentation"] = {"allowed_segments": [*segments, "10.0.0.0/8"]}
+            elif kind == "privilege":
+                if device_type == "host":
+                    configuration["roles"] = ["guest"]
+                else:
+                    allow = [*configuration["auth"].get("acl", {}).get("allow", []), "ghost"]
+                    configuration["auth"] = {**configuration["auth"], "acl": {"allow": allow}}
+            elif kind == "addressing":
+                ip_address = device["ip_address"]
+                addresses = [other["ip_address"] for other in site_devices if other["ip_address"] != ip_address]
+                device["ip_address"] = rng.choice(addresses)
+            return
+
+
+def write_fleet(generator: FleetGenerator, devices_file: str, users_file: str) -> tuple[int, int]:
+    """Stream the generated fleet to JSON files in the format of the simulated appliance.
+
+    :param generator: the fleet generator
+    :param devices_file: the path of the device configurations file
+    :param users_file: the path of the users file
+    :return: the number of devices and users written
+    """
+    device_count = user_count = 0
+    with open(devices_file, "w") as devices_out, open(users_file, "w") as users_out:
+        devices_out.write("{")
+        users_out.write("{")
+        for devices, users in generator.generate():
+            for device in devices:
+                devices_out.write(",\n" if device_count else "\n")
+                devices_out.write(f"{json.dumps(device['hostname'])}: {json.dumps(device)}")
+                device_count += 1
+            for user in users:
+                users_out.write(",\n" if user_count else "\n")
+                users_out.write(f"{json.dumps(user['username'])}: {json.dumps(user)}")
+                user_count += 1
+        devices_out.write("\n}\n")
+        users_out.write("\n}\n")
+    return device_count, user_count
+
+
+def _parse_violation_rates(rate: float, overrides: list[str]) -> dict[str, float]:
+    """Get the violation rate of each kind from a rate shared by all kinds and 'kind=rate' overrides."""
+    rates = {kind: rate for kind in VIOLATION_KINDS}
+    for override in overrides:
+        kind, _, value = override.partition("=")
+        rates[kind] = float(value)
+    return rates
+
+
+def main():
+    """Generate a fleet from the command line arguments.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Generate a synthetic fleet for the simulated appliance.")
+    parser.add_argument("--devices", type=int, default=1000, help="number of devices to generate")
+    parser.add_argument("--seed", type=int, default=0, help="seed that makes the fleet reproducible")
+    parser.add_argument("--site-size", type=int, default=200, help="number of devices per site (8-232)")
+    parser.add_argument(
+        "--violation-rate", type=float, default=0.0, help="probability of each kind of violation per device"
+    )
+    parser.add_argument(
+        "--violation",
+        action="append",
+        default=[],
+        metavar="KIND=RATE",
+        help=f"override the violation rate of one kind ({', '.join(VIOLATION_KINDS)})",
+    )
+    parser.add_argument(
+        "--template-reuse",
+        type=float,
+        default=0.8,
+        help="probability of a device sharing its type's template configuration sections",
+    )
+    parser.add_argument("--devices-file", default=os.path.join(SIMULATION_DIR, "generated_configurations.json"))
+    parser.add_argument("--users-file", default=os.path.join(SIMULATION_DIR, "generated_users.json"))
+    args = parser.parse_args()
+
+    generator = FleetGenerator(
+        args.devices,
+        seed=args.seed,
+        site_size=args.site_size,
+        violation_rates=_parse_violation_rates(args.violation_rate, args.violation),
+        template_reuse=args.template_reuse,
+    )
+    device_count, user_count = write_fleet(generator, args.devices_file, args.users_file)
+    print(f"Generated {device_count} devices ({args.devices_file}) and {user_count} users ({args.users_file}).")
+
+
+if __name__ == "__main__":
+    main()
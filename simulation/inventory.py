@@ -0,0 +1,307 @@
+"""Cached inventory of the JSON data files served by the simulated appliance."""
+import bisect
+import json
+import os
+import threading
+import uuid
+from collections.abc import Callable, Iterator
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional dependency of the production server
+    orjson = None
+
+# approximate size of the chunks that streamed records are written in
+STREAM_CHUNK_SIZE = 64 * 1024
+# max number of changed keys kept in the change log
+MAX_CHANGE_LOG_SIZE = 1_000_000
+
+
+def _dumps(record: dict) -> str:
+    """Serialize a record, with orjson when it is installed."""
+    return orjson.dumps(record).decode() if orjson else json.dumps(record)
+
+
+def _load_json(filepath: str) -> dict:
+    """Load a JSON file, with orjson when it is installed."""
+    if orjson:
+        with open(filepath, "rb") as f:
+            return orjson.loads(f.read())
+    with open(filepath, "r") as f:
+        return json.load(f)
+
+
+def _field(record: dict, path: list[str]):
+    """Get a possibly nested field of a record, None if it is missing."""
+    value = record
+    for name in path:
+        value = value.get(name) if isinstance(value, dict) else None
+    return value
+
+
+class _Snapshot:
+    """The records of a data file as of one modification, with their serialized forms."""
+
+    def __init__(self, records: dict[str, dict], sanitize: Callable[[dict], dict] | None, index_field: str | None):
+        self.records = records
+        self.keys = sorted(records)
+        public_records = {key: sanitize(record) for key, record in records.items()} if sanitize else records
+        self.serialized = {key: _dumps(record) for key, record in public_records.items()}
+        # keys per value of the index field, e.g. device type, kept in sorted order
+        self.index: dict[str, list[str]] = {}
+        if index_field:
+            for key in self.keys:
+                self.index.setdefault(records[key].get(index_field), []).append(key)
+        self.payloads: dict[str, bytes] = {}
+
+
+class Inventory:
+    """Records of a JSON data file, cached with their sanitized and serialized forms until the file changes.
+
+    Records are kept sorted by key, so pages and key prefixes are found by bisection rather than by scanning.
+
+    The inventory version is the modification time of the data file in nanoseconds, and every reload appends the keys
+    of the records that changed to a change log, so clients that have the records as of a version can fetch only what
+    changed since. The epoch is derived from the path of the data file. Every worker process of the appliance, and an
+    appliance restarted on the same file, gives the same epoch and version for the same file, so a client can sync
+    through any of them. A process only has the changes since the versions it loaded itself, since a record changed
+    and then changed back between two of its loads is not in its change log, so it resets clients at other versions.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        sanitize: Callable[[dict], dict] | None = None,
+        index_field: str | None = None,
+    ):
+        """Initialize the inventory. The file is loaded on first use.
+
+        :param filepath: the path of the JSON data file, an object of records by key
+        :param sanitize: removes the fields that must not be served from a copy of a record
+        :param index_field: the record field that records can be filtered by
+        """
+        self._filepath = filepath
+        self._sanitize = sanitize
+        self._index_field = index_field
+        self._lock = threading.Lock()
+        self._file_state: tuple[int, int] | None = None
+        self._snapshot = _Snapshot({}, sanitize, index_field)
+
+        self._epoch = uuid.uuid5(uuid.NAMESPACE_URL, os.path.realpath(filepath)).hex
+        self._version = 0
+        # (version, key) of each changed record, in version order
+        self._change_log: list[tuple[int, str]] = []
+        # the versions loaded by this process whose changes since are complete in the change log
+        self._loaded_versions: set[int] = set()
+
+    def _current(self) -> _Snapshot:
+        """Get the snapshot of the data file, reloading it if it changed since it was last loaded.
+
+        :return: the snapshot
+        """
+        try:
+            stat = os.stat(self._filepath)
+        except FileNotFoundError:
+            return self._snapshot
+        file_state = (stat.st_mtime_ns, stat.st_size)
+        if file_state != self._file_state:
+            with self._lock:
+                if file_state != self._file_state:
+                    snapshot = self._load()
+                    self._record_changes(self._snapshot, snapshot, stat.st_mtime_ns)
+                    self._snapshot = snapshot
+                    self._file_state = file_state
+        return self._snapshot
+
+    def _record_changes(self, old: _Snapshot, new: _Snapshot, version: int) -> None:
+        """Move to the version of a reloaded snapshot and log the keys of the records that differ from the previous one.
+
+        The caller must hold the lock.
+
+        :param old: the previous snapshot
+        :param new: the reloaded snapshot
+        :param version: the version of the reloaded snapshot, the modification time of its data file
+        :return: None
+        """
+        if self._file_state is None or version <= self._version:
+            # the initial load, or a data file replaced by an older one, is the base that changes are recorded from
+            self._version = version
+            self._change_log = []
+            self._loaded_versions = {version}
+            return
+        old_serialized = old.serialized
+        changed = [key for key, record in new.serialized.items() if old_serialized.get(key) != record]
+        changed.extend(old_serialized.keys() - new.serialized.keys())
+        self._version = version
+        self._loaded_versions.add(version)
+        self._change_log.extend((version, key) for key in changed)
+        if len(self._change_log) > MAX_CHANGE_LOG_SIZE:
+            dropped_version = self._change_log[len(self._change_log) - MAX_CHANGE_LOG_SIZE - 1][0]
+            start = bisect.bisect_right(self._change_log, (dropped_version, "\U0010ffff"))
+            self._change_log = self._change_log[start:]
+            self._loaded_versions = {loaded for loaded in self._loaded_versions if loaded >= dropped_version}
+
+    def _load(self) -> _Snapshot:
+        """Load the data file.
+
+        :return: the snapshot of the data file
+        """
+        return _Snapshot(_load_json(self._filepath), self._sanitize, self._index_field)
+
+    @property
+    def records(self) -> dict[str, dict]:
+        """Return the unsanitized records by key."""
+        return self._current().records
+
+    def warm(self, envelope_key: str) -> None:
+        """Load the data file and build the full response, so that forked workers share them rather than rebuild them.
+
+        :param envelope_key: the key of the records in the full response
+        :return: None
+        """
+        self.payload(envelope_key)
+
+    def get(self, key: str) -> dict | None:
+        """Get an unsanitized record.
+
+        :param key: the record key
+        :return: the record, or None if there is no record with the key
+        """
+        return self._current().records.get(key)
+
+    def payload(self, envelope_key: str) -> bytes:
+        """Get the serialized JSON response of all sanitized records, wrapped as {"status": "success", key: ...}.
+
+        :param envelope_key: the key of the records in the response
+        :return: the JSON response
+        """
+        snapshot = self._current()
+        payload = snapshot.payloads.get(envelope_key)
+        if payload is None:
+            payload = _envelope(envelope_key, snapshot.serialized, snapshot.keys)
+            snapshot.payloads[envelope_key] = payload
+        return payload
+
+    def fields_payload(self, envelope_key: str, fields: list[str]) -> bytes:
+        """Get the serialized JSON response of a few fields of every record, as rows in key order.
+
+        The response is {"status": "success", "fields": fields, key: [[value, ...], ...]}, which is much smaller than
+        the records, for clients that only need to enumerate them.
+
+        :param envelope_key: the key of the rows in the response
+        :param fields: the fields of each row, nested fields by their dotted path
+        :return: the JSON response
+        """
+        snapshot = self._current()
+        cache_key = f"{envelope_key}:{','.join(fields)}"
+        payload = snapshot.payloads.get(cache_key)
+        if payload is None:
+            paths = [field.split(".") for field in fields]
+            rows = [[_field(snapshot.records[key], path) for path in paths] for key in snapshot.keys]
+            payload = _dumps({"status": "success", "fields": fields, envelope_key: rows}).encode()
+            snapshot.payloads[cache_key] = payload
+        return payload
+
+    def _select(self, snapshot: _Snapshot, index_value: str | None, key_prefix: str | None) -> list[str]:
+        """Get the sorted keys of the records with an index value, narrowed to a key prefix.
+
+        :param snapshot: the snapshot
+        :param index_value: only select records with this index field value
+        :param key_prefix: only select records with keys starting with this prefix
+        :return: the selected keys in sorted order
+        """
+        keys = snapshot.keys if index_value is None else snapshot.index.get(index_value, [])
+        if key_prefix:
+            start = bisect.bisect_left(keys, key_prefix)
+            end = bisect.bisect_left(keys, key_prefix + "\U0010ffff", lo=start)
+            keys = keys[start:end]
+        return keys
+
+    def page(
+        self,
+        envelope_key: str,
+        limit: int,
+        cursor: str | None = None,
+        index_value: str | None = None,
+        key_prefix: str | None = None,
+    ) -> bytes:
+        """Get the serialized JSON response of a page of sanitized records.
+
+        :param envelope_key: the key of the records in the response
+        :param limit: the max number of records in the page
+        :param cursor: the key of the last record of the previous page
+        :param index_value: only select records with this index field value
+        :param key_prefix: only select records with keys starting with this prefix
+        :return: the JSON response, with the cursor of the next page or null on the last page
+        """
+        snapshot = self._current()
+        keys = self._select(snapshot, index_value, key_prefix)
+        start = bisect.bisect_right(keys, cursor) if cursor else 0
+        page_keys = keys[start : start + limit]
+        next_cursor = page_keys[-1] if start + limit < len(keys) else None
+        return _envelope(envelope_key, snapshot.serialized, page_keys, next_cursor=next_cursor)
+
+    def changes(self, since: int, epoch: str | None = None) -> bytes:
+        """Get the serialized JSON response of the records that changed after a version.
+
+        The response holds the epoch, the current version, and the changes as an object of sanitized records by key,
+        with null for removed records. When the changes cannot be determined, because the version is from another
+        epoch or was not loaded by this process, or is older than the change log, reset is true and the changes hold
+        every record.
+
+        :param since: the version the client has the records of, 0 for all records
+        :param epoch: the epoch of the version
+        :return: the JSON response
+        """
+        self._current()
+        with self._lock:
+            snapshot = self._snapshot
+            version = self._version
+            reset = not since or epoch != self._epoch or since not in self._loaded_versions
+            if reset:
+                keys = snapshot.keys
+            else:
+                start = bisect.bisect_right(self._change_log, (since, "\U0010ffff"))
+                keys = sorted({key for _, key in self._change_log[start:]})
+        serialized = snapshot.serialized
+        body = ", ".join(f"{json.dumps(key)}: {serialized.get(key, 'null')}" for key in keys)
+        return (
+            f'{{"status": "success", "epoch": {json.dumps(self._epoch)}, "version": {version}, '
+            f'"reset": {json.dumps(reset)}, "changes": {{{body}}}}}'
+        ).encode()
+
+    def iter_ndjson(self, index_value: str | None = None, key_prefix: str | None = None) -> Iterator[bytes]:
+        """Stream sanitized records as newline delimited JSON.
+
+        :param index_value: only select records with this index field value
+        :param key_prefix: only select records with keys starting with this prefix
+        :return: chunks of serialized records, one record per line
+        """
+        snapshot = self._current()
+        serialized = snapshot.serialized
+        lines = []
+        size = 0
+        for key in self._select(snapshot, index_value, key_prefix):
+            line = serialized[key]
+            lines.append(line)
+            size += len(line)
+            if size >= STREAM_CHUNK_SIZE:
+                yield ("\n".join(lines) + "\n").encode()
+                lines = []
+                size = 0
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+
+def _envelope(envelope_key: str, serialized: dict[str, str], keys: list[str], **fields) -> bytes:
+    """Build a JSON response from serialized records.
+
+    :param envelope_key: the key of the records in the response
+    :param serialized: the serialized records by key
+    :param keys: the keys of the records to include
+    :param fields: additional response fields
+    :return: the JSON response
+    """
+    body = ", ".join(f"{json.dumps(key)}: {serialized[key]}" for key in keys)
+    extra = "".join(f", {json.dumps(name)}: {json.dumps(value)}" for name, value in fields.items())
+    return f'{{"status": "success", {json.dumps(envelope_key)}: {{{body}}}{extra}}}'.encode()
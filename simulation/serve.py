@@ -0,0 +1,103 @@
+"""Serve the simulated appliance with multiple workers for load and scale testing.
+
+The development server that appliance.py runs is single-process and reloads code, so load tests against it measure
+the server rather than the client. This runs the same app under gunicorn with the device and user data loaded, and
+their responses serialized, once in the master process. After loading, the objects are moved out of the garbage
+collector's tracking with gc.freeze, so forked workers share their memory pages copy-on-write instead of copying them
+the first time a collection touches them.
+
+The change feeds version the data by the modification time of its file, so every worker gives the same epoch and
+versions and a client can sync its changes through any of them. A worker resets a client whose version it did not
+load itself, which only happens when the data file changed more than once between two requests to that worker.
+
+gunicorn and orjson are optional dependencies, see requirements/requirements-simulation.txt. Without gunicorn the app
+is served by a threaded werkzeug server in a single process.
+
+Usage:
+    python simulation/serve.py --workers 4 --threads 8 --port 5000
+"""
+import argparse
+import gc
+import os
+
+from appliance import USE_HTTPS, app
+from data_store import device_inventory, user_inventory
+
+
+def preload() -> None:
+    """Load the appliance data and freeze it for sharing with forked workers.
+
+    :return: None
+    """
+    device_inventory.warm("configurations")
+    user_inventory.warm("users")
+    gc.collect()
+    gc.freeze()
+
+
+def serve_gunicorn(bind: str, workers: int, threads: int, ssl: bool) -> None:
+    """Serve the app with gunicorn workers forked from a preloaded master.
+
+    :param bind: the address to bind
+    :param workers: the number of worker processes
+    :param threads: the number of threads per worker
+    :param ssl: boolean indicating whether to serve HTTPS
+    :return: None
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class ApplianceApplication(BaseApplication):
+        """gunicorn application of the appliance that preloads the data before forking."""
+
+        def load_config(self):
+            options = {"bind": bind, "workers": workers, "threads": threads, "preload_app": True}
+            if ssl:
+                options.update(certfile="appliance.crt", keyfile="appliance.key")
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            preload()
+            return app
+
+    ApplianceApplication().run()
+
+
+def serve_werkzeug(host: str, port: int, ssl: bool) -> None:
+    """Serve the app with a threaded werkzeug server.
+
+    :param host: the host to bind
+    :param port: the port to bind
+    :param ssl: boolean indicating whether to serve HTTPS
+    :return: None
+    """
+    from werkzeug.serving import run_simple
+
+    preload()
+    ssl_context = ("appliance.crt", "appliance.key") if ssl else None
+    run_simple(host, port, app, threaded=True, ssl_context=ssl_context)
+
+
+def main():
+    """Serve the simulated appliance.
+
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Serve the simulated appliance with multiple workers.")
+    parser.add_argument("--host", default="127.0.0.1", help="host to bind")
+    parser.add_argument("--port", type=int, default=443 if USE_HTTPS else 5000, help="port to bind")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--threads", type=int, default=4, help="number of threads per worker")
+    args = parser.parse_args()
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print("gunicorn is not installed, serving with a single threaded werkzeug process.")
+        serve_werkzeug(args.host, args.port, USE_HTTPS)
+    else:
+        serve_gunicorn(f"{args.host}:{args.port}", args.workers, args.threads, USE_HTTPS)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,92 @@
 """Decorator for checking JWT token."""
-import json
 import os
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 
 import jwt
 from flask import request, jsonify
 from flask.cli import load_dotenv
 
-SIMULATION_DIR = os.path.dirname(os.path.abspath(__file__))
-
-USERS_FILE = os.path.join(SIMULATION_DIR, "partial_compliant_users.json")
-
-if os.path.exists(USERS_FILE):
-    with open(USERS_FILE, "r") as f:
-        users = json.load(f)
+from data_store import user_inventory
 
 load_dotenv()
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "default_secret_key")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+class TokenCache:
+    """Bounded LRU cache of verified tokens, each kept until the expiry of the token."""
+
+    def __init__(self, max_size: int):
+        """Initialize the cache.
+
+        :param max_size: the max number of cached tokens, 0 disables the cache
+        """
+        self.max_size = max_size
+        self._tokens: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> str | None:
+        """Get the username of a verified token that has not expired.
+
+        :param token: the token
+        :return: the username, or None if the token is not cached or has expired
+        """
+        with self._lock:
+            cached = self._tokens.get(token)
+            if cached is None:
+                return None
+            username, expires_at = cached
+            if expires_at <= time.time():
+                del self._tokens[token]
+                return None
+            self._tokens.move_to_end(token)
+            return username
+
+    def put(self, token: str, username: str, expires_at: float) -> None:
+        """Cache a verified token, evicting the least recently used token when the cache is full.
+
+        :param token: the token
+        :param username: the username of the token
+        :param expires_at: the expiry of the token, in seconds since the epoch
+        :return: None
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._tokens[token] = (username, expires_at)
+            self._tokens.move_to_end(token)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all cached tokens.
+
+        :return: None
+        """
+        with self._lock:
+            self._tokens.clear()
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+
+def verify_token(token: str) -> str:
+    """Get the username of a valid token, verifying its signature only if it is not cached.
+
+    :param token: the token
+    :return: the username
+    """
+    username = token_cache.get(token)
+    if username is None:
+        data = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
+        username = data["username"]
+        if "exp" in data:
+            token_cache.put(token, username, data["exp"])
+    return username
 
 
 def token_verification(f):
@@ -39,8 +108,7 @@ def token_verification(f):
             return jsonify({"message": "Token is missing!"}), 401
 
         try:
-            data = jwt.decode(token, JWT_SECRET_KEY, algorithms=["HS256"])
-            current_user = users.get(data["username"])
+            current_user = user_inventory.get(verify_token(token))
             if not current_user:
                 return jsonify({"message": "User not found!"}), 401
         except jwt.ExpiredSignatureError:
@@ -0,0 +1,32 @@
+"""Loaders of the data sets of the simulated appliance shared by the unit tests."""
+
+import json
+import os
+
+from app.domain_models import Device, User
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULATION_DIR = os.path.join(ROOT_DIR, "simulation")
+
+
+def load_records(prefix: str) -> tuple[dict, dict]:
+    """Load the device and user records of a data set of the simulated appliance.
+
+    :param prefix: the prefix of the data files, e.g. 'partial_compliant'
+    :return: the device records by hostname and the user records by username
+    """
+    with open(os.path.join(SIMULATION_DIR, f"{prefix}_configurations.json"), "r") as f:
+        devices = json.load(f)
+    with open(os.path.join(SIMULATION_DIR, f"{prefix}_users.json"), "r") as f:
+        users = json.load(f)
+    return devices, users
+
+
+def load_data_set(prefix: str) -> tuple[list[Device], list[User]]:
+    """Load the devices and users of a data set of the simulated appliance.
+
+    :param prefix: the prefix of the data files, e.g. 'partial_compliant'
+    :return: the devices and the users
+    """
+    devices, users = load_records(prefix)
+    return [Device(record) for record in devices.values()], [User(record) for record in users.values()]
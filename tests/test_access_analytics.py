@@ -0,0 +1,92 @@
+"""Unit tests for the access analytics."""
+
+import importlib.util
+import unittest
+
+from app.domain_models import Device, User
+
+if importlib.util.find_spec("numpy"):
+    from app.access_analytics import AccessMatrix, FanOutOutlier, UnusedRoleGrant
+
+
+def host(hostname: str, assigned_user: str | None = None, roles: list[str] | None = None) -> Device:
+    """Create a host, with an assigned user and the roles it admits."""
+    auth = {"assigned_user": assigned_user} if assigned_user else {}
+    return Device(
+        {
+            "hostname": hostname,
+            "ip_address": "10.0.0.5",
+            "device_type": "host",
+            "configuration": {"auth": auth, "roles": roles or ["user"]},
+        }
+    )
+
+
+def user(username: str, devices: list[str], roles: list[str] | None = None) -> User:
+    """Create a user with the devices and roles."""
+    return User({"username": username, "devices": devices, "roles": roles or ["user"]})
+
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+class TestAccessMatrix(unittest.TestCase):
+
+    def test_access_sources(self):
+        """Test that access is combined from user devices, ACLs and assigned users, ignoring unknown references."""
+        server = Device(
+            {
+                "hostname": "Server1",
+                "ip_address": "10.0.0.9",
+                "device_type": "server",
+                "configuration": {"auth": {"acl": {"Allow": ["alice", "ghost"]}}, "roles": ["admin"]},
+            }
+        )
+        devices = [host("Host1", assigned_user="alice"), server]
+        matrix = AccessMatrix(devices, [user("alice", ["Host1", "Server1", "Missing1"]), user("bob", ["Host1"])])
+        self.assertEqual(
+            matrix.access_sources("alice"),
+            {"Host1": ["user devices", "assigned user"], "Server1": ["user devices", "ACL"]},
+        )
+        self.assertEqual(matrix.fan_out.tolist(), [2, 1])
+
+    def test_fan_out_outliers(self):
+        """Test that a user with far more devices than the rest is an outlier, even when most have the same number."""
+        devices = [host(f"Host{index}") for index in range(40)]
+        users = [user(f"user{index}", [f"Host{index}"]) for index in range(20)]
+        users += [user("user20", ["Host20", "Host21"]), user("sprawl", [f"Host{index}" for index in range(40)])]
+        outliers = AccessMatrix(devices, users).fan_out_outliers()
+        self.assertEqual([outlier.username for outlier in outliers], ["sprawl"])
+        self.assertIsInstance(outliers[0], FanOutOutlier)
+        self.assertEqual(outliers[0].devices, 40)
+
+        self.assertEqual(AccessMatrix(devices, users[:20]).fan_out_outliers(), [])
+
+    def test_unused_role_grants(self):
+        """Test that a role is unused when no device the user can access admits it."""
+        devices = [host("Host1"), host("Host2", roles=["admin", "user"])]
+        users = [
+            user("alice", ["Host1"], roles=["user", "admin"]),
+            user("joe", ["Host2"], roles=["admin"]),
+            user("carol", ["Host1"], roles=["auditor"]),
+        ]
+        self.assertEqual(
+            AccessMatrix(devices, users).unused_role_grants(),
+            [UnusedRoleGrant("alice", "admin"), UnusedRoleGrant("carol", "auditor")],
+        )
+
+    def test_identical_access_clusters(self):
+        """Test that users with the same devices are grouped regardless of the source of the access."""
+        devices = [host("Host1", assigned_user="dave"), host("Host2"), host("Host3")]
+        users = [
+            user("alice", ["Host1", "Host2"]),
+            user("bob", ["Host2", "Host1"]),
+            user("carol", ["Host1", "Host3"]),
+            user("dave", ["Host2"]),
+            user("erin", ["Missing1"]),
+            user("frank", ["Missing2"]),
+        ]
+        clusters = AccessMatrix(devices, users).identical_access_clusters()
+        self.assertEqual([(c.usernames, c.devices) for c in clusters], [(["alice", "bob", "dave"], 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Unit tests for AddressUniquenessCheck."""
+
+import unittest
+from unittest.mock import MagicMock, call
+
+from app.domain_models import Device
+from app.zta_checks.address_uniqueness import AddressUniquenessCheck
+
+
+def device(hostname: str, ip_address: str, **interfaces) -> Device:
+    """Create a router with interfaces of the given ip addresses."""
+    return Device(
+        {
+            "hostname": hostname,
+            "ip_address": ip_address,
+            "device_type": "router",
+            "configuration": {
+                "interfaces": {name: {"ip_address": address, "status": "up"} for name, address in interfaces.items()}
+            },
+        }
+    )
+
+
+class TestAddressUniquenessCheck(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_audit_reporter = MagicMock()
+
+    def statuses(self, devices: list[Device]) -> dict[str, bool]:
+        AddressUniquenessCheck(devices).run_address_uniqueness_check(self.mock_audit_reporter)
+        return {args[0]: args[2] for args, _ in self.mock_audit_reporter.add_result.call_args_list}
+
+    def test_unique_addresses(self):
+        """Test that an interface carrying the device's own ip address is not a collision."""
+        router1 = device("Router1", "192.168.1.1", Gig0_0="192.168.1.1", Gig0_1="10.0.0.1/30")
+        router2 = device("Router2", "192.168.2.1", Gig0_0="192.168.2.1", Gig0_1="10.0.0.2/30")
+        AddressUniquenessCheck([router1, router2]).run_address_uniqueness_check(self.mock_audit_reporter, [router1])
+        self.mock_audit_reporter.add_result.assert_called_once_with(
+            "Router1",
+            "Address Uniqueness",
+            True,
+            "Device has a unique hostname: True. \n"
+            "Device has a unique ip address (192.168.1.1): True. \n"
+            "Device has unique interface ip addresses: True.",
+        )
+
+    def test_duplicate_ip_address(self):
+        """Test that every device with a shared ip address fails, and only those devices."""
+        hosts = [device(f"Host{index}", "10.0.0.5") for index in range(1, 4)] + [device("Host4", "10.0.0.6")]
+        statuses = self.statuses(hosts)
+        self.assertEqual(statuses, {"Host1": False, "Host2": False, "Host3": False, "Host4": True})
+        details = self.mock_audit_reporter.add_result.call_args_list[1].args[3]
+        self.assertIn("Ip address also used by: Host1, Host3.", details)
+
+    def test_interface_collision(self):
+        """Test that an interface ip address that is another device's ip address fails both devices."""
+        router = device("Router1", "192.168.1.1", Gig0_2="192.168.1.254")
+        statuses = self.statuses([router, device("Server1", "192.168.1.254")])
+        self.assertEqual(statuses, {"Router1": False, "Server1": False})
+        self.mock_audit_reporter.add_result.assert_has_calls(
+            [
+                call(
+                    "Router1",
+                    "Address Uniqueness",
+                    False,
+                    "Device has a unique hostname: True. \n"
+                    "Device has a unique ip address (192.168.1.1): True. \n"
+                    "Device has unique interface ip addresses: False. \n"
+                    "Interface ip address 192.168.1.254 also used by: Server1.",
+                )
+            ]
+        )
+
+    def test_duplicate_hostname(self):
+        """Test that hostnames that differ only by case collide."""
+        hosts = [device("Host1", "10.0.0.5"), device("HOST1", "10.0.0.6"), device("Host2", "10.0.0.7")]
+        statuses = self.statuses(hosts)
+        self.assertEqual(statuses, {"Host1": False, "HOST1": False, "Host2": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
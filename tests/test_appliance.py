@@ -0,0 +1,288 @@
+"""Unit tests for the simulated appliance."""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "simulation"))
+
+import appliance  # noqa: E402
+import token_verification  # noqa: E402
+from fault_injection import FaultProfile, install, load_profile, throttle  # noqa: E402
+from flask import Flask  # noqa: E402
+from inventory import Inventory  # noqa: E402
+from token_verification import TokenCache  # noqa: E402
+
+
+class TestAppliance(unittest.TestCase):
+
+    def setUp(self):
+        """Authenticate with the simulated appliance as an admin."""
+        self.client = appliance.app.test_client()
+        token = self.client.post("/auth", json={"username": "joe", "password": "admin"}).json["token"]
+        self.headers = {"Authorization": f"Bearer {token}"}
+
+    def test_all_device_configurations(self):
+        """Test that all devices are returned without pagination parameters."""
+        response = self.client.get("/device/configs", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json["configurations"]), set(appliance.device_inventory.records))
+        self.assertNotIn("next_cursor", response.json)
+
+    def test_paginated_device_configurations(self):
+        """Test that following the cursor returns every device once, in hostname order."""
+        hostnames = []
+        cursor = None
+        while True:
+            params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+            page = self.client.get("/device/configs", headers=self.headers, query_string=params).json
+            self.assertLessEqual(len(page["configurations"]), 3)
+            hostnames.extend(page["configurations"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(hostnames, sorted(appliance.device_inventory.records))
+
+    def test_filtered_device_configurations(self):
+        """Test filtering devices by type and hostname prefix."""
+        page = self.client.get("/device/configs", headers=self.headers, query_string={"device_type": "host"}).json
+        self.assertEqual(set(page["configurations"]), {"AdminMachine", "Host1", "Host2"})
+        page = self.client.get("/device/configs", headers=self.headers, query_string={"hostname_prefix": "Host"}).json
+        self.assertEqual(list(page["configurations"]), ["Host1", "Host2"])
+
+    def test_stream_device_configurations(self):
+        """Test that devices are streamed as one JSON record per line."""
+        response = self.client.get(
+            "/device/configs/stream", headers=self.headers, query_string={"device_type": "router"}
+        )
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        records = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual([record["hostname"] for record in records], ["Router1"])
+
+    def test_device_index(self):
+        """Test that the device index has a row of the index fields of every device, in hostname order."""
+        index = self.client.get("/device/index", headers=self.headers).json
+        self.assertEqual(index["fields"], ["hostname", "device_type", "ip_address", "configuration.services"])
+        self.assertEqual([row[0] for row in index["devices"]], sorted(appliance.device_inventory.records))
+        router = appliance.device_inventory.get("Router1")
+        self.assertIn(["Router1", "router", router["ip_address"], None], index["devices"])
+        self.assertIn("AAA", next(row[3] for row in index["devices"] if row[0] == "ApplianceServer"))
+
+    def test_user_info_is_sanitized(self):
+        """Test that passwords are not served by the user endpoints."""
+        users = self.client.get("/users/data", headers=self.headers).json["users"]
+        self.assertTrue(users)
+        self.assertFalse(any("password" in user for user in users.values()))
+        streamed = self.client.get("/users/data/stream", headers=self.headers).data.splitlines()
+        self.assertEqual(len(streamed), len(users))
+        self.assertFalse(any("password" in json.loads(line) for line in streamed))
+
+
+class TestInventory(unittest.TestCase):
+
+    def test_reload_when_file_changes(self):
+        """Test that cached payloads are rebuilt once the data file changes."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "devices.json")
+            with open(filepath, "w") as f:
+                json.dump({"Host1": {"hostname": "Host1"}}, f)
+            inventory = Inventory(filepath)
+            self.assertIs(inventory.payload("configurations"), inventory.payload("configurations"))
+
+            with open(filepath, "w") as f:
+                json.dump({"Host1": {"hostname": "Host1"}, "Host2": {"hostname": "Host2"}}, f)
+            os.utime(filepath, ns=(0, os.stat(filepath).st_mtime_ns + 1))
+            self.assertEqual(set(json.loads(inventory.payload("configurations"))["configurations"]), {"Host1", "Host2"})
+
+    def test_warm(self):
+        """Test that warming loads the data file and builds the full response up front."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "users.json")
+            with open(filepath, "w") as f:
+                json.dump({"joe": {"username": "joe", "password": "admin"}}, f)
+            inventory = Inventory(filepath, sanitize=lambda user: {"username": user["username"]})
+            inventory.warm("users")
+            payload = inventory.payload("users")
+            self.assertEqual(json.loads(payload), {"status": "success", "users": {"joe": {"username": "joe"}}})
+            self.assertIs(inventory.payload("users"), payload)
+
+
+class TestInventoryChanges(unittest.TestCase):
+
+    def setUp(self):
+        """Create an inventory of a temporary data file."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self._tmp_dir.name, "devices.json")
+        self.write({"Host1": {"hostname": "Host1"}, "Host2": {"hostname": "Host2"}})
+        self.inventory = Inventory(self.filepath)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def write(self, records: dict) -> None:
+        """Write the data file, with a later modification time than its previous one."""
+        previous = os.stat(self.filepath).st_mtime_ns if os.path.exists(self.filepath) else None
+        with open(self.filepath, "w") as f:
+            json.dump(records, f)
+        if previous is not None:
+            os.utime(self.filepath, ns=(previous + 1, previous + 1))
+
+    def changes(self, since: int, epoch: str | None, inventory: Inventory | None = None) -> dict:
+        return json.loads((inventory or self.inventory).changes(since, epoch))
+
+    def test_full_then_delta(self):
+        """Test that the first request resets and later ones only hold changed records."""
+        initial = self.changes(0, None)
+        self.assertTrue(initial["reset"])
+        self.assertEqual(set(initial["changes"]), {"Host1", "Host2"})
+        self.assertEqual(initial["version"], os.stat(self.filepath).st_mtime_ns)
+
+        self.write({"Host1": {"hostname": "Host1", "status": "down"}, "Host3": {"hostname": "Host3"}})
+        delta = self.changes(initial["version"], initial["epoch"])
+        self.assertFalse(delta["reset"])
+        self.assertEqual(delta["version"], initial["version"] + 1)
+        self.assertEqual(
+            delta["changes"],
+            {"Host1": {"hostname": "Host1", "status": "down"}, "Host2": None, "Host3": {"hostname": "Host3"}},
+        )
+        self.assertEqual(self.changes(delta["version"], delta["epoch"])["changes"], {})
+
+    def test_unchanged_reload_has_no_changes(self):
+        """Test that rewriting the file with the same records moves to its version without changes."""
+        initial = self.changes(0, None)
+        self.write({"Host1": {"hostname": "Host1"}, "Host2": {"hostname": "Host2"}})
+        delta = self.changes(initial["version"], initial["epoch"])
+        self.assertEqual((delta["version"], delta["reset"], delta["changes"]), (initial["version"] + 1, False, {}))
+
+    def test_other_epoch_resets(self):
+        """Test that a version of another data file gets every record."""
+        version = self.changes(0, None)["version"]
+        self.assertTrue(self.changes(version, "another-epoch")["reset"])
+
+    def test_workers_share_versions(self):
+        """Test that the inventories of the workers of an appliance give the same epoch and versions, and only reset
+        clients at versions that they did not load."""
+        worker, idle_worker = Inventory(self.filepath), Inventory(self.filepath)
+        initial = self.changes(0, None)
+        self.assertEqual(self.changes(0, None, idle_worker), initial)
+        self.assertEqual(self.changes(initial["version"], initial["epoch"], worker)["changes"], {})
+
+        self.write({"Host1": {"hostname": "Host1", "status": "down"}, "Host2": {"hostname": "Host2"}})
+        delta = self.changes(initial["version"], initial["epoch"])
+        self.assertEqual(self.changes(initial["version"], initial["epoch"], worker), delta)
+
+        self.write({"Host1": {"hostname": "Host1"}, "Host2": {"hostname": "Host2"}})
+        restored = self.changes(delta["version"], delta["epoch"], worker)
+        self.assertEqual((restored["reset"], restored["changes"]), (False, {"Host1": {"hostname": "Host1"}}))
+        # the idle worker did not load the version in between, in which Host1 was down
+        self.assertTrue(self.changes(delta["version"], delta["epoch"], idle_worker)["reset"])
+        self.assertEqual(self.changes(initial["version"], initial["epoch"], idle_worker), {**restored, "changes": {}})
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def test_expired_token_not_returned(self):
+        """Test that a token is only returned until its expiry."""
+        cache = TokenCache(10)
+        cache.put("valid", "joe", time.time() + 60)
+        cache.put("expired", "joe", time.time() - 1)
+        self.assertEqual(cache.get("valid"), "joe")
+        self.assertIsNone(cache.get("expired"))
+
+    def test_least_recently_used_evicted(self):
+        """Test that the least recently used token is evicted when the cache is full."""
+        cache = TokenCache(2)
+        expires_at = time.time() + 60
+        cache.put("token1", "joe", expires_at)
+        cache.put("token2", "alice", expires_at)
+        cache.get("token1")
+        cache.put("token3", "bob", expires_at)
+        self.assertEqual(cache.get("token1"), "joe")
+        self.assertIsNone(cache.get("token2"))
+
+    def test_signature_verified_once(self):
+        """Test that repeated requests with a token only decode it once."""
+        client = appliance.app.test_client()
+        token = client.post("/auth", json={"username": "joe", "password": "admin"}).json["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        token_verification.token_cache.clear()
+        with patch("token_verification.jwt.decode", wraps=token_verification.jwt.decode) as decode:
+            for _ in range(3):
+                self.assertEqual(client.get("/device/Router1/config", headers=headers).status_code, 200)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_invalid_token_rejected(self):
+        """Test that an invalid token is not cached and is rejected."""
+        client = appliance.app.test_client()
+        response = client.get("/device/Router1/config", headers={"Authorization": "Bearer invalid"})
+        self.assertEqual(response.status_code, 401)
+
+
+class TestFaultInjection(unittest.TestCase):
+
+    @staticmethod
+    def _client(config: dict):
+        """Create a test client of an app with a profile installed."""
+        app = Flask(__name__)
+
+        @app.route("/auth", methods=["POST"])
+        def auth():
+            return {"token": "token"}
+
+        @app.route("/device/<hostname>/config")
+        def device_config(hostname):
+            return {"status": "success", "hostname": hostname}
+
+        install(app, FaultProfile(config))
+        return app.test_client()
+
+    def test_seeded_draws_reproducible(self):
+        """Test that profiles with the same seed draw the same latencies per route."""
+        config = {"routes": {"default": {"latency": {"distribution": "lognormal", "median_ms": 50, "sigma": 0.5}}}}
+
+        def latencies(seed):
+            profile = FaultProfile(config, seed)
+            faults = profile.route_faults("/device/configs")
+            return [faults.sample_latency(profile.request_rng("/device/configs")[0]) for _ in range(5)]
+
+        self.assertEqual(latencies(7), latencies(7))
+        self.assertNotEqual(latencies(7), latencies(8))
+
+    def test_injected_errors(self):
+        """Test that a route with an error rate of 1 always fails with a 5xx."""
+        client = self._client({"routes": {"/device/<hostname>/config": {"error_rate": 1.0}}})
+        self.assertIn(client.get("/device/Router1/config").status_code, (500, 502, 503))
+        self.assertEqual(client.post("/auth").status_code, 200)
+
+    def test_token_expiry_storm(self):
+        """Test that protected routes are rejected with an expired token during a storm."""
+        client = self._client({"token_expiry_storm": {"every_requests": 4, "length_requests": 2}})
+        statuses = [client.get("/device/Router1/config").status_code for _ in range(8)]
+        self.assertEqual(statuses, [200, 200, 401, 401] * 2)
+
+    def test_throttle(self):
+        """Test that a throttled body is unchanged and delayed to the bandwidth."""
+        start = time.monotonic()
+        body = b"".join(throttle([b"x" * 40_000], bandwidth_kbps=3_200))
+        self.assertEqual(body, b"x" * 40_000)
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_profile_file(self):
+        """Test that a profile is loaded from a file and the seed is overridden."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "profile.json")
+            with open(filepath, "w") as f:
+                json.dump({"seed": 3, "bandwidth_kbps": 100}, f)
+            self.assertEqual(load_profile(filepath).seed, 3)
+            self.assertEqual(load_profile(filepath, "9").seed, 9)
+        self.assertFalse(load_profile(None).active)
+        with self.assertRaises(ValueError):
+            load_profile("missing-profile")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Unit tests for the audit diff."""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from app.audit_diff import (
+    REMOVED_STATUS,
+    diff_results,
+    read_results_file,
+    report_changes,
+    sorted_results,
+    write_results_file,
+)
+from app.audit_reporter import AuditReporter
+from app.domain_models import AuditResult
+from app.results_store import ResultsStore
+
+
+class TestAuditDiff(unittest.TestCase):
+
+    def setUp(self):
+        """Set up the results of two audits."""
+        self.old_results = [
+            AuditResult("Host1", "Logging", True, "Device has logging enabled: True. \nDevice has log server: True."),
+            AuditResult("Host2", "Logging", True, "Device has logging enabled: True. \nDevice has log server: True."),
+            AuditResult("Router1", "Logging", True, "Device has logging enabled: True."),
+        ]
+        self.new_results = [
+            AuditResult("Host1", "Logging", True, "Device has logging enabled: True. \nDevice has log server: True."),
+            AuditResult("Host2", "Logging", False, "Device has logging enabled: True. \nDevice has log server: False."),
+            AuditResult("Switch1", "Logging", True, "Device has logging enabled: True."),
+        ]
+
+    def test_diff_results(self):
+        """Test that only changed, added and removed device results are returned."""
+        changes = list(diff_results(self.old_results, self.new_results))
+        self.assertEqual(
+            [(c.device, c.old_status, c.new_status) for c in changes],
+            [
+                ("Host2", True, False),
+                ("Router1", True, None),
+                ("Switch1", None, True),
+            ],
+        )
+        self.assertEqual(changes[0].sub_check_changes, {"Device has log server": ("True", "False")})
+
+    def test_diff_results_unordered(self):
+        """Test that unordered results are rejected."""
+        with self.assertRaises(ValueError):
+            list(diff_results(reversed(self.old_results), self.new_results))
+
+    def test_sorted_results_spills_chunks(self):
+        """Test that results larger than a chunk are merged in order."""
+        results = [AuditResult(f"Host{i}", check, True, "") for i in range(50) for check in ("Logging", "Auth and AC")]
+        expected = sorted(results, key=lambda r: (r.device, r.zta_check))
+        self.assertEqual(list(sorted_results(reversed(results), chunk_size=7)), expected)
+
+    def test_diff_files_and_stored_runs(self):
+        """Test that a results file and a stored run are compared through the same model."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            old_file = os.path.join(tmp_dir, "old.ndjson")
+            write_results_file(reversed(self.old_results), old_file)
+            with ResultsStore(os.path.join(tmp_dir, "results.db")) as store:
+                with AuditReporter(os.path.join(tmp_dir, "report.xlsx"), results_store=store) as reporter:
+                    for result in self.new_results:
+                        reporter.add_result(*result)
+                changes = diff_results(sorted_results(read_results_file(old_file)), store.iter_results(reporter.run_id))
+                mock_reporter = Mock(AuditReporter)
+                self.assertEqual(report_changes(changes, mock_reporter), 3)
+        mock_reporter.add_result.assert_any_call(
+            "Host2", "Logging", False, "Device status changed: True -> False. \nDevice has log server: True -> False."
+        )
+        mock_reporter.add_result.assert_any_call("Router1", "Logging", REMOVED_STATUS, "Device removed from the audit.")
+
+    def test_removals_are_not_counted(self):
+        """Test that the summary of a diff report counts removed device checks as neither passed nor failed."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with AuditReporter(os.path.join(tmp_dir, "diff.xlsx")) as reporter:
+                report_changes(diff_results(self.old_results, self.new_results), reporter)
+        self.assertEqual(reporter.summary.check_counts(), {"Logging": (1, 1)})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Unit tests for AuditReporter."""
+
+import os
+import tempfile
+import threading
+import unittest
+import zipfile
+from unittest.mock import patch
+
+from app.audit_reporter import AuditReporter
+from app.exceptions import AuditReportWriteError
+
+
+class TestAuditReporter(unittest.TestCase):
+
+    def setUp(self):
+        """Write reports to a temporary directory."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self._tmp_dir.name, "report.xlsx")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_add_result_sync(self):
+        """Test that results are written to device rows and check columns."""
+        with AuditReporter(self.filepath) as reporter:
+            reporter.add_result("Router1", "Logging", True, "details")
+            reporter.add_result("Router1", "Auth and AC", False, "details")
+            reporter.add_result("Host1", "Logging", True, "details")
+        self.assertEqual(reporter._device_rows, {"Router1": 1, "Host1": 2})
+        self.assertEqual(reporter._col_headers, {"Logging": 1, "Auth and AC": 4})
+        self.assertTrue(os.path.exists(self.filepath))
+
+    def test_constant_memory(self):
+        """Test that a constant memory report has every check column, written before the results."""
+        with AuditReporter(self.filepath, constant_memory=True) as reporter:
+            reporter.add_result("Host1", "Least Privilege", True, "details")
+            reporter.add_result("Host2", "Logging", False, "details")
+        self.assertEqual(
+            reporter._col_headers,
+            {"Logging": 1, "Auth and AC": 4, "Network Segmentation": 7, "Least Privilege": 10, "Segment Overlap": 13},
+        )
+        with zipfile.ZipFile(self.filepath) as report:
+            sheet = report.read("xl/worksheets/sheet1.xml").decode()
+        self.assertIn("Least Privilege - Status", sheet)
+        self.assertIn("Host2", sheet)
+
+    def test_add_result_invalid_check(self):
+        """Test that an unknown check is rejected before it is queued."""
+        with AuditReporter(self.filepath, asynchronous=True) as reporter:
+            with self.assertRaises(ValueError):
+                reporter.add_result("Router1", "Unknown", True, "details")
+
+    def test_add_result_async_from_many_threads(self):
+        """Test that concurrent producers with a small queue get every result written."""
+        with AuditReporter(self.filepath, asynchronous=True, queue_size=4) as reporter:
+
+            def submit(worker):
+                for i in range(250):
+                    reporter.add_result(f"Host{worker}-{i}", "Logging", True, "details")
+
+            workers = [threading.Thread(target=submit, args=(worker,)) for worker in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(len(reporter._device_rows), 1000)
+        self.assertEqual(sorted(reporter._device_rows.values()), list(range(1, 1001)))
+
+    def test_writer_error_raised_on_exit(self):
+        """Test that a failure on the writer thread is raised when the report is closed."""
+        with patch.object(AuditReporter, "_write_result", side_effect=OSError("disk full")):
+            with self.assertRaises(AuditReportWriteError) as context:
+                with AuditReporter(self.filepath, asynchronous=True) as reporter:
+                    reporter.add_result("Router1", "Logging", True, "details")
+        self.assertIsInstance(context.exception.__cause__, OSError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Unit tests for AuditSummary."""
+
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from app.audit_summary import AuditSummary, parse_sub_checks
+from app.domain_models import AuditResult, Device
+
+
+class TestAuditSummary(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a summary of a router and two hosts."""
+        self.summary = AuditSummary()
+        for hostname, ip_address, device_type in [
+            ("Router1", "192.168.1.1", "router"),
+            ("Host1", "192.168.1.101", "host"),
+            ("Host2", "10.0.0.101", "host"),
+        ]:
+            device = Device(
+                {
+                    "hostname": hostname,
+                    "ip_address": ip_address,
+                    "device_type": device_type,
+                    "configuration": {"site": "HQ"},
+                }
+            )
+            self.summary.register_device(device)
+
+    def test_counts_per_check_and_segment(self):
+        """Test that results are counted per check, device type, site and subnet."""
+        self.summary.add(0, AuditResult("Router1", "Logging", True, "Device has logging enabled: True."))
+        self.summary.add(1, AuditResult("Host1", "Logging", False, "Device has logging enabled: False."))
+        self.summary.add(2, AuditResult("Host2", "Logging", True, "Device has logging enabled: True."))
+
+        self.assertEqual(self.summary.check_counts(), {"Logging": (2, 1)})
+        self.assertEqual(
+            self.summary.segment_counts("Device Type"), {("host", "Logging"): (1, 1), ("router", "Logging"): (1, 0)}
+        )
+        self.assertEqual(self.summary.segment_counts("Site"), {("HQ", "Logging"): (2, 1)})
+        self.assertEqual(
+            self.summary.segment_counts("Subnet"),
+            {("10.0.0.0/24", "Logging"): (1, 0), ("192.168.1.0/24", "Logging"): (1, 1)},
+        )
+        self.assertEqual(self.summary.top_failing_sub_checks(), [("Logging", "Device has logging enabled", 1)])
+
+    def test_replaced_result(self):
+        """Test that a replaced result moves the device from the fail to the pass counts, and takes back its sub-check
+        failures."""
+        self.summary.add(1, AuditResult("Host1", "Logging", False, "Device has logging enabled: False."))
+        self.summary.add(0, AuditResult("Router1", "Logging", False, "Device has logging enabled: False."))
+        self.summary.add(1, AuditResult("Host1", "Logging", False, "Device logs all event levels: False."))
+        self.assertEqual(
+            self.summary.top_failing_sub_checks(),
+            [("Logging", "Device has logging enabled", 1), ("Logging", "Device logs all event levels", 1)],
+        )
+        self.summary.add(1, AuditResult("Host1", "Logging", True, "Device logs all event levels: True."))
+        self.assertEqual(self.summary.check_counts(), {"Logging": (1, 1)})
+        self.assertEqual(
+            self.summary.segment_counts("Device Type"), {("host", "Logging"): (1, 0), ("router", "Logging"): (0, 1)}
+        )
+        self.assertEqual(self.summary.top_failing_sub_checks(), [("Logging", "Device has logging enabled", 1)])
+
+    def test_print_summary(self):
+        """Test that the pass rate of each check is printed."""
+        self.summary.add(0, AuditResult("Router1", "Logging", True, ""))
+        self.summary.add(1, AuditResult("Host1", "Logging", False, ""))
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.summary.print_summary()
+        self.assertIn("Logging: 1/2 passed (50.0%)", output.getvalue())
+
+    def test_parse_sub_checks(self):
+        """Test that each 'label: value.' line of the details is parsed."""
+        details = (
+            "Device has logging enabled: True. \nDevice has expected centralized logging server (10.0.0.1): False."
+        )
+        self.assertEqual(
+            parse_sub_checks(details),
+            {
+                "Device has logging enabled": "True",
+                "Device has expected centralized logging server (10.0.0.1)": "False",
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+"""Unit tests for the regression gates of the benchmark suite."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from bench_suite import MIN_REGRESSION_SECONDS, find_regressions  # noqa: E402
+
+
+class TestFindRegressions(unittest.TestCase):
+
+    def test_threshold(self):
+        """Test that only phases slower than their baselines by more than the threshold, and by more than the minimum
+        slowdown, are regressions."""
+        baselines = {"1000": {"check_logging": 0.1, "fetch_devices": 0.5, "report": 0.01}}
+        timings = {"1000": {"check_logging": 0.124, "fetch_devices": 0.7, "report": 0.01 + MIN_REGRESSION_SECONDS}}
+        regressions = find_regressions(timings, baselines, 0.25)
+        self.assertEqual(regressions, ["fetch_devices at 1000 devices: 0.7000s vs baseline 0.5000s"])
+        self.assertEqual(find_regressions(timings, baselines, 0.5), [])
+
+    def test_missing_baseline(self):
+        """Test that phases and fleet sizes without a baseline are not gated."""
+        baselines = {"1000": {"check_logging": 0.1}}
+        timings = {"1000": {"check_logging": 0.1, "check_segment_overlap": 5.0}, "4000": {"check_logging": 5.0}}
+        self.assertEqual(find_regressions(timings, baselines, 0.25), [])
+        self.assertEqual(find_regressions(timings, {}, 0.25), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
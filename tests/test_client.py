@@ -0,0 +1,32 @@
+"""Unit tests for the appliance client."""
+
+import unittest
+
+from app.client import InventoryMirror
+
+
+class TestInventoryMirror(unittest.TestCase):
+
+    def test_apply_reset_and_delta(self):
+        """Test that a reset replaces the records and a delta only applies the changes."""
+        mirror = InventoryMirror()
+        changed = mirror.apply(
+            {"epoch": "e1", "version": 1, "reset": True, "changes": {"Host1": {"a": 1}, "Host2": {"a": 2}}}
+        )
+        self.assertEqual(changed, {"Host1", "Host2"})
+        self.assertEqual((mirror.version, mirror.epoch), (1, "e1"))
+
+        changed = mirror.apply({"epoch": "e1", "version": 2, "reset": False, "changes": {"Host1": None, "Host3": {}}})
+        self.assertEqual(changed, {"Host1", "Host3"})
+        self.assertEqual(mirror.records, {"Host2": {"a": 2}, "Host3": {}})
+
+    def test_reset_only_reports_differences(self):
+        """Test that a reset reports only the records that differ from the mirror."""
+        mirror = InventoryMirror()
+        mirror.apply({"epoch": "e1", "version": 1, "reset": True, "changes": {"Host1": {"a": 1}, "Host2": {"a": 2}}})
+        changed = mirror.apply({"epoch": "e2", "version": 1, "reset": True, "changes": {"Host1": {"a": 1}}})
+        self.assertEqual(changed, {"Host2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,229 @@
+"""Unit tests for the continuous audit daemon."""
+
+import io
+import itertools
+import os
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stderr
+from unittest.mock import MagicMock
+
+import requests
+
+from app.audit_diff import read_results_file
+from app.client import InventoryMirror
+from app.daemon import AuditDaemon
+
+CHECKS = 6
+# the last octets of the unique ip addresses of the created devices
+_OCTETS = itertools.count(2)
+
+
+def device(hostname: str, device_type: str, **configuration) -> dict:
+    """Create the record of a compliant device."""
+    levels = ["INFO", "WARNING"] if device_type == "host" else ["INFO", "WARNING", "ERROR", "FATAL"]
+    config = {
+        "logging": {"enabled": True, "log_server": "10.0.0.1", "log_events": levels},
+        "auth": {"enabled": True, "aaa_server": "10.0.0.1"},
+        "network_segmentation": {"allowed_segments": ["30"]},
+    }
+    config.update(configuration)
+    ip_address = f"10.0.1.{next(_OCTETS) % 254 + 1}"
+    return {"hostname": hostname, "ip_address": ip_address, "device_type": device_type, "configuration": config}
+
+
+class FakeClient:
+    """Client whose change feeds return the queued changes."""
+
+    def __init__(self):
+        self.device_mirror = InventoryMirror()
+        self.user_mirror = InventoryMirror()
+        self.device_changes = []
+        self.user_changes = []
+        self.token_expires_at = None
+        self.login = MagicMock(side_effect=self._login)
+
+    def _login(self, *args):
+        self.token_expires_at = time.time() + 1800
+
+    def queue(self, devices: dict | None = None, users: dict | None = None, reset: bool = False) -> None:
+        version = self.device_mirror.version + 1
+        self.device_changes.append({"epoch": "e", "version": version, "reset": reset, "changes": devices or {}})
+        self.user_changes.append({"epoch": "e", "version": version, "reset": reset, "changes": users or {}})
+
+    def sync_device_data(self) -> set[str]:
+        return self.device_mirror.apply(self.device_changes.pop(0))
+
+    def sync_user_info(self) -> set[str]:
+        return self.user_mirror.apply(self.user_changes.pop(0))
+
+
+class TestAuditDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.publish = os.path.join(self._tmp_dir.name, "results.ndjson")
+        self.client = FakeClient()
+        self.daemon = AuditDaemon(self.client, "https://appliance", "joe", "admin", self.publish, interval=0)
+
+        aaa = device(
+            "AAA1",
+            "server",
+            services=["AAA"],
+            allowed_segments=["30"],
+            connected_to={"device": "Switch2"},
+            auth={"enabled": True, "aaa_server": "10.0.0.1", "acl": {"Allow": ["user2"]}},
+        )
+        aaa["ip_address"] = "10.0.0.1"
+        devices = {
+            "AAA1": aaa,
+            "Switch1": device("Switch1", "switch", VLANs=["30"]),
+            "Switch2": device("Switch2", "switch", VLANs=["30"]),
+            "Host1": device(
+                "Host1",
+                "host",
+                allowed_segments=["30"],
+                connected_to={"device": "Switch1"},
+                auth={"enabled": True, "aaa_server": "10.0.0.1", "assigned_user": "user1"},
+                roles=["user"],
+            ),
+            "Host2": device(
+                "Host2",
+                "host",
+                allowed_segments=["30"],
+                connected_to={"device": "Switch2"},
+                auth={"enabled": True, "aaa_server": "10.0.0.1", "assigned_user": "user2"},
+                roles=["user"],
+            ),
+        }
+        users = {
+            "user1": {"username": "user1", "roles": ["user"], "devices": ["Host1"]},
+            "user2": {"username": "user2", "roles": ["user"], "devices": ["Host2"]},
+        }
+        self.devices = devices
+        self.client.queue(devices, users, reset=True)
+
+    def status(self, hostname: str, zta_check: str) -> bool:
+        return next(r.status for r in self.daemon.results if (r.device, r.zta_check) == (hostname, zta_check))
+
+    def test_first_cycle_evaluates_everything(self):
+        """Test that the first cycle checks every device and publishes the results."""
+        self.assertEqual(self.daemon.run_cycle(), 5)
+        self.client.login.assert_called_once_with("https://appliance", "joe", "admin")
+        self.assertEqual(len(self.daemon.results), 5 * CHECKS)
+        self.assertTrue(all(result.status for result in self.daemon.results))
+        self.assertEqual(list(read_results_file(self.publish)), self.daemon.results)
+
+    def test_only_affected_devices_are_evaluated(self):
+        """Test that a change re-evaluates the device and the hosts connected to it, and nothing else."""
+        self.daemon.run_cycle()
+        self.client.queue({"Switch1": device("Switch1", "switch", VLANs=["30"], network_segmentation={})})
+        self.assertEqual(self.daemon.run_cycle(), 2)
+        self.assertFalse(self.status("Host1", "Network Segmentation"))
+        self.assertTrue(self.status("Host2", "Network Segmentation"))
+
+        self.client.queue()
+        self.assertEqual(self.daemon.run_cycle(), 0)
+        self.client.login.assert_called_once()
+
+    def test_user_change(self):
+        """Test that a user change re-evaluates the devices the user has access to or is referenced by."""
+        self.daemon.run_cycle()
+        self.client.queue(users={"user1": {"username": "user1", "roles": ["user"], "devices": ["Host1", "Host2"]}})
+        self.assertEqual(self.daemon.run_cycle(), 2)
+        self.assertFalse(self.status("Host1", "Auth and AC"))
+        self.assertTrue(self.status("Host2", "Auth and AC"))
+
+    def test_aaa_server_change(self):
+        """Test that a change to the AAA server re-evaluates every device."""
+        self.daemon.run_cycle()
+        aaa = dict(self.devices["AAA1"], ip_address="10.0.0.9")
+        self.client.queue({"AAA1": aaa})
+        self.assertEqual(self.daemon.run_cycle(), 5)
+        self.assertFalse(self.status("Host2", "Logging"))
+
+    def test_address_collision(self):
+        """Test that a device that takes another's ip address re-evaluates both, and freeing it clears both."""
+        self.daemon.run_cycle()
+        host2 = self.devices["Host2"]
+        self.client.queue({"Host2": dict(host2, ip_address=self.devices["Host1"]["ip_address"])})
+        self.assertEqual(self.daemon.run_cycle(), 2)
+        self.assertFalse(self.status("Host1", "Address Uniqueness"))
+        self.assertFalse(self.status("Host2", "Address Uniqueness"))
+
+        self.client.queue({"Host2": host2})
+        self.assertEqual(self.daemon.run_cycle(), 2)
+        self.assertTrue(self.status("Host1", "Address Uniqueness"))
+
+    def test_segment_overlap(self):
+        """Test that a segment change re-evaluates the devices that allow IPv4 segments."""
+        self.daemon.run_cycle()
+        router1 = device("Router1", "router", network_segmentation={"allowed_segments": ["10.1.0.0/24"]})
+        self.client.queue({"Router1": router1})
+        self.assertEqual(self.daemon.run_cycle(), 1)
+        self.assertTrue(self.status("Router1", "Segment Overlap"))
+
+        router2 = device("Router2", "router", network_segmentation={"allowed_segments": ["10.0.0.0/8"]})
+        self.client.queue({"Router2": router2})
+        self.assertEqual(self.daemon.run_cycle(), 2)
+        self.assertFalse(self.status("Router1", "Segment Overlap"))
+        self.assertFalse(self.status("Router2", "Segment Overlap"))
+
+    def test_removed_device(self):
+        """Test that the results of a removed device are dropped."""
+        self.daemon.run_cycle()
+        self.client.queue({"Host2": None})
+        self.daemon.run_cycle()
+        self.assertEqual({result.device for result in self.daemon.results}, {"AAA1", "Switch1", "Switch2", "Host1"})
+
+    def test_invalid_record_skipped(self):
+        """Test that an invalid record is left out of the inventory without failing the cycles, until it is fixed."""
+        self.daemon.run_cycle()
+        self.client.queue(
+            {"Host1": dict(self.devices["Host1"], configuration={"logging": "on"})},
+            {"user1": {"username": "user1", "roles": "user", "devices": ["Host1"]}},
+        )
+        with redirect_stderr(io.StringIO()) as stderr:
+            self.daemon.run_cycle()
+            self.client.queue()
+            self.assertEqual(self.daemon.run_cycle(), 0)
+        self.assertIn("Skipping device Host1", stderr.getvalue())
+        self.assertIn("Skipping user user1", stderr.getvalue())
+        self.assertEqual({result.device for result in self.daemon.results}, {"AAA1", "Switch1", "Switch2", "Host2"})
+
+        self.client.queue(
+            {"Host1": self.devices["Host1"]}, {"user1": {"username": "user1", "roles": ["user"], "devices": ["Host1"]}}
+        )
+        self.assertEqual(self.daemon.run_cycle(), 1)
+        self.assertTrue(self.status("Host1", "Auth and AC"))
+
+    def test_expired_token_retried(self):
+        """Test that a request rejected for an expired token is retried after logging in again."""
+        self.daemon.run_cycle()
+        self.client.queue()
+        response = requests.Response()
+        response.status_code = 401
+        sync = self.client.sync_device_data
+        self.client.sync_device_data = MagicMock(side_effect=[requests.exceptions.HTTPError(response=response), set()])
+        self.daemon.run_cycle()
+        self.assertEqual(self.client.sync_device_data.call_count, 2)
+        self.assertEqual(self.client.login.call_count, 2)
+        self.client.sync_device_data = sync
+
+    def test_failed_cycle_evaluates_everything(self):
+        """Test that the cycle after a failed one re-evaluates every device."""
+        self.daemon.run_cycle()
+        self.client.queue({"Switch1": device("Switch1", "switch", VLANs=["30"], network_segmentation={})})
+        self.client.user_changes.pop()
+        with self.assertRaises(IndexError):
+            self.daemon.run_cycle()
+        self.client.user_changes.append({"epoch": "e", "version": 2, "reset": False, "changes": {}})
+        self.client.device_changes.append({"epoch": "e", "version": 2, "reset": False, "changes": {}})
+        self.assertEqual(self.daemon.run_cycle(), 5)
+        self.assertFalse(self.status("Host1", "Network Segmentation"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Unit tests for the distributed audit."""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from app.audit_reporter import ResultCollector
+from app.distributed import AuditCoordinator, FileWorkQueue, start_local_workers
+from app.domain_models import Device, User
+from app.exceptions import WorkQueueError
+from app.zta_checks.address_uniqueness import AddressUniquenessCheck
+from app.zta_checks.auth_and_ac import AuthAndACCheck
+from app.zta_checks.least_privilege import LeastPrivilegeCheck
+from app.zta_checks.logging import LoggingCheck
+from app.zta_checks.network_segmentation import NetworkSegmentationCheck
+from app.zta_checks.segment_overlap import SegmentOverlapCheck
+from tests.helpers import load_records
+
+
+def expire(filepath: str) -> None:
+    """Make a lease look like its worker stopped renewing it a minute ago."""
+    past = time.time() - 60
+    os.utime(filepath, (past, past))
+
+
+class TestFileWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.queue = FileWorkQueue.create(self._tmp_dir.name, lease_seconds=30, max_attempts=2)
+        self.queue.put("shard-000000", {"devices": []})
+
+    def test_claim_is_exclusive(self):
+        """Test that a shard is leased to one worker, and that a directory holds one queue."""
+        lease, shard = self.queue.claim("worker1")
+        self.assertEqual((lease.shard, lease.attempt, shard), ("shard-000000", 1, {"devices": []}))
+        self.assertIsNone(self.queue.claim("worker2"))
+        self.assertTrue(self.queue.renew(lease))
+        with self.assertRaises(WorkQueueError):
+            FileWorkQueue.create(self._tmp_dir.name)
+
+    def test_expired_lease_is_retried(self):
+        """Test that a shard whose lease expired is leased again, until it runs out of attempts."""
+        lease, _ = self.queue.claim("worker1")
+        self.assertEqual(self.queue.requeue_expired(), 0)
+        expire(lease.path)
+        self.assertEqual(self.queue.requeue_expired(), 1)
+        self.assertFalse(self.queue.renew(lease))
+
+        retry, _ = self.queue.claim("worker2")
+        self.assertEqual(retry.attempt, 2)
+        self.queue.release(retry)
+        self.assertIsNone(self.queue.claim("worker3"))
+        self.assertEqual(self.queue.failed(), ["shard-000000"])
+
+    def test_late_results_are_kept(self):
+        """Test that the results of a worker that lost its lease are kept, and the retry of its shard is dropped."""
+        lease, _ = self.queue.claim("worker1")
+        expire(lease.path)
+        self.queue.requeue_expired()
+        self.queue.complete(lease, [["Host1", "Logging", True, ""]])
+        self.assertIsNone(self.queue.claim("worker2"))
+        self.assertEqual(self.queue.completed(), ["shard-000000"])
+        self.assertEqual(self.queue.read_results("shard-000000"), [["Host1", "Logging", True, ""]])
+
+
+class TestDistributedAudit(unittest.TestCase):
+
+    def test_worker_processes(self):
+        """Test that worker processes report the results of a local audit, retrying the shard of a dead worker."""
+        device_records, user_records = (list(records.values()) for records in load_records("generated"))
+        devices = [Device(record) for record in device_records]
+        users = [User(record) for record in user_records]
+        expected = ResultCollector()
+        LoggingCheck(devices).run_logging_checks(expected)
+        AuthAndACCheck(devices, users).run_auth_and_ac_checks(expected)
+        NetworkSegmentationCheck(devices).run_network_segmentation_checks(expected)
+        LeastPrivilegeCheck(devices, users).run_least_privilege_check(expected)
+        AddressUniquenessCheck(devices).run_address_uniqueness_check(expected)
+        SegmentOverlapCheck(devices).run_segment_overlap_check(expected)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            work_queue = FileWorkQueue.create(tmp_dir, lease_seconds=2)
+            collector = ResultCollector()
+            coordinator = AuditCoordinator(work_queue, collector, shard_size=400, poll_interval=0.05)
+            outcome = []
+            thread = threading.Thread(target=lambda: outcome.append(coordinator.run(device_records, user_records, 60)))
+            thread.start()
+            # a worker that claims a shard and dies before the other workers start
+            while (claimed := work_queue.claim("dead")) is None:
+                time.sleep(0.01)
+            expire(claimed[0].path)
+
+            workers = start_local_workers(tmp_dir, 3)
+            thread.join(timeout=90)
+            for worker in workers:
+                worker.wait(timeout=30)
+        self.assertEqual(outcome, [8])
+        self.assertEqual(coordinator.requeued, 1)
+        self.assertEqual([worker.returncode for worker in workers], [0, 0, 0])
+        self.assertEqual(collector.by_device_and_check(), expected.by_device_and_check())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Unit tests for the synthetic fleet generator."""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+from app.domain_models import Device, User
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "simulation"))
+
+from fleet_generator import APPLIANCE_IP, MAX_SITES, FleetGenerator, write_fleet  # noqa: E402
+
+
+class TestFleetGenerator(unittest.TestCase):
+
+    def write(self, generator: FleetGenerator) -> tuple[dict, dict]:
+        """Write a generated fleet and load it back."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            devices_file = os.path.join(tmp_dir, "devices.json")
+            users_file = os.path.join(tmp_dir, "users.json")
+            write_fleet(generator, devices_file, users_file)
+            with open(devices_file) as devices, open(users_file) as users:
+                return json.load(devices), json.load(users)
+
+    def test_device_count_and_schema(self):
+        """Test that exactly the requested devices are generated and load as domain models."""
+        devices, users = self.write(FleetGenerator(1003, seed=1, site_size=100))
+        self.assertEqual(len(devices), 1003)
+        self.assertIn("ApplianceServer", devices)
+        self.assertIn("AdminMachine", devices)
+        device_types = {Device(device).device_type for device in devices.values()}
+        self.assertEqual(device_types, {"router", "switch", "firewall", "host", "server"})
+        for user in users.values():
+            User(user)
+            for hostname in user["devices"]:
+                self.assertIn(hostname, devices)
+
+    def test_deterministic(self):
+        """Test that the same seed generates the same fleet and another seed does not."""
+        rates = {"logging": 0.1}
+        generator = FleetGenerator(500, seed=7, violation_rates=rates)
+        self.assertEqual(self.write(generator), self.write(FleetGenerator(500, seed=7, violation_rates=rates)))
+        self.assertNotEqual(self.write(generator), self.write(FleetGenerator(500, seed=8, violation_rates=rates)))
+
+    def test_violation_rate(self):
+        """Test that violations are only generated at the requested rate."""
+
+        def logging_violations(devices: dict) -> int:
+            return sum(
+                not (
+                    logging["enabled"] and logging["log_server"] == APPLIANCE_IP and "WARNING" in logging["log_events"]
+                )
+                for logging in (device["configuration"]["logging"] for device in devices.values())
+            )
+
+        devices, _ = self.write(FleetGenerator(2000, seed=3))
+        self.assertEqual(logging_violations(devices), 0)
+
+        devices, _ = self.write(FleetGenerator(2000, seed=3, violation_rates={"logging": 0.5}))
+        self.assertAlmostEqual(logging_violations(devices) / len(devices), 0.5, delta=0.05)
+
+    def test_invalid_violation_kind(self):
+        """Test that unknown violation kinds are rejected."""
+        with self.assertRaises(ValueError):
+            FleetGenerator(100, violation_rates={"unknown": 0.1})
+
+    def test_addressable_sites(self):
+        """Test that a fleet has no more sites than there are distinct subnets, and the last sites' are distinct."""
+        FleetGenerator(MAX_SITES * 8, site_size=8)
+        with self.assertRaises(ValueError):
+            FleetGenerator(MAX_SITES * 8 + 8, site_size=8)
+        generator = FleetGenerator(8)
+        sites = range(MAX_SITES - 3, MAX_SITES)
+        self.assertEqual(len({generator._site_subnet(site) for site in sites}), 3)
+        self.assertEqual(len({generator._transit_ips(site)[0] for site in sites}), 3)
+        self.assertEqual(generator._transit_ips(MAX_SITES - 1)[1], "172.19.255.249")
+
+    def test_addressing_violation(self):
+        """Test that an addressing violation takes the ip address of another device of the site."""
+        generator = FleetGenerator(8, violation_rates={"addressing": 1.0})
+        for seed in range(20):
+            devices = [
+                {"hostname": f"Host{i}", "ip_address": ip_address, "device_type": "host", "configuration": {}}
+                for i, ip_address in enumerate(["10.0.0.1", "10.0.0.2", "10.0.0.1"])
+            ]
+            generator._apply_violation(devices[0], devices, [], random.Random(seed))
+            self.assertEqual(devices[0]["ip_address"], "10.0.0.2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Unit tests for the appliance load test."""
+
+import argparse
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from load_test import HISTOGRAM_BUCKETS_MS, LatencyStats, parse_mix  # noqa: E402
+
+
+class TestParseMix(unittest.TestCase):
+
+    def test_weights(self):
+        """Test that each operation gets its weight, and an operation without a weight gets 1."""
+        self.assertEqual(parse_mix("device=80,devices_page=10,auth"), {"device": 80, "devices_page": 10, "auth": 1})
+        self.assertEqual(parse_mix("users=0,device=2"), {"users": 0, "device": 2})
+
+    def test_invalid_mix(self):
+        """Test that unknown operations, invalid weights and mixes without requests are rejected."""
+        for mix in ("device=80,unknown=10", "", "device=many", "device=-1", "device=0,auth=0"):
+            with self.subTest(mix=mix), self.assertRaises(argparse.ArgumentTypeError):
+                parse_mix(mix)
+
+
+class TestLatencyStats(unittest.TestCase):
+
+    def test_percentiles(self):
+        """Test the latency percentiles, in milliseconds, of the sorted latencies."""
+        stats = LatencyStats()
+        self.assertEqual(stats.percentile(0.5), 0.0)
+        stats.latencies = [i / 1000 for i in range(1, 101)]
+        self.assertAlmostEqual(stats.percentile(0.0), 1.0)
+        self.assertAlmostEqual(stats.percentile(0.5), 51.0)
+        self.assertAlmostEqual(stats.percentile(0.99), 100.0)
+        self.assertAlmostEqual(stats.percentile(1.0), 100.0)
+
+    def test_histogram(self):
+        """Test that each latency is counted in the first bucket whose upper bound it does not exceed."""
+        stats = LatencyStats()
+        stats.latencies = [0.0005, 0.001, 0.0011, 0.25, 60.0]
+        histogram = dict(zip(HISTOGRAM_BUCKETS_MS, stats.histogram()))
+        self.assertEqual(histogram[1], 2)
+        self.assertEqual(histogram[2], 1)
+        self.assertEqual(histogram[500], 1)
+        self.assertEqual(histogram[float("inf")], 1)
+        self.assertEqual(sum(histogram.values()), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
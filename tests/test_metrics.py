@@ -0,0 +1,109 @@
+"""Unit tests for the audit metrics."""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.metrics import Metrics
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_disabled(self):
+        """Test that nothing is recorded or written when metrics are disabled."""
+        metrics = Metrics()
+        with metrics.timer("zta_phase_duration_seconds", phase="fetch_devices"):
+            metrics.inc("zta_devices_processed_total", 10)
+        metrics.set_gauge("zta_devices_reported", 10)
+        self.assertEqual(metrics.to_dict(), {"timers": [], "counters": [], "gauges": []})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "metrics.json")
+            metrics.write(filepath, None)
+            self.assertFalse(os.path.exists(filepath))
+
+    def test_configured_files(self):
+        """Test that configuring a metrics file enables the registry and writes to the file by default."""
+        metrics = Metrics()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "metrics.json")
+            metrics.configure(filepath, None)
+            metrics.inc("zta_devices_processed_total", 10)
+            metrics.write()
+            with open(filepath) as f:
+                self.assertEqual(json.load(f)["counters"][0]["value"], 10)
+        metrics.configure(None, None)
+        self.assertFalse(metrics.enabled)
+
+    def test_timers_counters_and_gauges(self):
+        """Test that timers, counters and gauges are recorded per label set."""
+        metrics = Metrics(enabled=True)
+        for _ in range(2):
+            with metrics.timer("zta_check_duration_seconds", check="Logging"):
+                pass
+        metrics.inc("zta_results_written_total", check="Logging")
+        metrics.inc("zta_results_written_total", 2, check="Logging")
+        metrics.inc("zta_results_written_total", check="Least Privilege")
+        metrics.set_gauge("zta_devices_reported", 3)
+
+        recorded = metrics.to_dict()
+        self.assertEqual(recorded["timers"][0]["count"], 2)
+        self.assertEqual(recorded["timers"][0]["labels"], {"check": "Logging"})
+        self.assertEqual(
+            [(counter["labels"]["check"], counter["value"]) for counter in recorded["counters"]],
+            [("Least Privilege", 1), ("Logging", 3)],
+        )
+        self.assertEqual(recorded["gauges"], [{"name": "zta_devices_reported", "labels": {}, "value": 3}])
+
+    def test_timer_records_on_error(self):
+        """Test that a block that raises is still timed."""
+        metrics = Metrics(enabled=True)
+        with self.assertRaises(ValueError):
+            with metrics.timer("zta_phase_duration_seconds", phase="fetch_devices"):
+                raise ValueError()
+        self.assertEqual(metrics.to_dict()["timers"][0]["count"], 1)
+
+    def test_prometheus_format(self):
+        """Test the Prometheus text exposition of each metric type."""
+        metrics = Metrics(enabled=True)
+        metrics.observe("zta_check_duration_seconds", 0.5, check="Auth and AC")
+        metrics.inc("zta_bytes_fetched_total", 100, endpoint="/device/configs")
+        metrics.set_gauge("zta_devices_reported", 3)
+        lines = metrics.to_prometheus().splitlines()
+        self.assertIn("# TYPE zta_check_duration_seconds summary", lines)
+        self.assertIn('zta_check_duration_seconds_sum{check="Auth and AC"} 0.5', lines)
+        self.assertIn('zta_check_duration_seconds_count{check="Auth and AC"} 1', lines)
+        self.assertIn('zta_check_duration_seconds_max{check="Auth and AC"} 0.5', lines)
+        self.assertIn("# TYPE zta_bytes_fetched_total counter", lines)
+        self.assertIn('zta_bytes_fetched_total{endpoint="/device/configs"} 100', lines)
+        self.assertIn("zta_devices_reported 3", lines)
+
+    def test_write(self):
+        """Test that both metrics files are written with the peak memory gauge."""
+        metrics = Metrics(enabled=True)
+        metrics.inc("zta_devices_processed_total", 5)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_file = os.path.join(tmp_dir, "metrics.json")
+            prometheus_file = os.path.join(tmp_dir, "metrics.prom")
+            metrics.write(json_file, prometheus_file)
+            with open(json_file, "r") as f:
+                gauges = {gauge["name"] for gauge in json.load(f)["gauges"]}
+            self.assertIn("zta_peak_memory_bytes", gauges)
+            with open(prometheus_file, "r") as f:
+                self.assertIn("zta_devices_processed_total 5", f.read())
+
+    def test_write_without_resource(self):
+        """Test that the metrics are written without the peak memory gauge where the resource module is missing."""
+        metrics = Metrics(enabled=True)
+        with tempfile.TemporaryDirectory() as tmp_dir, patch.dict("sys.modules", {"resource": None}):
+            json_file = os.path.join(tmp_dir, "metrics.json")
+            metrics.write(json_file)
+            with open(json_file, "r") as f:
+                gauges = {gauge["name"] for gauge in json.load(f)["gauges"]}
+        self.assertEqual(gauges, {"zta_last_run_timestamp_seconds"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Unit tests for the streaming audit pipeline."""
+
+import unittest
+from unittest.mock import MagicMock
+
+from app import audit_reporter
+from app.domain_models import AuditResult, Device, User
+from app.pipeline import AuditPipeline
+from app.zta_checks.auth_and_ac import AuthAndACCheck
+from app.zta_checks.least_privilege import LeastPrivilegeCheck
+from app.zta_checks.logging import LoggingCheck
+from app.zta_checks.network_segmentation import NetworkSegmentationCheck
+from app.zta_checks.segment_overlap import SegmentOverlapCheck
+from tests.helpers import load_records
+
+
+class ResultCollector(audit_reporter.ResultCollector):
+    """Reporter that keeps the results in the order they are added, of registered devices only."""
+
+    def __init__(self):
+        super().__init__()
+        self.registered = set()
+
+    def register_devices(self, devices: list[Device]) -> None:
+        self.registered.update(device.hostname for device in devices)
+
+    def add_result(self, device, zta_check, status, details) -> None:
+        assert device in self.registered
+        super().add_result(device, zta_check, status, details)
+
+
+class StreamingClient:
+    """Client that streams the data of the simulated appliance, sorted by key like the appliance."""
+
+    def __init__(self, devices: dict, users: dict):
+        self.devices = devices
+        self.users = users
+
+    def stream_device_data(self, device_type: str | None = None):
+        for hostname in sorted(self.devices):
+            if device_type in (None, self.devices[hostname]["device_type"]):
+                yield self.devices[hostname]
+
+    def stream_user_info(self):
+        for username in sorted(self.users):
+            yield self.users[username]
+
+
+class TestAuditPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.devices, self.users = load_records("partial_compliant")
+        self.client = StreamingClient(self.devices, self.users)
+
+    def batch_results(self) -> set[AuditResult]:
+        """Get the results of the checks run over the whole fleet at once."""
+        devices = [Device(device) for device in self.devices.values()]
+        users = [User(user) for user in self.users.values()]
+        reporter = ResultCollector()
+        reporter.register_devices(devices)
+        LoggingCheck(devices).run_logging_checks(reporter)
+        AuthAndACCheck(devices, users).run_auth_and_ac_checks(reporter)
+        NetworkSegmentationCheck(devices).run_network_segmentation_checks(reporter)
+        LeastPrivilegeCheck(devices, users).run_least_privilege_check(reporter)
+        SegmentOverlapCheck(devices).run_segment_overlap_check(reporter)
+        return set(reporter.results)
+
+    def test_results_match_batch_audit(self):
+        """Test that streaming in small batches has the results of checking the whole fleet at once."""
+        reporter = ResultCollector()
+        pipeline = AuditPipeline(self.client, reporter, batch_size=2, queue_size=1)
+        self.assertEqual(pipeline.run(), len(self.devices))
+        self.assertEqual(set(reporter.results), self.batch_results())
+        self.assertIsNotNone(pipeline.first_result_seconds)
+
+    def test_results_grouped_by_device(self):
+        """Test that every result of a device is added before the next device's, as constant memory reports need."""
+        reporter = ResultCollector()
+        AuditPipeline(self.client, reporter, batch_size=3).run()
+        hostnames = [result.device for result in reporter.results]
+        runs = [hostname for index, hostname in enumerate(hostnames) if index == 0 or hostnames[index - 1] != hostname]
+        self.assertEqual(len(runs), len(set(runs)))
+
+    def test_fetch_error_raised(self):
+        """Test that an error of the fetcher thread is raised by the pipeline."""
+        client = MagicMock(wraps=self.client)
+        stream_device_data = self.client.stream_device_data
+
+        def failing_stream(device_type=None):
+            if device_type == "host":
+                raise ConnectionError("connection reset")
+            return stream_device_data(device_type)
+
+        client.stream_device_data.side_effect = failing_stream
+        with self.assertRaises(ConnectionError):
+            AuditPipeline(client, ResultCollector(), batch_size=1, queue_size=1).run()
+
+    def test_check_error_stops_fetcher(self):
+        """Test that the fetcher stops when the checks fail, rather than blocking on the full queue."""
+        reporter = ResultCollector()
+        reporter.add_result = MagicMock(side_effect=RuntimeError("report failed"))
+        pipeline = AuditPipeline(self.client, reporter, batch_size=1, queue_size=1)
+        with self.assertRaises(RuntimeError):
+            pipeline.run()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Unit tests for the profiling mode."""
+
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+from app import domain_models
+from app.profiling import Profiler, SamplingProfiler, module_name
+
+
+def busy_wait(seconds: float) -> None:
+    """Keep the CPU busy for a time."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiling(unittest.TestCase):
+
+    def test_module_name(self):
+        """Test that source files are attributed to dotted module names."""
+        self.assertEqual(module_name(domain_models.__file__), "app.domain_models")
+        self.assertEqual(
+            module_name("/venv/lib/python3.11/site-packages/xlsxwriter/worksheet.py"), "xlsxwriter.worksheet"
+        )
+        self.assertEqual(module_name("<frozen importlib._bootstrap>"), "<frozen importlib._bootstrap>")
+
+    def test_phase_memory(self):
+        """Test that the peak and retained memory of a phase are attributed to the allocating module."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = Profiler(trace_memory=True, output_dir=tmp_dir)
+            profiler.start()
+            with profiler.phase("allocate"):
+                retained = [bytearray(1024) for _ in range(1000)]
+                transient = bytearray(4 * 2**20)
+                del transient
+            written = profiler.stop()
+
+            phase = profiler.phases[0]
+            self.assertEqual(phase.phase, "allocate")
+            self.assertGreaterEqual(phase.peak, 4 * 2**20)
+            self.assertGreaterEqual(phase.retained, 1000 * 1024)
+            self.assertLess(phase.retained, 4 * 2**20)
+            self.assertEqual(phase.top_modules[0][0], "tests.test_profiling")
+            self.assertEqual(len(written), 1)
+            with open(written[0], "r") as f:
+                self.assertIn("allocate: peak", f.read())
+            del retained
+
+    def test_phase_disabled(self):
+        """Test that phases are not traced without memory tracing."""
+        profiler = Profiler()
+        with profiler.phase("allocate"):
+            pass
+        self.assertFalse(profiler.enabled)
+        self.assertEqual(profiler.phases, [])
+
+    def test_cprofile(self):
+        """Test that the cProfile mode writes a pstats file."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiler = Profiler("cprofile", output_dir=tmp_dir)
+            profiler.start()
+            busy_wait(0.01)
+            (filepath,) = profiler.stop()
+            self.assertTrue(filepath.endswith(".prof"))
+            functions = {function for _, _, function in pstats.Stats(filepath).stats}
+            self.assertIn("busy_wait", functions)
+
+    def test_sampling_folded_stacks(self):
+        """Test that the sampling profiler writes folded stacks of the sampled threads."""
+        sampler = SamplingProfiler(interval=0.001)
+        sampler.start()
+        busy_wait(0.1)
+        sampler.stop()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "profile.folded")
+            sampler.write_folded(filepath)
+            with open(filepath, "r") as f:
+                lines = f.read().splitlines()
+        self.assertTrue(any("busy_wait (tests.test_profiling:" in line for line in lines))
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertTrue(stack.startswith("MainThread;"))
+        self.assertGreater(int(count), 0)
+
+    def test_invalid_profiler(self):
+        """Test that an unknown profiler is rejected."""
+        with self.assertRaises(ValueError):
+            Profiler("perf")
+
+
+if __name__ == "__main__":
+    unittest.main()
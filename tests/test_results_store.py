@@ -0,0 +1,70 @@
+"""Unit tests for ResultsStore."""
+
+import os
+import tempfile
+import unittest
+
+from app.audit_reporter import AuditReporter
+from app.results_store import ResultsStore, StatusFlip
+
+
+class TestResultsStore(unittest.TestCase):
+
+    def setUp(self):
+        """Create a results database in a temporary directory."""
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.store = ResultsStore(os.path.join(self._tmp_dir.name, "results.db"), batch_size=2)
+
+    def tearDown(self):
+        self.store.close()
+        self._tmp_dir.cleanup()
+
+    def record_run(self, results: list[tuple]) -> int:
+        """Record a run of results through the AuditReporter."""
+        report_path = os.path.join(self._tmp_dir.name, f"report_{len(self.store.runs())}.xlsx")
+        with AuditReporter(report_path, results_store=self.store) as reporter:
+            for result in results:
+                reporter.add_result(*result)
+        return reporter.run_id
+
+    def test_pass_rate_trend(self):
+        """Test that pass/fail counts are summarized per run and check."""
+        self.record_run([("Router1", "Logging", True, ""), ("Host1", "Logging", True, "")])
+        self.record_run([("Router1", "Logging", True, ""), ("Host1", "Logging", False, "")])
+
+        trend = self.store.pass_rate_trend("Logging")
+        self.assertEqual([(row.passed, row.failed) for row in trend], [(2, 0), (1, 1)])
+        self.assertEqual(trend[1].pass_rate, 0.5)
+        self.assertEqual(len(self.store.pass_rate_trend(limit=1)), 1)
+
+    def test_flipped_devices(self):
+        """Test that only devices whose status changed are returned."""
+        old_run = self.record_run(
+            [("Router1", "Logging", True, ""), ("Host1", "Logging", True, ""), ("Host2", "Logging", False, "")]
+        )
+        new_run = self.record_run(
+            [("Router1", "Logging", True, ""), ("Host1", "Logging", False, ""), ("Host2", "Logging", True, "")]
+        )
+
+        self.assertEqual(
+            self.store.flipped_devices(old_run, new_run),
+            [StatusFlip("Host1", "Logging", True, False), StatusFlip("Host2", "Logging", False, True)],
+        )
+        self.assertEqual(
+            self.store.flipped_devices(old_run, new_run, regressions_only=True),
+            [StatusFlip("Host1", "Logging", True, False)],
+        )
+
+    def test_incomplete_run_excluded_from_trend(self):
+        """Test that a run which raised is not summarized."""
+        report_path = os.path.join(self._tmp_dir.name, "report.xlsx")
+        with self.assertRaises(RuntimeError):
+            with AuditReporter(report_path, results_store=self.store) as reporter:
+                reporter.add_result("Router1", "Logging", True, "")
+                raise RuntimeError("check failed")
+        self.assertEqual(self.store.pass_rate_trend(), [])
+        self.assertFalse(self.store.runs()[0].completed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Unit tests for the rule engine."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from app.audit_reporter import ResultCollector
+from app.domain_models import AuditResult, Device, User
+from app.exceptions import InvalidRuleSetError
+from app.zta_checks.auth_and_ac import AuthAndACCheck
+from app.zta_checks.logging import LoggingCheck
+from app.zta_checks.rule_engine import DEFAULT_RULES, RuleCheck, RuleSet, yaml
+from tests.helpers import load_data_set
+
+
+def router(hostname: str, **logging) -> Device:
+    """Create a router with the logging configuration."""
+    return Device(
+        {
+            "hostname": hostname,
+            "ip_address": "192.168.1.1",
+            "device_type": "router",
+            "configuration": {"logging": logging},
+        }
+    )
+
+
+class TestRuleEngine(unittest.TestCase):
+
+    def run_rules(self, spec: dict, devices: list[Device], users: list[User] | None = None) -> dict:
+        collector = ResultCollector()
+        RuleCheck(RuleSet(spec), devices, users or []).run_rule_checks(collector)
+        return collector.by_device_and_check()
+
+    def test_default_rules_match_checks(self):
+        """Test that the default rule set reports the results of the Logging and Auth and AC checks."""
+        rule_set = RuleSet.load()
+        self.assertEqual(rule_set.checks, ["Logging", "Auth and AC"])
+        for prefix in ("compliant", "partial_compliant", "generated"):
+            devices, users = load_data_set(prefix)
+            expected = ResultCollector()
+            LoggingCheck(devices).run_logging_checks(expected)
+            AuthAndACCheck(devices, users).run_auth_and_ac_checks(expected)
+            results = ResultCollector()
+            RuleCheck(rule_set, devices, users).run_rule_checks(results)
+            self.assertEqual(results.by_device_and_check(), expected.by_device_and_check(), prefix)
+            if prefix == "partial_compliant":
+                self.assertIn(False, {result.status for result in results.results})
+
+    def test_cases_by_device_type(self):
+        """Test that a rule tests each device type with its case, and the other types with the default."""
+        spec = {
+            "checks": {
+                "Logging": [
+                    {
+                        "details": "Device keeps logs for long enough: {result}.",
+                        "cases": [{"device_types": ["router"], "test": {"at_least": [{"config": "r.days"}, 90]}}],
+                        "default": {"at_least": [{"config": "r.days"}, 30]},
+                    }
+                ]
+            }
+        }
+        host = Device(
+            {"hostname": "Host1", "ip_address": "10.0.0.5", "device_type": "host", "configuration": {"r": {"days": 30}}}
+        )
+        router1 = Device(
+            {"hostname": "Router1", "ip_address": "10.0.0.1", "device_type": "router", "configuration": {"r": {}}}
+        )
+        results = self.run_rules(spec, [host, router1])
+        self.assertEqual(results["Host1", "Logging"], (True, "Device keeps logs for long enough: True."))
+        self.assertEqual(results["Router1", "Logging"], (False, "Device keeps logs for long enough: False."))
+
+    def test_extended_rules(self):
+        """Test that rules added to a check all have to pass, with context values in their details."""
+        with open(DEFAULT_RULES) as f:
+            spec = json.load(f)
+        spec["checks"] = {"Logging": spec["checks"]["Logging"][:2]}
+        spec["checks"]["Logging"].append(
+            {
+                "details": "Device sends no logs to {log_server} in plain text: {result}.",
+                "test": {"not": {"config": "logging.plain_text", "default": False}},
+            }
+        )
+        server = Device(
+            {
+                "hostname": "Server1",
+                "ip_address": "10.0.0.9",
+                "device_type": "server",
+                "configuration": {"services": ["AAA"], "logging": {"enabled": True, "log_server": "10.0.0.9"}},
+            }
+        )
+        devices = [server, router("Router1", enabled=True, log_server="10.0.0.9", plain_text=True)]
+        results = self.run_rules(spec, devices)
+        self.assertTrue(results["Server1", "Logging"][0])
+        status, details = results["Router1", "Logging"]
+        self.assertFalse(status)
+        self.assertTrue(details.endswith("Device sends no logs to 10.0.0.9 in plain text: False."))
+
+    def test_invalid_rule_sets(self):
+        """Test that rule sets that cannot be compiled are rejected when they are loaded."""
+        rule = {"details": "Device has logging enabled: {result}.", "test": {"config": "logging.enabled"}}
+        invalid_rules = [
+            {**rule, "test": {"matches": [{"config": "logging.enabled"}, True]}},
+            {**rule, "test": {"equals": [{"context": "log_server"}, "10.0.0.1"]}},
+            {**rule, "test": {"contains": [{"user": "roles"}, "admin"]}},
+            {**rule, "details": "Device has logging enabled."},
+            {**rule, "cases": []},
+        ]
+        for invalid_rule in invalid_rules:
+            with self.subTest(rule=invalid_rule), self.assertRaises(InvalidRuleSetError):
+                RuleSet({"checks": {"Logging": [invalid_rule]}})
+        with self.assertRaises(InvalidRuleSetError):
+            RuleSet({"checks": {"Encryption": [rule]}})
+
+    @unittest.skipUnless(yaml, "PyYAML is not installed")
+    def test_yaml_rule_set(self):
+        """Test that a rule set can be written in YAML."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filepath = os.path.join(tmp_dir, "rules.yaml")
+            with open(filepath, "w") as f:
+                f.write(
+                    "checks:\n"
+                    "  Logging:\n"
+                    "    - details: 'Device has logging enabled: {result}.'\n"
+                    "      test: {config: logging.enabled}\n"
+                )
+            rule_set = RuleSet.load(filepath)
+        results = ResultCollector()
+        RuleCheck(rule_set, [router("Router1", enabled=False)], []).run_rule_checks(results)
+        expected = AuditResult("Router1", "Logging", False, "Device has logging enabled: False.")
+        self.assertEqual(results.results, [expected])
+
+
+if __name__ == "__main__":
+    unittest.main()
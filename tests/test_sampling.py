@@ -0,0 +1,148 @@
+"""Unit tests for the statistical sampling audit."""
+
+import io
+import unittest
+from collections import Counter
+from contextlib import redirect_stdout
+from unittest.mock import MagicMock
+
+from app.audit_reporter import ResultCollector
+from app.domain_models import Device
+from app.exceptions import ApplianceRequestError
+from app.sampling import (
+    MAX_AAA_SERVER_SEARCH,
+    SampleAudit,
+    required_sample_size,
+    stratified_sample,
+    wilson_interval,
+)
+from tests.helpers import load_records
+
+
+class SamplingClient:
+    """Client that serves the device index and single devices of the simulated appliance's data."""
+
+    def __init__(self, devices: dict, users: dict, index_services: bool = True):
+        self.devices = devices
+        self.users = users
+        self.index_services = index_services
+        self.fetched = []
+
+    def get_device_index(self) -> list[tuple[str, str, str, list[str] | None]]:
+        return [
+            (h, d["device_type"], d["ip_address"], d["configuration"].get("services") if self.index_services else None)
+            for h, d in sorted(self.devices.items())
+        ]
+
+    def get_device_data(self, hostname: str) -> dict:
+        self.fetched.append(hostname)
+        return self.devices[hostname]
+
+    def stream_user_info(self):
+        yield from self.users.values()
+
+
+class TestSampling(unittest.TestCase):
+
+    def test_required_sample_size(self):
+        """Test the sample size of a 5% margin at 95% confidence, with the finite population correction."""
+        self.assertEqual(required_sample_size(1_000_000), 384)
+        self.assertEqual(required_sample_size(10_000), 370)
+        self.assertEqual(required_sample_size(100), 80)
+        self.assertEqual(required_sample_size(10, margin=0.01), 10)
+
+    def test_wilson_interval(self):
+        """Test the Wilson interval against known values, and that a census has no uncertainty."""
+        lower, upper = wilson_interval(8, 10)
+        self.assertAlmostEqual(lower, 0.4902, places=4)
+        self.assertAlmostEqual(upper, 0.9433, places=4)
+        self.assertEqual(wilson_interval(10, 10, population=10), (1.0, 1.0))
+        narrowed = wilson_interval(8, 10, population=20)
+        self.assertGreater(narrowed[0], lower)
+        self.assertLess(narrowed[1], upper)
+
+    def test_stratified_sample(self):
+        """Test that each stratum gets its proportional share of a reproducible sample."""
+        index = [(f"Host{i}", "host", f"10.0.{i % 4}.{i % 250}") for i in range(800)]
+        index += [(f"Server{i}", "server", f"10.0.9.{i}") for i in range(200)]
+        sample = stratified_sample(index, 100, seed=7)
+        self.assertEqual(len(set(sample)), 100)
+        self.assertEqual(sample, stratified_sample(index, 100, seed=7))
+
+        strata = {hostname: (device_type, ip.rsplit(".", 1)[0]) for hostname, device_type, ip in index}
+        counts = Counter(strata[hostname] for hostname in sample)
+        self.assertEqual(counts[("server", "10.0.9")], 20)
+        for subnet in range(4):
+            self.assertIn(counts[("host", f"10.0.{subnet}")], (20, 21))
+
+    def test_sample_audit(self):
+        """Test that only sampled devices and their dependencies are fetched, and a census estimates exactly."""
+        devices, users = load_records("partial_compliant")
+
+        client = SamplingClient(devices, users)
+        reporter = ResultCollector()
+        SampleAudit(client, sample_size=2, seed=3).run(reporter)
+        sampled = {result.device for result in reporter.results}
+        self.assertEqual(len(sampled), 2)
+        self.assertLess(len(set(client.fetched)), len(devices))
+
+        reporter = ResultCollector()
+        estimates = SampleAudit(SamplingClient(devices, users), sample_size=len(devices)).run(reporter)
+        logging = next(e for e in estimates if (e.zta_check, e.segment) == ("Logging", "all"))
+        passed = sum(result.status for result in reporter.results if result.zta_check == "Logging")
+        self.assertEqual((logging.sampled, logging.population), (len(devices), len(devices)))
+        self.assertEqual(logging.lower, logging.upper)
+        self.assertEqual(logging.pass_rate, passed / len(devices))
+
+    def test_aaa_server_lookup(self):
+        """Test that the AAA server is looked up in the indexed services, and searched among a capped number of servers
+        when the appliance does not index services."""
+        servers = {
+            f"Server{i:03}": {
+                "hostname": f"Server{i:03}",
+                "ip_address": f"10.0.1.{i + 1}",
+                "device_type": "server",
+                "configuration": {
+                    "services": ["AAA"] if i == 80 else ["FTP"],
+                    "logging": {"enabled": True, "log_server": "10.0.1.81", "log_events": ["INFO"]},
+                    "auth": {"enabled": True, "aaa_server": "10.0.1.81"},
+                    "connected_to": {"device": "Switch1"},
+                },
+            }
+            for i in range(100)
+        }
+        host = {
+            "hostname": "Host1",
+            "ip_address": "10.0.0.5",
+            "device_type": "host",
+            "configuration": {"auth": {"enabled": True, "aaa_server": "10.0.9.9"}},
+        }
+        devices = {**servers, "Host1": host}
+
+        def context(client: SamplingClient) -> list[str]:
+            by_hostname = {hostname: entry for hostname, *entry in client.get_device_index()}
+            return [device.hostname for device in SampleAudit(client)._context([Device(host)], by_hostname)]
+
+        client = SamplingClient(devices, {})
+        self.assertEqual(context(client), ["Server080"])
+        self.assertEqual(client.fetched, ["Server080"])
+
+        client = SamplingClient(devices, {}, index_services=False)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.assertEqual(context(client), [])
+        self.assertEqual(len(client.fetched), MAX_AAA_SERVER_SEARCH)
+        self.assertIn(f"searching only {MAX_AAA_SERVER_SEARCH} of 100 servers", output.getvalue())
+
+    def test_missing_device(self):
+        """Test that a sampled device without a configuration fails the audit."""
+        client = MagicMock()
+        client.get_device_index.return_value = [("Host1", "host", "10.0.0.1", None)]
+        client.get_device_data.return_value = None
+        with self.assertRaises(ApplianceRequestError) as context:
+            SampleAudit(client, sample_size=1).run(ResultCollector())
+        self.assertIn("Host1", str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Unit tests for the schema validation of the ingested records."""
+
+import unittest
+
+from app.exceptions import InvalidConfigurationError, InvalidUserValueError
+from app.schema import (
+    CONFIGURATION_SCHEMAS,
+    USER_SCHEMA,
+    compile_schema,
+    interpret_schema,
+    validate_device,
+    validate_user,
+)
+from tests.helpers import load_records
+
+
+def host(**configuration) -> dict:
+    """Create a host record with a valid configuration, updated with the sections given."""
+    config = {
+        "logging": {"enabled": True, "log_server": "10.0.0.1", "log_events": ["login"]},
+        "auth": {"enabled": True},
+        "connected_to": {"device": "Switch1", "interface": "Gig0/1"},
+    }
+    config.update(configuration)
+    return {"hostname": "Host1", "ip_address": "10.0.0.5", "device_type": "host", "configuration": config}
+
+
+class TestSchema(unittest.TestCase):
+
+    def test_sample_data_is_valid(self):
+        """Test that the data files of the simulated appliance validate."""
+        for prefix in ("compliant", "partial_compliant", "generated"):
+            devices, users = load_records(prefix)
+            for record in devices.values():
+                self.assertIs(validate_device(record), record)
+            for record in users.values():
+                self.assertIs(validate_user(record), record)
+
+    def test_errors_have_paths(self):
+        """Test that missing sections and values of the wrong type are reported with their paths."""
+        record = host(logging={"enabled": "yes", "log_server": "10.0.0.1"}, roles=["user", 3])
+        del record["configuration"]["auth"]
+        with self.assertRaises(InvalidConfigurationError) as context:
+            validate_device(record)
+        message = str(context.exception)
+        self.assertIn("Host1: ", message)
+        self.assertIn("configuration.auth: is required", message)
+        self.assertIn("configuration.logging.enabled: expected boolean", message)
+        self.assertIn("configuration.logging.log_events: is required", message)
+        self.assertIn("configuration.roles[1]: expected string", message)
+
+    def test_invalid_users(self):
+        """Test that users without devices or with a non-string name are rejected."""
+        validate_user({"username": "alice", "devices": ["Host1"], "roles": ["user"]})
+        with self.assertRaises(InvalidUserValueError) as context:
+            validate_user({"username": 1, "devices": [], "roles": ["user"]})
+        self.assertIn("username: expected string", str(context.exception))
+        self.assertIn("devices: ", str(context.exception))
+
+    def test_compiled_matches_interpreted(self):
+        """Test that the compiled validators report the same errors as walking the schemas."""
+        values = [
+            host()["configuration"],
+            host(logging=None, auth={"enabled": True, "acl": {"Allow": ["bob", None], "Deny": "eve"}})["configuration"],
+            host(connected_to={"interface": 1}, services="ssh", interfaces={"Gig0/1": {"status": 2}})["configuration"],
+            {"VLANs": {"30": "x"}, "network_segmentation": [], "logging": {}, "auth": {"enabled": 0}},
+            [],
+            None,
+        ]
+        for device_type, schema in CONFIGURATION_SCHEMAS.items():
+            validator = compile_schema(schema)
+            for value in values:
+                with self.subTest(device_type=device_type, value=value):
+                    self.assertEqual(validator(value), interpret_schema(schema, value))
+
+        validator = compile_schema(USER_SCHEMA)
+        for value in ({"username": "a" * 51, "devices": [], "roles": ["x", 1]}, {"username": "bob"}, "bob"):
+            self.assertEqual(validator(value), interpret_schema(USER_SCHEMA, value))
+
+
+if __name__ == "__main__":
+    unittest.main()
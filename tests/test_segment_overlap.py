@@ -0,0 +1,93 @@
+"""Unit tests for SegmentOverlapCheck."""
+
+import unittest
+from unittest.mock import MagicMock
+
+from app.domain_models import Device
+from app.zta_checks.segment_overlap import SegmentOverlapCheck, segment_interval
+
+
+def device(hostname: str, *segments: str) -> Device:
+    """Create a router whose segmentation policy allows the segments."""
+    return Device(
+        {
+            "hostname": hostname,
+            "ip_address": "192.168.1.1",
+            "device_type": "router",
+            "configuration": {"network_segmentation": {"allowed_segments": list(segments)}},
+        }
+    )
+
+
+class TestSegmentOverlapCheck(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_audit_reporter = MagicMock()
+
+    def results(self, devices: list[Device]) -> dict[str, tuple[bool, str]]:
+        SegmentOverlapCheck(devices).run_segment_overlap_check(self.mock_audit_reporter)
+        return {args[0]: (args[2], args[3]) for args, _ in self.mock_audit_reporter.add_result.call_args_list}
+
+    def test_segment_interval(self):
+        """Test that subnets become intervals of addresses, and VLANs and invalid subnets are skipped."""
+        self.assertEqual(segment_interval("10.0.0.0/8"), (0x0A000000, 0x0AFFFFFF))
+        self.assertEqual(segment_interval("192.168.1.5/24"), (0xC0A80100, 0xC0A801FF))
+        self.assertEqual(segment_interval("10.0.0.1"), (0x0A000001, 0x0A000001))
+        self.assertEqual(segment_interval("10.0.0.0/255.255.0.0"), (0x0A000000, 0x0A00FFFF))
+        for segment in ("30", "Management", "10.0.0.0/33", "256.0.0.0/8", "10..0.0/8", "10.0.0.1/"):
+            self.assertIsNone(segment_interval(segment))
+
+    def test_shared_segments(self):
+        """Test that devices allowing the same segments, or disjoint ones, pass."""
+        results = self.results(
+            [
+                device("Router1", "192.168.1.0/24", "10.0.0.0/24"),
+                device("Firewall1", "192.168.1.0/24", "10.0.0.0/24", "20"),
+                device("Router2", "192.168.2.0/24", "10.0.1.0/30"),
+            ]
+        )
+        self.assertEqual({hostname: status for hostname, (status, _) in results.items()}, dict.fromkeys(results, True))
+        self.assertEqual(results["Router1"][1], "Device has allowed segments that overlap no other segment: True.")
+
+    def test_containment(self):
+        """Test that a segment containing other devices' segments fails every device that allows either."""
+        results = self.results(
+            [
+                device("Router1", "10.0.3.0/24"),
+                device("Firewall1", "10.0.3.0/24"),
+                device("Router2", "10.0.0.0/8"),
+                device("Router3", "192.168.0.0/16"),
+            ]
+        )
+        self.assertEqual(
+            results["Router2"],
+            (
+                False,
+                "Device has allowed segments that overlap no other segment: False. \n"
+                "10.0.0.0/8 contains 10.0.3.0/24 (Router1, Firewall1).",
+            ),
+        )
+        self.assertIn("10.0.3.0/24 is contained by 10.0.0.0/8 (Router2).", results["Firewall1"][1])
+        self.assertTrue(results["Router3"][0])
+
+    def test_overlap_on_one_device(self):
+        """Test that overlapping segments of a single policy fail it."""
+        router1 = device("Router1", "192.168.0.0/16", "192.168.4.0/22")
+        results = self.results([router1, device("Router2", "172.16.0.0/12")])
+        self.assertFalse(results["Router1"][0])
+        self.assertIn("192.168.0.0/16 contains 192.168.4.0/22 (Router1)", results["Router1"][1])
+        self.assertTrue(results["Router2"][0])
+
+    def test_many_overlaps_are_summarized(self):
+        """Test that the details of a device list a few of its overlaps and count the rest."""
+        sites = [device(f"Router{site}", f"10.0.{site}.0/24") for site in range(10)]
+        results = self.results([device("Core1", "10.0.0.0/16"), *sites])
+        status, details = results["Core1"]
+        self.assertFalse(status)
+        self.assertIn("10.0.0.0/16 contains 10.0.4.0/24 (Router4)", details)
+        self.assertNotIn("10.0.5.0/24", details)
+        self.assertTrue(details.endswith("5 more overlaps."))
+
+
+if __name__ == "__main__":
+    unittest.main()
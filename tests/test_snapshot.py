@@ -0,0 +1,76 @@
+"""Unit tests for inventory snapshots."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from app.exceptions import InvalidSnapshotError
+from app.snapshot import SnapshotClient, load_snapshot, read_metadata, save_snapshot
+from app.zta_lightning import run_audit
+from tests.helpers import load_records
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.filepath = os.path.join(self._tmp_dir.name, "inventory.zsnap")
+        self.devices, users = load_records("partial_compliant")
+        # the appliance does not serve passwords, so snapshots have none
+        self.users = {
+            username: {key: value for key, value in user.items() if key != "password"}
+            for username, user in users.items()
+        }
+
+    def test_round_trip(self):
+        """Test that a snapshot loads the data it was saved with, and its metadata loads on its own."""
+        save_snapshot(self.filepath, self.devices, self.users, {"url": "https://appliance"})
+        self.assertEqual(load_snapshot(self.filepath), (self.devices, self.users))
+        metadata = read_metadata(self.filepath)
+        self.assertEqual(metadata["url"], "https://appliance")
+        self.assertEqual((metadata["devices"], metadata["users"]), (len(self.devices), len(self.users)))
+
+    def test_equal_values_are_stored_once(self):
+        """Test that equal sub-objects of records are shared, which keeps snapshots smaller than the JSON."""
+        logging = {"enabled": True, "log_server": "10.0.0.1", "log_events": ["INFO", "WARNING"]}
+        devices = {
+            f"Host{index}": {"hostname": f"Host{index}", "configuration": {"logging": dict(logging)}}
+            for index in range(1000)
+        }
+        size = save_snapshot(self.filepath, devices, {})
+        self.assertLess(size, len(json.dumps(devices)) / 2)
+        loaded, _ = load_snapshot(self.filepath)
+        self.assertIs(loaded["Host0"]["configuration"]["logging"], loaded["Host1"]["configuration"]["logging"])
+
+    def test_invalid_snapshot(self):
+        """Test that files that are not complete snapshots are rejected."""
+        with open(self.filepath, "wb") as f:
+            f.write(b"{}")
+        with self.assertRaises(InvalidSnapshotError):
+            load_snapshot(self.filepath)
+
+        save_snapshot(self.filepath, self.devices, self.users)
+        with open(self.filepath, "r+b") as f:
+            f.truncate(os.path.getsize(self.filepath) - 1)
+        with self.assertRaises(InvalidSnapshotError):
+            load_snapshot(self.filepath)
+
+        open(self.filepath, "wb").close()
+        with self.assertRaisesRegex(InvalidSnapshotError, "file is truncated"):
+            load_snapshot(self.filepath)
+
+    def test_offline_audit(self):
+        """Test that an audit of a snapshot has the results of an audit of the data it was saved with."""
+        save_snapshot(self.filepath, self.devices, self.users)
+        output = os.path.join(self._tmp_dir.name, "report.xlsx")
+        summary = run_audit(SnapshotClient(self.filepath), output)
+        passed, failed = summary.check_counts()["Logging"]
+        self.assertEqual(passed + failed, len(self.devices))
+        self.assertGreater(failed, 0)
+        self.assertTrue(os.path.exists(output))
+
+
+if __name__ == "__main__":
+    unittest.main()
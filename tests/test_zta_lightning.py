@@ -0,0 +1,127 @@
+"""Unit tests for the ZTA Lightning entry point."""
+
+import argparse
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from app import zta_lightning
+from app.audit_summary import AuditSummary
+from app.domain_models import AuditResult
+from app.exceptions import ApplianceRequestError
+
+
+def headless_args(**kwargs) -> argparse.Namespace:
+    """Create the parsed arguments of a headless run."""
+    args = {"headless": True, "config": None, "url": None, "username": None, "output": None, "results_db": None}
+    args.update(stream=False, sample=False, distribute=None, snapshot=None, from_snapshot=None, rule_set=None)
+    return argparse.Namespace(**{**args, **kwargs})
+
+
+class TestSettings(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.config_file = os.path.join(self._tmp_dir.name, "config.json")
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def write_config(self, config: dict) -> None:
+        with open(self.config_file, "w") as f:
+            json.dump(config, f)
+
+    def test_precedence(self):
+        """Test that arguments override the environment, which overrides the config file."""
+        self.write_config({"url": "https://config", "username": "config", "password": "config", "output": "c.xlsx"})
+        env = {"ZTA_USERNAME": "env", "ZTA_PASSWORD": "env"}
+        with patch.dict(os.environ, env):
+            settings = zta_lightning.resolve_settings(headless_args(config=self.config_file, username="arg"))
+        self.assertEqual(settings["url"], "https://config")
+        self.assertEqual(settings["username"], "arg")
+        self.assertEqual(settings["password"], "env")
+        self.assertEqual(settings["output"], "c.xlsx")
+
+    def test_invalid_config(self):
+        """Test that a config file with unknown settings is rejected."""
+        self.write_config({"url": "https://config", "verify": False})
+        with self.assertRaises(ValueError):
+            zta_lightning.load_config(self.config_file)
+
+
+class TestHeadlessRun(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = {"url": "https://appliance", "username": "joe", "password": "admin"}
+        self.settings.update(output=None, results_db=None)
+        patcher = patch("app.client.APIClient")
+        self.api_client = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def run_with_summary(self, statuses: list[bool]) -> int:
+        """Run with an audit of results with the statuses."""
+        summary = AuditSummary()
+        for index, status in enumerate(statuses):
+            summary.add(index, AuditResult(f"Host{index}", "Logging", status, ""))
+        with patch("app.zta_lightning.run_audit", return_value=summary):
+            return zta_lightning._run(headless_args(), self.settings)
+
+    def test_compliant(self):
+        """Test the exit code of an audit where every device passed."""
+        self.assertEqual(self.run_with_summary([True, True]), zta_lightning.EXIT_COMPLIANT)
+        self.api_client.login.assert_called_once_with("https://appliance", "joe", "admin")
+        self.api_client.authenticate.assert_not_called()
+
+    def test_non_compliant(self):
+        """Test the exit code of an audit where a device failed."""
+        self.assertEqual(self.run_with_summary([True, False]), zta_lightning.EXIT_NON_COMPLIANT)
+
+    def test_authentication_failed(self):
+        """Test the exit code when the appliance rejects the credentials."""
+        self.api_client.login.side_effect = requests.exceptions.HTTPError("401 Client Error")
+        with patch("app.zta_lightning.run_audit") as run_audit:
+            self.assertEqual(
+                zta_lightning._run(headless_args(), self.settings), zta_lightning.EXIT_AUTHENTICATION_FAILED
+            )
+        run_audit.assert_not_called()
+
+    def test_interactive_authentication_failed(self):
+        """Test the exit code when the credentials entered at the prompts are rejected."""
+        self.api_client.base_url = None
+        with patch("app.cli.CLI"), patch("app.zta_lightning.run_audit") as run_audit:
+            exit_code = zta_lightning._run(headless_args(headless=False), self.settings)
+        self.assertEqual(exit_code, zta_lightning.EXIT_AUTHENTICATION_FAILED)
+        self.api_client.authenticate.assert_called_once()
+        self.api_client.test_connection.assert_not_called()
+        run_audit.assert_not_called()
+
+    def test_appliance_error(self):
+        """Test the exit code when the appliance data cannot be fetched."""
+        with patch("app.zta_lightning.run_audit", side_effect=ApplianceRequestError("device configurations")):
+            self.assertEqual(zta_lightning._run(headless_args(), self.settings), zta_lightning.EXIT_APPLIANCE_ERROR)
+
+    def test_invalid_snapshot(self):
+        """Test the exit code when the snapshot to audit cannot be read."""
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(b"not a snapshot")
+            f.flush()
+            with patch("app.zta_lightning.run_audit") as run_audit:
+                exit_code = zta_lightning._run(headless_args(from_snapshot=f.name), self.settings)
+        self.assertEqual(exit_code, zta_lightning.EXIT_APPLIANCE_ERROR)
+        run_audit.assert_not_called()
+        self.api_client.login.assert_not_called()
+
+    def test_missing_device_data(self):
+        """Test that a failed device fetch is raised rather than audited."""
+        api_client = MagicMock()
+        api_client.get_all_device_data.return_value = None
+        with self.assertRaises(ApplianceRequestError):
+            zta_lightning.run_audit(api_client)
+
+
+if __name__ == "__main__":
+    unittest.main()